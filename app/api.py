@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import hashlib
+import pandas as pd
+import pyarrow as pa
+from aiohttp import web
+from warmup import is_ready
+from utils import (
+    load_period_variation, get_all_variations, load_moran_result,
+    data_manifest,
+    CRIME_CATEGORIES, GEO_LEVELS, PERIODS, PERIODS_WITH_BASELINE, BASELINE
+)
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+CRIME_CODES: set[str] = {code for crimes in CRIME_CATEGORIES.values() for code in crimes}
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+LISA_COLUMNS: list[str] = ["NUTS_ID", "AREA_NAME", "OBS_VALUE", "quadrant", "LISA_LABEL", "LISA_P"]
+
+
+# ---------- Query parsing ----------
+def get_level(request: web.Request) -> str:
+    level = request.query.get("level", "provinces")
+    if level not in GEO_LEVELS.values():
+        raise web.HTTPBadRequest(text=f"Unknown level {level!r}")
+    return level
+
+def get_crime(request: web.Request) -> str:
+    crime = request.query.get("crime", "")
+    if crime not in CRIME_CODES:
+        raise web.HTTPBadRequest(text=f"Unknown crime code {crime!r}")
+    return crime
+
+def get_periods(request: web.Request, periods: dict[str, tuple[int, int]]) -> dict[str, tuple[int, int]]:
+    """Periods selected by the `start`/`end` query parameters, all periods by default"""
+    if "start" not in request.query and "end" not in request.query:
+        return periods
+    try:
+        start = int(request.query["start"])
+        end = int(request.query["end"])
+    except (KeyError, ValueError):
+        raise web.HTTPBadRequest(text="`start` and `end` must both be years")
+    if start > end:
+        raise web.HTTPBadRequest(text=f"`start` ({start}) is after `end` ({end})")
+    return {f"{start}-{end}": (start, end)}
+
+
+# ---------- Responses ----------
+def wants_arrow(request: web.Request) -> bool:
+    """Whether the client asked for an Arrow IPC stream rather than JSON"""
+    return (
+        request.query.get("format") == "arrow"
+        or ARROW_MEDIA_TYPE in request.headers.get("Accept", "")
+    )
+
+def etag_for(request: web.Request) -> str:
+    """ETag derived from the data manifest, the normalised query and the response format"""
+    key = f"{data_manifest()}|{request.path}|{sorted(request.query.items())}|{wants_arrow(request)}"
+    return hashlib.sha256(key.encode()).hexdigest()[:24]
+
+def frame_response(request: web.Request, df: pd.DataFrame, etag: str) -> web.Response:
+    """Serialise a frame as JSON records or, on request, as an Arrow IPC stream"""
+    if wants_arrow(request):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        response = web.Response(body=sink.getvalue().to_pybytes(), content_type=ARROW_MEDIA_TYPE)
+    else:
+        response = web.Response(
+            text=df.to_json(orient="records", double_precision=6),
+            content_type="application/json"
+        )
+    response.etag = etag
+    response.headers["Cache-Control"] = "no-cache"
+    # the format can come from the Accept header, caches must key on it
+    response.headers["Vary"] = "Accept"
+    response.enable_compression()
+    return response
+
+async def run_cached(request: web.Request, compute, *args) -> web.Response:
+    """Answer from the client cache when the ETag matches, otherwise compute off the event loop"""
+    etag = etag_for(request)
+    if request.if_none_match and any(tag.value == etag for tag in request.if_none_match):
+        raise web.HTTPNotModified(headers={"ETag": f'"{etag}"', "Vary": "Accept"})
+
+    loop = asyncio.get_running_loop()
+    df = await loop.run_in_executor(None, compute, *args)
+    return frame_response(request, df, etag)
+
+
+# ---------- Computations ----------
+def compute_variations(level: str, crime: str, periods: dict[str, tuple[int, int]]) -> pd.DataFrame:
+    frames = []
+    for period_name, target in periods.items():
+        var_df = load_period_variation(level, crime, BASELINE, target)
+        frames.append(var_df.assign(PERIOD=period_name))
+    return pd.concat(frames, ignore_index=True)
+
+def compute_moran_summary(level: str, crime: str, periods: dict[str, tuple[int, int]]) -> pd.DataFrame:
+    rows = []
+    for period_name, (start, end) in periods.items():
+        res = load_moran_result(level, crime, start, end)
+        if res:
+            rows.append({
+                "PERIOD": period_name,
+                "moran_I": res["moran_I"],
+                "moran_EI": res["moran_EI"],
+                "moran_p": res["moran_p"],
+                "moran_z": res["moran_z"],
+                "n": len(res["gdf"]),
+            })
+    return pd.DataFrame(rows, columns=["PERIOD", "moran_I", "moran_EI", "moran_p", "moran_z", "n"])
+
+def compute_lisa_labels(level: str, crime: str, periods: dict[str, tuple[int, int]]) -> pd.DataFrame:
+    frames = []
+    for period_name, (start, end) in periods.items():
+        res = load_moran_result(level, crime, start, end)
+        if res:
+            frames.append(pd.DataFrame(res["gdf"][LISA_COLUMNS]).assign(PERIOD=period_name))
+    if not frames:
+        return pd.DataFrame(columns=LISA_COLUMNS + ["PERIOD"])
+    return pd.concat(frames, ignore_index=True)
+
+
+# ---------- Handlers ----------
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok", "manifest": data_manifest(), "warm": is_ready()})
+
+async def national(request: web.Request) -> web.Response:
+    return await run_cached(request, get_all_variations)
+
+async def variation(request: web.Request) -> web.Response:
+    periods = get_periods(request, PERIODS)
+    return await run_cached(request, compute_variations, get_level(request), get_crime(request), periods)
+
+async def moran(request: web.Request) -> web.Response:
+    periods = get_periods(request, PERIODS_WITH_BASELINE)
+    return await run_cached(request, compute_moran_summary, get_level(request), get_crime(request), periods)
+
+async def lisa(request: web.Request) -> web.Response:
+    periods = get_periods(request, PERIODS_WITH_BASELINE)
+    return await run_cached(request, compute_lisa_labels, get_level(request), get_crime(request), periods)
+
+
+def create_app() -> web.Application:
+    """Build the API application (also usable with aiohttp's test client)"""
+    app = web.Application()
+    app.add_routes([
+        web.get("/health", health),
+        web.get("/national", national),
+        web.get("/variation", variation),
+        web.get("/moran", moran),
+        web.get("/lisa", lisa),
+    ])
+    return app
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the analysis results over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
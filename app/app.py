@@ -21,7 +21,7 @@ DATA_PATH = Path(__file__).parent.parent / "data"
 def check_and_setup_data():
     """Check if data exists, if not run setup."""
     required_files = [
-        DATA_PATH / "processed/criminality_clean.parquet",
+        DATA_PATH / "processed/criminality_clean",
         DATA_PATH / "shapes/nuts1_it.geoparquet",
         DATA_PATH / "shapes/nuts2_it.geoparquet",
         DATA_PATH / "shapes/nuts3_it.geoparquet",
@@ -118,6 +118,9 @@ def check_and_setup_data():
         subprocess.run([sys.executable, scripts_dir / "build_shapes.py"], check=True)
     st.text("Shapefiles ready!")
 
+    # fill the result caches in the background while the app reloads
+    subprocess.Popen([sys.executable, Path(__file__).parent / "warmup.py"])
+
     st.success("Setup complete! The app will now reload.")
     st.balloons()
 
@@ -135,6 +138,10 @@ pages = {
         st.Page("pages/01_variation_maps.py", title="Spatial Distribution of Crime Changes"),
         st.Page("pages/02_moran.py", title="Spatial Autocorrelation Analysis"),
         st.Page("pages/03_lisa_transitions.py", title="LISA Cluster Transitions"),
+        st.Page("pages/05_structural_breaks.py", title="Structural Breaks"),
+    ],
+    "Explore": [
+        st.Page("pages/04_sql_query.py", title="SQL Query"),
     ]
 }
 
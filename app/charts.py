@@ -0,0 +1,136 @@
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from utils import QUADRANT_COLORS, QUADRANT_LABELS
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+# points per period above which markers are drawn with WebGL instead of SVG
+WEBGL_THRESHOLD = 1_000
+
+# points per period above which the scatter becomes a binned density, with
+# only the points beyond OUTLIER_Z drawn on top
+DENSITY_THRESHOLD = 5_000
+DENSITY_BINS = 70
+OUTLIER_Z = 2.0
+
+# both axes of the scatter, in standard deviations
+AXIS_RANGE = 3.5
+
+
+# ---------- Moran's I ----------
+def scatter_mode(n_points: int) -> str:
+    """How a Moran scatter of `n_points` areas is drawn: "svg", "webgl" or "density\""""
+    if n_points > DENSITY_THRESHOLD:
+        return "density"
+    return "webgl" if n_points > WEBGL_THRESHOLD else "svg"
+
+def quadrant_traces(res: dict, mask: np.ndarray, trace, marker_size: int, showlegend: bool) -> list:
+    """One marker trace per quadrant for the areas selected by `mask`"""
+    traces = []
+    names = res["gdf"]["AREA_NAME"].to_numpy()
+    for q in [1, 2, 3, 4]:
+        selected = mask & (res["quadrant"] == q)
+        if selected.sum() > 0:
+            traces.append(trace(
+                x=res["y_std"][selected],
+                y=res["y_lag"][selected],
+                mode="markers",
+                marker=dict(color=QUADRANT_COLORS[q], size=marker_size),
+                name=QUADRANT_LABELS[q],
+                text=names[selected],
+                hovertemplate="%{text}<br>Value: %{x:.2f}<br>Lag: %{y:.2f}<extra></extra>",
+                showlegend=showlegend,
+                legendgroup=QUADRANT_LABELS[q]
+            ))
+    return traces
+
+def density_trace(res: dict, showscale: bool) -> go.Heatmap:
+    """Counts of areas on a grid, binned here so the figure does not carry every point"""
+    edges = np.linspace(-AXIS_RANGE, AXIS_RANGE, DENSITY_BINS + 1)
+    counts, _, _ = np.histogram2d(res["y_std"], res["y_lag"], bins=[edges, edges])
+    centers = ((edges[:-1] + edges[1:]) / 2).astype(np.float32)
+    return go.Heatmap(
+        x=centers,
+        y=centers,
+        # float32 keeps empty bins transparent at half the payload of float64
+        z=np.where(counts > 0, counts, np.nan).T.astype(np.float32),
+        colorscale="Greys",
+        showscale=showscale,
+        colorbar=dict(title="Areas", len=0.6),
+        hovertemplate="Value: %{x:.2f}<br>Lag: %{y:.2f}<br>Areas: %{z}<extra></extra>",
+    )
+
+def moran_scatter_figure(results: dict[str, dict], mode: str | None = None) -> go.Figure:
+    """Moran scatter plots of several periods side by side (one column each)
+
+    Markers are SVG up to `WEBGL_THRESHOLD` areas per period and WebGL up to
+    `DENSITY_THRESHOLD`. Beyond that each period is a binned density with
+    the areas further than `OUTLIER_Z` from the centre drawn on top.
+    `mode` forces one of the three (see `scatter_mode`).
+    """
+    fig_scatter = make_subplots(
+        rows=1, cols=len(results),
+        subplot_titles=list(results.keys()),
+        horizontal_spacing=0.08
+    )
+
+    for col_idx, (period_name, res) in enumerate(results.items(), start=1):
+        y_std = res["y_std"]
+        period_mode = mode or scatter_mode(len(y_std))
+        everything = np.ones(len(y_std), dtype=bool)
+
+        if period_mode == "svg":
+            traces = quadrant_traces(res, everything, go.Scatter, 8, col_idx == 1)
+        elif period_mode == "webgl":
+            traces = quadrant_traces(res, everything, go.Scattergl, 5, col_idx == 1)
+        else:
+            outliers = (np.abs(y_std) > OUTLIER_Z) | (np.abs(res["y_lag"]) > OUTLIER_Z)
+            traces = [density_trace(res, col_idx == 1)]
+            traces += quadrant_traces(res, outliers, go.Scattergl, 5, col_idx == 1)
+        for trace in traces:
+            fig_scatter.add_trace(trace, row=1, col=col_idx)
+
+        # regression line
+        slope = res["moran_I"]
+        fig_scatter.add_trace(
+            go.Scatter(
+                x=[-3, 3],
+                y=[-3 * slope, 3 * slope],
+                mode="lines",
+                line=dict(color="black", dash="dash", width=1),
+                showlegend=False
+            ),
+            row=1, col=col_idx
+        )
+
+        # axis lines, once per subplot
+        fig_scatter.add_shape(
+            type="line",
+            x0=-AXIS_RANGE, x1=AXIS_RANGE, y0=0, y1=0,
+            line=dict(color="gray", dash="dot"),
+            row=1, col=col_idx
+        )
+        fig_scatter.add_shape(
+            type="line",
+            x0=0, x1=0, y0=-AXIS_RANGE, y1=AXIS_RANGE,
+            line=dict(color="gray", dash="dot"),
+            row=1, col=col_idx
+        )
+
+    fig_scatter.update_layout(
+        height=500,
+        margin=dict(b=100),
+        legend=dict(
+            orientation="h",
+            yanchor="top",
+            y=-0.2,
+            xanchor="center",
+            x=0.5
+        )
+    )
+    fig_scatter.update_xaxes(title_text="Standardized value", range=[-AXIS_RANGE, AXIS_RANGE])
+    fig_scatter.update_yaxes(title_text="Spatial lag", range=[-AXIS_RANGE, AXIS_RANGE])
+
+    return fig_scatter
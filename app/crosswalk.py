@@ -0,0 +1,117 @@
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
+import shapely
+import geopandas as gpd
+from shapely import STRtree
+from topology import file_hash
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+# bump when the layout of the artefacts changes, older files are then rebuilt
+CROSSWALK_VERSION = 1
+
+# intersections are measured in an equal-area projection for Europe
+EQUAL_AREA_CRS = "EPSG:3035"
+
+# overlaps below this share of the source area are boundary slivers left by
+# the different generalisation of the two vintages
+MIN_SHARE = 0.005
+
+
+def crosswalk_path(source_path: Path, target_path: Path) -> Path:
+    """Artefact stored next to the target shapes, e.g. nuts3_it_2021_to_nuts3_it.crosswalk.npz"""
+    return target_path.with_name(f"{source_path.stem}_to_{target_path.stem}.crosswalk.npz")
+
+def build_crosswalk(source: gpd.GeoDataFrame, target: gpd.GeoDataFrame) -> dict[str, np.ndarray]:
+    """Intersection areas of every source and target area, as a sparse (targets x sources) matrix
+
+    Candidate pairs come from an R-tree over the target geometries and all
+    their intersections are measured in one vectorised call.
+    """
+    src = source.geometry.to_crs(EQUAL_AREA_CRS).values
+    tgt = target.geometry.to_crs(EQUAL_AREA_CRS).values
+
+    src_idx, tgt_idx = STRtree(tgt).query(src, predicate="intersects")
+    overlap = shapely.area(shapely.intersection(src[src_idx], tgt[tgt_idx]))
+    source_area = shapely.area(src)
+
+    keep = overlap >= MIN_SHARE * source_area[src_idx]
+    csr = sp.csr_matrix(
+        (overlap[keep], (tgt_idx[keep], src_idx[keep])), shape=(len(tgt), len(src))
+    )
+    return {
+        "indptr": csr.indptr.astype(np.int32),
+        "indices": csr.indices.astype(np.int32),
+        "overlap": csr.data,
+        "source_area": source_area,
+        "source_ids": source["NUTS_ID"].to_numpy(dtype=str),
+        "target_ids": target["NUTS_ID"].to_numpy(dtype=str),
+    }
+
+def save_crosswalk(source_path: Path, target_path: Path) -> Path:
+    """Build the crosswalk between two geoparquet files and store it next to the target"""
+    out = crosswalk_path(source_path, target_path)
+    np.savez_compressed(
+        out,
+        version=CROSSWALK_VERSION,
+        source_sha256=file_hash(source_path),
+        target_sha256=file_hash(target_path),
+        **build_crosswalk(gpd.read_parquet(source_path), gpd.read_parquet(target_path))
+    )
+    return out
+
+def load_crosswalk(source_path: Path, target_path: Path) -> dict[str, np.ndarray] | None:
+    """Stored crosswalk between two geoparquet files, None if missing or built for other shapes"""
+    try:
+        with np.load(crosswalk_path(source_path, target_path)) as npz:
+            crosswalk = {key: npz[key] for key in npz.files}
+    except (OSError, ValueError):
+        return None
+
+    if (
+        int(crosswalk["version"]) != CROSSWALK_VERSION
+        or str(crosswalk["source_sha256"]) != file_hash(source_path)
+        or str(crosswalk["target_sha256"]) != file_hash(target_path)
+    ):
+        return None
+    return crosswalk
+
+def crosswalk_matrix(crosswalk: dict[str, np.ndarray], kind: str = "intensive") -> sp.csr_matrix:
+    """Interpolation matrix from source to target values
+
+    "intensive" values (rates) become the area-weighted mean of the sources
+    overlapping each target, "extensive" values (counts, population) are
+    split between targets in proportion to the area of each source.
+    """
+    shape = (len(crosswalk["target_ids"]), len(crosswalk["source_ids"]))
+    overlap = sp.csr_matrix((crosswalk["overlap"], crosswalk["indices"], crosswalk["indptr"]), shape=shape)
+    if kind == "intensive":
+        total = np.asarray(overlap.sum(axis=1)).ravel()
+        return sp.diags(np.divide(1.0, total, out=np.zeros_like(total), where=total > 0)) @ overlap
+    if kind == "extensive":
+        return overlap @ sp.diags(1.0 / crosswalk["source_area"])
+    raise ValueError(f"Unknown kind '{kind}'")
+
+def reaggregate(values: np.ndarray, matrix: sp.csr_matrix, kind: str = "intensive") -> np.ndarray:
+    """Values of the source areas (first axis) interpolated to the target areas
+
+    Every other axis (e.g. crimes x years) is a column of one sparse
+    product. Missing sources are left out: intensive means are taken over
+    the sources with data, extensive totals are NaN unless every
+    overlapping source has data.
+    """
+    shape = values.shape
+    flat = values.reshape(shape[0], -1)
+    valid = ~np.isnan(flat)
+
+    total = matrix @ np.where(valid, flat, 0.0)
+    covered = matrix @ valid.astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if kind == "intensive":
+            result = np.where(covered > 0, total / covered, np.nan)
+        else:
+            expected = np.asarray(matrix.sum(axis=1))
+            result = np.where(np.isclose(covered, expected) & (expected > 0), total, np.nan)
+    return result.reshape((matrix.shape[0],) + shape[1:])
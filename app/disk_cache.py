@@ -0,0 +1,137 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+# lives in the ./data volume by default so entries survive container restarts
+CACHE_DIR: Path = Path(os.environ.get("RESULT_CACHE_DIR", Path(__file__).parent.parent / "data" / "cache"))
+MAX_BYTES: int = int(os.environ.get("RESULT_CACHE_MB", "512")) * 1024 * 1024
+
+META_KEY = b"disk_cache"
+ARRAY_PREFIX = "__array__"
+
+
+# ---------- Serialisation ----------
+def _to_table(value: Any) -> pa.Table:
+    """Encode a frame, a dict holding a frame under "gdf", or None as a parquet table"""
+    meta: dict[str, Any] = {"kind": "none"}
+    df = pd.DataFrame()
+
+    if isinstance(value, pd.DataFrame):
+        meta = {"kind": "frame"}
+        df = value
+    elif isinstance(value, dict):
+        meta = {"kind": "dict", "scalars": {}, "arrays": []}
+        df = value["gdf"].copy()
+        for key, item in value.items():
+            if key == "gdf":
+                continue
+            if isinstance(item, np.ndarray):
+                df[ARRAY_PREFIX + key] = item
+                meta["arrays"].append(key)
+            else:
+                meta["scalars"][key] = None if item is None else float(item)
+    elif value is not None:
+        raise TypeError(f"Cannot store {type(value).__name__} in the disk cache")
+
+    if isinstance(df, gpd.GeoDataFrame):
+        meta["geometry"] = df.geometry.name
+        meta["crs"] = df.crs.to_json() if df.crs is not None else None
+        df = pd.DataFrame(df.to_wkb())
+
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), META_KEY: json.dumps(meta).encode()})
+
+def _from_table(table: pa.Table) -> Any:
+    meta = json.loads(table.schema.metadata[META_KEY])
+    if meta["kind"] == "none":
+        return None
+
+    df = table.to_pandas()
+    if "geometry" in meta:
+        geom = meta["geometry"]
+        df = gpd.GeoDataFrame(df, geometry=gpd.GeoSeries.from_wkb(df[geom], index=df.index), crs=meta["crs"])
+
+    if meta["kind"] == "frame":
+        return df
+
+    result: dict[str, Any] = {}
+    for key in meta["arrays"]:
+        result[key] = df.pop(ARRAY_PREFIX + key).to_numpy()
+    result.update(meta["scalars"])
+    result["gdf"] = df
+    return result
+
+
+# ---------- Storage ----------
+_evict_lock = threading.Lock()
+
+def evict() -> None:
+    """Drop least recently used entries until the cache fits in MAX_BYTES"""
+    with _evict_lock:
+        entries = []
+        images = (p for p in CACHE_DIR.glob("images/*") if p.suffix != ".tmp")
+        for path in [*CACHE_DIR.glob("*.parquet"), *images]:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= MAX_BYTES:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+def cache_key(manifest: str, func: Callable, args: tuple, kwargs: dict) -> str:
+    """Content address of one call: input data version, function and parameters"""
+    payload = json.dumps(
+        [manifest, func.__module__, func.__qualname__, list(args), sorted(kwargs.items())],
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+def persistent(manifest: Callable[..., str]):
+    """Persist the results of a function on disk, keyed on its arguments and input data
+
+    `manifest` is called with the arguments of each call and returns the
+    version of the inputs that call depends on. When those inputs change the
+    key changes too, so stale entries are never read again and age out
+    through eviction.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = cache_key(manifest(*args, **kwargs), func, args, kwargs)
+            path = CACHE_DIR / f"{key}.parquet"
+
+            try:
+                value = _from_table(pq.read_table(path))
+                os.utime(path)  # mark as recently used
+                return value
+            except (OSError, pa.ArrowException, KeyError, ValueError):
+                pass
+
+            value = func(*args, **kwargs)
+
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            pq.write_table(_to_table(value), tmp, compression="zstd")
+            os.replace(tmp, path)
+            evict()
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,91 @@
+import numpy as np
+import scipy.sparse as sp
+import geopandas as gpd
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+# name -> (NUTS prefix -> group, group of the provinces matching no prefix).
+# The longest matching prefix wins, a full province code is a prefix too.
+# Codes of NUTS 2006 and of later versions are both listed: the North-East
+# and the Centre moved from ITD/ITE to ITH/ITI, Milano and Bari were split.
+GROUPINGS: dict[str, tuple[dict[str, str], str | None]] = {
+    "north-south": (
+        {
+            "ITC": "North",
+            "ITD": "North",
+            "ITH": "North",
+            "ITE": "Centre",
+            "ITI": "Centre",
+            "ITF": "South and islands",
+            "ITG": "South and islands",
+        },
+        None,
+    ),
+    "metropolitan": (
+        {
+            code: "Metropolitan cities"
+            for code in [
+                "ITC11", "ITC33", "ITC45", "ITC4C", "ITD35", "ITH35", "ITD55", "ITH55",
+                "ITE14", "ITI14", "ITE43", "ITI43", "ITF33", "ITF42", "ITF47", "ITF65",
+                "ITG12", "ITG13", "ITG17", "ITG27",
+            ]
+        },
+        "Other provinces",
+    ),
+}
+
+
+def group_labels(areas: np.ndarray, grouping: str) -> np.ndarray:
+    """Group of every area code, None where the grouping leaves it out"""
+    rules, default = GROUPINGS[grouping]
+    prefixes = sorted(rules, key=len, reverse=True)
+    return np.array([
+        next((rules[p] for p in prefixes if str(area).startswith(p)), default)
+        for area in areas
+    ], dtype=object)
+
+def group_matrix(labels: np.ndarray) -> tuple[np.ndarray, sp.csr_matrix]:
+    """Group names and the (groups x areas) 0/1 membership matrix of `labels`"""
+    member = np.flatnonzero([label is not None for label in labels])
+    groups, group_idx = np.unique(labels[member].astype(str), return_inverse=True)
+    matrix = sp.csr_matrix(
+        (np.ones(len(member)), (group_idx, member)), shape=(len(groups), len(labels))
+    )
+    return groups, matrix
+
+def group_rates(rates: np.ndarray, population: np.ndarray | None, matrix: sp.csr_matrix) -> np.ndarray:
+    """Population-weighted rates of every group
+
+    `rates` has areas on the first axis (e.g. areas x crimes x years),
+    `population` broadcasts against it. Each group rate is the total of
+    rate x population over the members with data divided by their total
+    population, for every other axis in one sparse product. Without a
+    population every member weighs the same.
+    """
+    shape = rates.shape
+    weight = np.ones(shape) if population is None else np.broadcast_to(population, shape)
+    valid = ~np.isnan(rates) & ~np.isnan(weight)
+
+    weighted = np.where(valid, rates * weight, 0.0).reshape(shape[0], -1)
+    exposure = np.where(valid, weight, 0.0).reshape(shape[0], -1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = (matrix @ weighted) / (matrix @ exposure)
+    return result.reshape((matrix.shape[0],) + shape[1:])
+
+def group_totals(values: np.ndarray, matrix: sp.csr_matrix) -> np.ndarray:
+    """Sum of every group, NaN unless all its members have a value"""
+    shape = values.shape
+    flat = values.reshape(shape[0], -1)
+    valid = ~np.isnan(flat)
+    totals = matrix @ np.where(valid, flat, 0.0)
+    complete = (matrix @ valid.astype(float)) == np.asarray(matrix.sum(axis=1))
+    return np.where(complete, totals, np.nan).reshape((matrix.shape[0],) + shape[1:])
+
+def dissolve_groups(shapes: gpd.GeoDataFrame, grouping: str) -> gpd.GeoDataFrame:
+    """One geometry per group, named by the group (NUTS_ID and AREA_NAME)"""
+    labels = group_labels(shapes["NUTS_ID"].to_numpy(), grouping)
+    grouped = shapes[["geometry"]].assign(NUTS_ID=labels)[[label is not None for label in labels]]
+    dissolved = grouped.dissolve(by="NUTS_ID", as_index=False)
+    dissolved["AREA_NAME"] = dissolved["NUTS_ID"]
+    return dissolved[["NUTS_ID", "AREA_NAME", "geometry"]]
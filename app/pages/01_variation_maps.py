@@ -1,10 +1,13 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
+import pandas as pd
+from render import load_map_image
 from utils import (
-    load_criminality_data, load_shapes,
-    filter_crime_by_level, calc_period_variation,
-    CRIME_CATEGORIES, GEO_LEVELS, PERIODS, BASELINE
+    load_shapes, load_period_variation, load_trend_deviation, load_change_scores, top_changes,
+    area_at, nearest_area,
+    period_controls, period_label,
+    CRIME_CATEGORIES, GEO_LEVELS, GROUP_LEVELS, PERIOD_COLORS, BASELINE, PERIODS
 )
 
 # pyright: reportAttributeAccessIssue=false
@@ -16,7 +19,6 @@ st.set_page_config(
 )
 
 st.title("Spatial Distribution of Crime Changes")
-st.markdown("Crime variation (%) from pre-COVID baseline (2014-2019)")
 
 
 # ---------- Sidebar filters ----------
@@ -25,13 +27,14 @@ st.sidebar.header("Filters")
 # data type selection
 data_type = "Criminality rate (per 100k)"
 
-# geo level
+# geo level, NUTS levels and groups of provinces
+levels = {**GEO_LEVELS, **GROUP_LEVELS}
 selected_geo_label = st.sidebar.radio(
     "Geographical level",
-    list(GEO_LEVELS.keys()),
+    list(levels.keys()),
     horizontal=True
 )
-geo_level = GEO_LEVELS[selected_geo_label]
+geo_level = levels[selected_geo_label]
 
 # category filter
 categories = list(CRIME_CATEGORIES.keys())
@@ -45,18 +48,49 @@ crime_codes = list(crimes_in_category.keys())
 selected_label = st.sidebar.selectbox("Type of crime", crime_labels)
 selected_crime = crime_codes[crime_labels.index(selected_label)]
 
+# metric
+METRICS = {
+    "variation": "Variation from the baseline mean",
+    "trend": "Deviation from the baseline trend",
+}
+metric = st.sidebar.radio("Metric", list(METRICS), format_func=METRICS.get)
+
+# periods
+baseline, periods = period_controls(with_baseline=False)
+
+if metric == "variation":
+    baseline_label = period_label("Baseline", baseline)
+    st.markdown(f"Crime variation (%) from the {baseline[0]}-{baseline[1]} baseline")
+else:
+    baseline_label = "Expected (trend)"
+    st.markdown(
+        f"Observed minus expected (%), where the expected value projects the "
+        f"{baseline[0]}-{baseline[1]} linear trend of each area to the period"
+    )
+
 # ---------- Load data ----------
-raw_data = load_criminality_data()
 value_format = ":.1f"
 
-raw_data = filter_crime_by_level(raw_data, geo_level)
+hover_data = {
+    "VAR": ":.1f",
+    "BASELINE": value_format,
+    "TARGET": value_format,
+    "AREA_NAME": False,
+    "REF_AREA": False
+}
+if metric == "trend":
+    hover_data |= {"LOWER": ":.1f", "UPPER": ":.1f"}
+
 shapes = load_shapes(geo_level)
 
 # ---------- Calculate variations for all periods ----------
 results = {}
 
-for period_name, (start, end) in PERIODS.items():
-    var_df = calc_period_variation(raw_data, selected_crime, BASELINE, (start, end))
+for period_name, (start, end) in periods.items():
+    if metric == "variation":
+        var_df = load_period_variation(geo_level, selected_crime, baseline, (start, end))
+    else:
+        var_df = load_trend_deviation(geo_level, selected_crime, baseline, (start, end))
     gdf = shapes.merge(var_df, left_on="NUTS_ID", right_on="REF_AREA")
 
     if gdf["VAR"].notna().sum() > 0:
@@ -77,7 +111,33 @@ view_mdoe = st.radio(
     horizontal=True
 )
 
-if view_mdoe == "Single period":
+# ---------- Single period map ----------
+def area_details(results: dict, area_ids: list[str]) -> None:
+    """Variation of the selected areas in every period"""
+    rows = []
+    for period_name, gdf in results.items():
+        selected = gdf[gdf["NUTS_ID"].isin(area_ids)]
+        for row in selected.itertuples():
+            rows.append({
+                "Area": row.AREA_NAME,
+                "Period": period_name,
+                baseline_label: row.BASELINE,
+                "Target": row.TARGET,
+                "Var %": row.VAR,
+                **({"95% interval": f"{row.LOWER:.1f} to {row.UPPER:.1f}"} if metric == "trend" else {}),
+            })
+    if not rows:
+        st.info("No data for the selected area")
+        return
+    st.dataframe(pd.DataFrame(rows).round(1), hide_index=True, width="stretch")
+
+@st.fragment
+def single_period_section(results: dict):
+    """Period map with click-to-select drill-down
+
+    Selecting areas or changing the period only reruns this fragment, the
+    details come from the variations already loaded for every period.
+    """
     selected_period = st.selectbox("Select period", list(results.keys()))
 
     gdf = results[selected_period]
@@ -93,17 +153,13 @@ if view_mdoe == "Single period":
         center={"lat": 42.0, "lon": 12.5},
         zoom=5,
         hover_name="AREA_NAME",
-        hover_data={
-            "VAR": ":.1f",
-            "BASELINE": value_format,
-            "TARGET": value_format,
-            "AREA_NAME": False,
-            "REF_AREA": False
-        },
+        hover_data=hover_data,
         labels={
             "VAR": "Variation %",
-            "BASELINE": "Baseline (2014-19)",
-            "TARGET": f"Target {selected_period.split('(')[1].split(')')[0]}"
+            "BASELINE": baseline_label,
+            "TARGET": f"Target {selected_period.split('(')[1].split(')')[0]}",
+            "LOWER": "95% interval from",
+            "UPPER": "95% interval to"
         }
     )
 
@@ -113,13 +169,47 @@ if view_mdoe == "Single period":
         coloraxis_colorbar=dict(title="Variation %", ticksuffix="%")
     )
 
-    st.plotly_chart(fig, width="stretch")
+    event = st.plotly_chart(
+        fig,
+        width="stretch",
+        on_select="rerun",
+        selection_mode=("points", "box", "lasso"),
+        key=f"variation_map_{geo_level}_{selected_crime}_{selected_period}"
+    )
 
     # stats
     col1, col2, col3 = st.columns(3)
     col1.metric("Mean variation", f"{gdf['VAR'].mean():.1f}%")
     col2.metric("Min", f"{gdf['VAR'].min():.1f}%")
     col3.metric("Max", f"{gdf['VAR'].max():.1f}%")
+    if metric == "trend":
+        st.caption(f"{int(gdf['SIGNIFICANT'].sum())} of {len(gdf)} areas outside the 95% prediction interval of their trend")
+
+    # area details
+    st.markdown("#### Area details")
+    st.caption("Click an area on the map (box and lasso select several), or look up a location")
+
+    area_ids = [gdf.iloc[p["point_index"]]["NUTS_ID"] for p in event.selection.points]
+
+    coords = st.text_input("Coordinates (lat, lon)", placeholder="e.g. 45.46, 9.19")
+    if coords:
+        try:
+            lat, lon = (float(v) for v in coords.split(","))
+        except ValueError:
+            st.warning("Enter coordinates as: latitude, longitude")
+        else:
+            area_id = area_at(geo_level, lon, lat)
+            if area_id is None:
+                area_id = nearest_area(geo_level, lon, lat)
+                st.caption("The location is outside every area, showing the nearest one")
+            area_ids.append(area_id)
+
+    if area_ids:
+        area_details(results, area_ids)
+
+
+if view_mdoe == "Single period":
+    single_period_section(results)
 
 else:
     # compare all periods side by side
@@ -139,43 +229,54 @@ else:
                 delta_color=delta_color
             )
     
-    # maps in tabs
-    tabs = st.tabs(list(results.keys()))
-
-    for tab, (period_name, gdf) in zip(tabs, results.items()):
-        with tab:
-            fig = px.choropleth_map(
-                gdf,
-                geojson=gdf.geometry.__geo_interface__,
-                locations=gdf.index,
-                color="VAR",
-                color_continuous_scale="RdYlGn_r",
-                range_color=[-80, 80],
-                map_style="carto-positron",
-                center={"lat": 42.0, "lon": 12.5},
-                zoom=5,
-                hover_name="AREA_NAME",
-                hover_data={
-                    "VAR": ":.1f",
-                    "BASELINE": value_format,
-                    "TARGET": value_format,
-                    "AREA_NAME": False,
-                    "REF_AREA": False
-                },
-                labels={
-                    "VAR": "Variation %",
-                    "BASELINE": "Baseline (2014-19)",
-                    "TARGET": "Period value"
-                }
+    # static previews are rendered server side and cached, the interactive
+    # maps are only built on demand
+    # previews are rendered against the default baseline only
+    default_periods = baseline == BASELINE and periods == PERIODS
+    interactive = st.toggle("Interactive maps", value=not default_periods, disabled=not default_periods)
+
+    if not interactive:
+        cols = st.columns(len(results))
+        for col, period_name in zip(cols, results):
+            col.image(
+                load_map_image(geo_level, selected_crime, periods[period_name], metric),
+                caption=period_name,
+                width="stretch"
             )
-
-            fig.update_layout(
-                margin={"r": 0, "t": 0, "l": 0, "b": 0},
-                height=600,
-                coloraxis_colorbar=dict(title="Var %", ticksuffix="%")
-            )
-
-            st.plotly_chart(fig, width="stretch")
+    else:
+        # maps in tabs
+        tabs = st.tabs(list(results.keys()))
+
+        for tab, (period_name, gdf) in zip(tabs, results.items()):
+            with tab:
+                fig = px.choropleth_map(
+                    gdf,
+                    geojson=gdf.geometry.__geo_interface__,
+                    locations=gdf.index,
+                    color="VAR",
+                    color_continuous_scale="RdYlGn_r",
+                    range_color=[-80, 80],
+                    map_style="carto-positron",
+                    center={"lat": 42.0, "lon": 12.5},
+                    zoom=5,
+                    hover_name="AREA_NAME",
+                    hover_data=hover_data,
+                    labels={
+                        "VAR": "Variation %",
+                        "BASELINE": baseline_label,
+                        "TARGET": "Period value",
+                        "LOWER": "95% interval from",
+                        "UPPER": "95% interval to"
+                    }
+                )
+
+                fig.update_layout(
+                    margin={"r": 0, "t": 0, "l": 0, "b": 0},
+                    height=600,
+                    coloraxis_colorbar=dict(title="Var %", ticksuffix="%")
+                )
+
+                st.plotly_chart(fig, width="stretch")
 
 # ---------- Bar chart ----------
 st.markdown("---")
@@ -188,7 +289,7 @@ fig_bar = go.Figure()
 fig_bar.add_trace(go.Bar(
     x=period_names,
     y=mean_vars,
-    marker_color=["#2166ac", "#b2182b", "#1b7837"],
+    marker_color=[PERIOD_COLORS.get(p, c) for p, c in zip(period_names, PERIOD_COLORS.values())],
     text=[f"{v:.1f}%" for v in mean_vars],
     textposition="auto"
 ))
@@ -219,15 +320,49 @@ with st.expander("Top 10 increases and decreases by period"):
     with col_inc:
         st.markdown("**Largest increases**")
         top_inc = gdf_table.nlargest(10, "VAR")[["AREA_NAME", "VAR", "BASELINE", "TARGET"]].copy()
-        top_inc.columns = ["Area", "Var %", "Baseline", "Target"]
+        top_inc.columns = ["Area", "Var %", baseline_label, "Target"]
         st.dataframe(top_inc, hide_index=True)
 
     with col_dec:
         st.markdown("**Largest decreases**")
         top_dec = gdf_table.nsmallest(10, "VAR")[["AREA_NAME", "VAR", "BASELINE", "TARGET"]].copy()
-        top_dec.columns = ["Area", "Var %", "Baseline", "Target"]
+        top_dec.columns = ["Area", "Var %", baseline_label, "Target"]
         st.dataframe(top_dec, hide_index=True)
 
+# ---------- Largest changes across all crimes ----------
+with st.expander("What changed most: every area, crime and period"):
+    st.caption(
+        f"Variation of every crime from the {BASELINE[0]}-{BASELINE[1]} baseline, ranked by "
+        "how unusual it is among the areas for the same crime and period (robust z-score)"
+    )
+
+    col_k, col_min, col_dir = st.columns(3)
+    with col_k:
+        top_k = st.number_input("Rows", min_value=5, max_value=200, value=20, step=5)
+    with col_min:
+        min_baseline = st.number_input(
+            "Minimum baseline (per 100k)", min_value=0.0, value=1.0, step=0.5,
+            help="Cells with a smaller baseline are left out, their percentages are mostly noise"
+        )
+    with col_dir:
+        direction = st.radio("Direction", ["both", "increase", "decrease"], format_func=str.capitalize, horizontal=True)
+
+    crime_names = {code: name for crimes in CRIME_CATEGORIES.values() for code, name in crimes.items()}
+    changes = top_changes(load_change_scores(geo_level), int(top_k), min_baseline, direction)
+    if changes.empty:
+        st.info("No change with a large enough baseline")
+    else:
+        table = pd.DataFrame({
+            "Area": changes["REF_AREA"].map(shapes.set_index("NUTS_ID")["AREA_NAME"]).fillna(changes["REF_AREA"]),
+            "Crime": changes["TYPE_CRIME"].map(crime_names).fillna(changes["TYPE_CRIME"]),
+            "Period": changes["PERIOD"],
+            "Baseline": changes["BASELINE"],
+            "Target": changes["TARGET"],
+            "Var %": changes["VAR"],
+            "z-score": changes["Z"],
+        })
+        st.dataframe(table.round(1), hide_index=True, width="stretch")
+
 
 # ---------- Footer ----------
 st.markdown("---")
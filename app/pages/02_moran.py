@@ -2,12 +2,12 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from charts import moran_scatter_figure
+from sensitivity import weights_sensitivity, area_stability, WEIGHT_SPECS, REFERENCE_SPEC
 from utils import(
-    load_criminality_data, load_shapes, 
-    filter_crime_by_level, compute_moran_for_period,
-    CRIME_CATEGORIES, PERIODS_WITH_BASELINE, PERIOD_COLORS, 
-    QUADRANT_COLORS, QUADRANT_LABELS, LISA_COLORS
+    load_progressive_moran, moran_refined, inference_label, load_shapes,
+    period_controls, smoothing_control,
+    CRIME_CATEGORIES, PERIOD_COLORS, LISA_COLORS, PERMUTATIONS
 )
 
 # pyright: reportAttributeAccessIssue=false
@@ -46,25 +46,35 @@ crime_codes = list(crimes_in_category.keys())
 selected_label = st.sidebar.selectbox("Type of crime", crime_labels)
 selected_crime = crime_codes[crime_labels.index(selected_label)]
 
-
-# ---------- Load data ----------
-raw_data = load_criminality_data()
-
-raw_data = filter_crime_by_level(raw_data, geo_level)
-shapes = load_shapes(geo_level)
-
+_, periods = period_controls()
+smoothing = smoothing_control()
 
 # ---------- Compute Moran for all periods ----------
 results = {}
 
-for period_name, (start, end) in PERIODS_WITH_BASELINE.items():
-    result = compute_moran_for_period(shapes, raw_data, selected_crime, start, end)
+# analytical p-values are shown at once, the permutation results replace
+# them as soon as they are ready
+for period_name, (start, end) in periods.items():
+    result = load_progressive_moran(geo_level, selected_crime, start, end, smoothing)
     if result:
         results[period_name] = result
 if len(results) == 0:
     st.error("Not enough data for any period")
     st.stop()
 
+pending = [
+    periods[period_name] for period_name, res in results.items() if not res.get("permutations", PERMUTATIONS)
+]
+
+if pending:
+    @st.fragment(run_every="2s")
+    def refinement_status() -> None:
+        if all(moran_refined(geo_level, selected_crime, start, end, smoothing) for start, end in pending):
+            st.rerun()
+        st.info(f"Showing analytical p-values while {PERMUTATIONS:,} permutations run in the background...")
+
+    refinement_status()
+
 # ========== SECTION 1: Global Moran's I comparison ==========
 st.subheader("Global Moran's I - Temporal Comparison")
 
@@ -75,6 +85,7 @@ for i, (period_name, res) in enumerate(results.items()):
         st.markdown(f"**{period_name}**")
         st.metric("Moran's I", f"{res['moran_I']:.3f}")
         st.metric("p-value", f"{res['moran_p']:.4f}")
+        st.caption(inference_label(res))
         if res["moran_p"] < 0.05:
             if res["moran_p"] > 0:
                 st.success("Clustered")
@@ -88,7 +99,7 @@ st.markdown("---")
 
 periods_list = list(results.keys())
 moran_values = [results[p]["moran_I"] for p in periods_list]
-colors = [PERIOD_COLORS[p] for p in periods_list]
+colors = [PERIOD_COLORS.get(p, c) for p, c in zip(periods_list, PERIOD_COLORS.values())]
 
 fig_comparison = go.Figure()
 fig_comparison.add_trace(go.Bar(
@@ -137,79 +148,7 @@ if len(results) == 3:
 st.markdown("---")
 st.subheader("Moran Scatter Plots by Period")
 
-fig_scatter = make_subplots(
-    rows=1, cols=len(results),
-    subplot_titles=list(results.keys()),
-    horizontal_spacing=0.08
-)
-
-for col_idx, (period_name, res) in enumerate(results.items(), start=1):
-    gdf_period = res["gdf"]
-    y_std = res["y_std"]
-    y_lag = res["y_lag"]
-    quadrant = res["quadrant"]
-
-    for q in [1, 2, 3, 4]:
-        mask = quadrant == q
-        if mask.sum() > 0:
-            fig_scatter.add_trace(
-                go.Scatter(
-                    x=y_std[mask],
-                    y=y_lag[mask],
-                    mode="markers",
-                    marker=dict(color=QUADRANT_COLORS[q], size=8),
-                    name=QUADRANT_LABELS[q],
-                    text=gdf_period["AREA_NAME"].values[mask],
-                    hovertemplate="%{text}<br>Value: %{x:.2f}<br>Lag: %{y:.2f}<extra></extra>",
-                    showlegend=(col_idx == 1),
-                    legendgroup=QUADRANT_LABELS[q]
-                ),
-                row=1, col=col_idx
-            )
-    
-    # regression line
-    slope = res["moran_I"]
-    fig_scatter.add_trace(
-        go.Scatter(
-            x=[-3, 3],
-            y=[-3 * slope, 3 * slope],
-            mode="lines",
-            line=dict(color="black", dash="dash", width=1),
-            showlegend=False
-        ),
-        row=1, col=col_idx
-    )
-
-    # axis lines for each subplot
-    for col_idx in range(1, len(results) + 1):
-        # horizontal line at y=0
-        fig_scatter.add_shape(
-            type="line",
-            x0=-3.5, x1=3.5, y0=0, y1=0,
-            line=dict(color="gray", dash="dot"),
-            row=1, col=col_idx
-        )
-        # vertical line at x=0
-        fig_scatter.add_shape(
-            type="line",
-            x0=0, x1=0, y0=-3.5, y1=3.5,
-            line=dict(color="gray", dash="dot"),
-            row=1, col=col_idx
-        )
-
-fig_scatter.update_layout(
-    height=500,
-    margin=dict(b=100),
-    legend=dict(
-        orientation="h",
-        yanchor="top",
-        y=-0.2,
-        xanchor="center",
-        x=0.5
-    )
-)
-fig_scatter.update_xaxes(title_text="Standardized value", range=[-3.5, 3.5])
-fig_scatter.update_yaxes(title_text="Spatial lag", range=[-3.5, 3.5])
+fig_scatter = moran_scatter_figure(results)
 
 st.plotly_chart(fig_scatter, width="stretch")
 
@@ -218,41 +157,48 @@ st.plotly_chart(fig_scatter, width="stretch")
 st.markdown("---")
 st.subheader("LISA Cluster Maps by Period")
 st.markdown("Hot spots (High-High) and cold spots (Low-Low) with p < 0.05")
+st.caption(" · ".join(f"{period_name}: {inference_label(res)}" for period_name, res in results.items()))
+
+# the period selector only redraws the map, so it reruns as a fragment
+# against the results already computed above
+@st.fragment
+def lisa_map_section(results: dict) -> None:
+    selected_period = st.selectbox(
+        "Select period to display",
+        list(results.keys())
+    )
 
-selected_period = st.selectbox(
-    "Select period to display",
-    list(results.keys())
-)
+    res = results[selected_period]
+    gdf_lisa = res["gdf"]
+
+    fig_lisa = px.choropleth_map(
+        gdf_lisa,
+        geojson=gdf_lisa.geometry.__geo_interface__,
+        locations=gdf_lisa.index,
+        color="LISA_LABEL",
+        color_discrete_map=LISA_COLORS,
+        category_orders={"LISA_LABEL": list(LISA_COLORS.keys())},
+        map_style="carto-positron",
+        center={"lat": 42.0, "lon": 12.5},
+        zoom=5,
+        hover_name="AREA_NAME",
+        hover_data={
+            "OBS_VALUE": ":.1f",
+            "LISA_P": ":.4f",
+            "LISA_LABEL": True,
+            "AREA_NAME": False
+        },
+        labels={
+            "OBS_VALUE": "Mean value",
+            "LISA_P": "p-value",
+            "LISA_LABEL": "Cluster type"
+        }
+    )
 
-res = results[selected_period]
-gdf_lisa = res["gdf"]
+    fig_lisa.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0}, height=700)
+    st.plotly_chart(fig_lisa, width="stretch")
 
-fig_lisa = px.choropleth_map(
-    gdf_lisa,
-    geojson=gdf_lisa.geometry.__geo_interface__,
-    locations=gdf_lisa.index,
-    color="LISA_LABEL",
-    color_discrete_map=LISA_COLORS,
-    category_orders={"LISA_LABEL": list(LISA_COLORS.keys())},
-    map_style="carto-positron",
-    center={"lat": 42.0, "lon": 12.5},
-    zoom=5,
-    hover_name="AREA_NAME",
-    hover_data={
-        "OBS_VALUE": ":.1f",
-        "LISA_P": ":.4f",
-        "LISA_LABEL": True,
-        "AREA_NAME": False
-    },
-    labels={
-        "OBS_VALUE": "Mean value",
-        "LISA_P": "p-value",
-        "LISA_LABEL": "Cluster type"
-    }
-)
-
-fig_lisa.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0}, height=700)
-st.plotly_chart(fig_lisa, width="stretch")
+lisa_map_section(results)
 
 # ---------- Cluster summary ----------
 st.subheader("Cluster Distribution by Period")
@@ -287,6 +233,46 @@ fig_stacked.update_layout(height=400)
 st.plotly_chart(fig_stacked, width="stretch")
 
 
+# ========== SECTION 4: Weights sensitivity ==========
+st.markdown("---")
+st.subheader("Sensitivity to the Spatial Weights")
+st.markdown(
+    f"How much the results depend on the definition of neighbours: {', '.join(WEIGHT_SPECS)}. "
+    f"Stability is the share of specifications giving an area the same LISA label as {REFERENCE_SPEC}."
+)
+
+if st.toggle("Compare weights specifications", value=False):
+    labels, stats = weights_sensitivity(geo_level, [selected_crime], periods, smoothing=smoothing)
+
+    moran_table = stats.pivot(index="SPEC", columns="PERIOD", values="moran_I")
+    moran_table = moran_table.reindex(index=list(WEIGHT_SPECS), columns=list(results.keys()))
+    st.dataframe(moran_table.round(3), width="stretch")
+
+    stability = area_stability(labels)
+    gdf_stability = load_shapes(geo_level).merge(stability, on="NUTS_ID")
+
+    col1, col2 = st.columns(2)
+    col1.metric("Mean stability", f"{stability['STABILITY'].mean():.0%}")
+    col2.metric("Fully stable areas", f"{(stability['STABILITY'] == 1).sum()} / {len(stability)}")
+
+    fig_stability = px.choropleth_map(
+        gdf_stability,
+        geojson=gdf_stability.geometry.__geo_interface__,
+        locations=gdf_stability.index,
+        color="STABILITY",
+        color_continuous_scale="RdYlGn",
+        range_color=[0, 1],
+        map_style="carto-positron",
+        center={"lat": 42.0, "lon": 12.5},
+        zoom=5,
+        hover_name="AREA_NAME",
+        hover_data={"STABILITY": ":.0%", "CLUSTERED": True},
+        labels={"STABILITY": "Stability", "CLUSTERED": "Periods clustered (Queen)"}
+    )
+    fig_stability.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0}, height=600)
+    st.plotly_chart(fig_stability, width="stretch")
+
+
 # ---------- Footer ----------
 st.markdown("---")
 st.markdown(
@@ -0,0 +1,65 @@
+import time
+import duckdb
+import streamlit as st
+from query import run_query, EXAMPLE_QUERIES
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+st.set_page_config(
+    page_title="SQL Query",
+    layout="wide"
+)
+
+st.title("SQL Query")
+st.markdown(
+    "Ad-hoc SQL over the processed dataset. Tables: `crime` "
+    "(REF_AREA, TIME_PERIOD, TYPE_CRIME, OBS_VALUE, ...), `areas` "
+    "(NUTS_ID, AREA_NAME, LEVEL) and `crimes` (CODE, NAME, CATEGORY)."
+)
+
+
+# ---------- Query editor ----------
+example = st.selectbox("Example queries", list(EXAMPLE_QUERIES.keys()))
+
+sql = st.text_area(
+    "SQL",
+    value=EXAMPLE_QUERIES[example],
+    height=240,
+    key=f"sql_{example}"
+)
+
+run = st.button("Run query", type="primary")
+
+
+# ---------- Results ----------
+if run and sql.strip():
+    start = time.perf_counter()
+    try:
+        result = run_query(sql)
+    except (duckdb.Error, ValueError) as e:
+        st.error(str(e))
+    else:
+        elapsed = (time.perf_counter() - start) * 1000
+        st.caption(f"{len(result):,} rows in {elapsed:.0f} ms")
+        st.dataframe(result, hide_index=True, width="stretch")
+        st.download_button(
+            "Download CSV",
+            result.to_csv(index=False).encode(),
+            file_name="query_result.csv",
+            mime="text/csv"
+        )
+
+
+# ---------- Footer ----------
+st.markdown("---")
+st.markdown(
+    """
+    <div style="text-align: center; color: gray; font-size: 0.85em;">
+        Project for the course 'Geospatial Analysis and Representation for Data Science'
+        of the Master's Degree Course in Data Science of the University of Trento.<br><br>
+        Developed with 🐍 & ❤️ by Michele Brunelli | 2026
+    </div>
+    """,
+    unsafe_allow_html=True
+)
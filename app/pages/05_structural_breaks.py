@@ -0,0 +1,166 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from utils import (
+    load_breaks, load_shapes, load_year_panel, yearly_values, crime_position,
+    CRIME_CATEGORIES, GROUP_LEVELS
+)
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+st.set_page_config(
+    page_title="Structural Breaks",
+    layout="wide"
+)
+
+# levels of the break scan, the national series is a single area
+BREAK_LEVELS: dict[str, str] = {
+    "National": "national",
+    "Regions": "regions",
+    "Provinces": "provinces",
+    **GROUP_LEVELS,
+}
+
+# rows shown in the ranking table
+TOP_N = 50
+
+st.title("Structural Breaks")
+
+st.markdown("""
+Which series actually broke in 2020 and which only fluctuated? Every
+(area, crime) series is tested for a lasting shift in level on top of
+its 2014-2023 trend, at every candidate year. The strongest shift is the
+break of the series, kept only when it is significant after correcting
+for the number of years tested.
+""")
+
+# ---------- Sidebar filters ----------
+st.sidebar.header("Filters")
+
+level_label = st.sidebar.radio("Geographical level", list(BREAK_LEVELS), index=2)
+geo_level = BREAK_LEVELS[level_label]
+
+categories = ["All categories"] + list(CRIME_CATEGORIES.keys())
+selected_category = st.sidebar.selectbox("Category", categories)
+
+alpha = st.sidebar.select_slider("Significance level", options=[0.01, 0.05, 0.1], value=0.05)
+
+# ---------- Breaks ----------
+crime_names = {code: name for crimes in CRIME_CATEGORIES.values() for code, name in crimes.items()}
+if geo_level == "national":
+    area_names = {"IT": "Italy"}
+else:
+    area_names = load_shapes(geo_level).set_index("NUTS_ID")["AREA_NAME"].to_dict()
+
+breaks = load_breaks(geo_level)
+if selected_category != "All categories":
+    breaks = breaks[breaks["TYPE_CRIME"].isin(CRIME_CATEGORIES[selected_category].keys())]
+breaks = breaks.assign(
+    AREA_NAME=breaks["REF_AREA"].map(area_names).fillna(breaks["REF_AREA"]),
+    CRIME_NAME=breaks["TYPE_CRIME"].map(crime_names).fillna(breaks["TYPE_CRIME"]),
+    DIRECTION=breaks["SHIFT"].gt(0).map({True: "Increase", False: "Decrease"}),
+)
+significant = breaks[breaks["P_VALUE"] < alpha]
+
+if breaks.empty:
+    st.error("No series with enough years to test")
+    st.stop()
+
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    st.metric("Series tested", f"{len(breaks):,}")
+with col2:
+    st.metric("Significant breaks", f"{len(significant):,}", delta=f"{len(significant) / len(breaks):.0%} of series", delta_color="off")
+with col3:
+    st.metric("Breaking in 2020", f"{(significant['BREAK_YEAR'] == 2020).sum():,}")
+with col4:
+    share = (significant["BREAK_YEAR"] == 2020).mean() if len(significant) else 0.0
+    st.metric("Share of breaks in 2020", f"{share:.0%}")
+
+# ---------- Break years ----------
+st.subheader("When did the series break?")
+
+by_year = significant.groupby(["BREAK_YEAR", "DIRECTION"]).size().reset_index(name="SERIES")
+fig_years = px.bar(
+    by_year,
+    x="BREAK_YEAR",
+    y="SERIES",
+    color="DIRECTION",
+    color_discrete_map={"Increase": "#d73027", "Decrease": "#4575b4"},
+    labels={"BREAK_YEAR": "First year of the new level", "SERIES": "Significant breaks", "DIRECTION": "Shift"},
+)
+fig_years.update_layout(height=350, xaxis=dict(dtick=1))
+st.plotly_chart(fig_years, width="stretch")
+
+# ---------- Ranking ----------
+st.subheader("Strongest breaks")
+
+col_year, col_direction = st.columns(2)
+with col_year:
+    years = sorted(breaks["BREAK_YEAR"].unique())
+    selected_year = st.selectbox("Break year", ["Any year"] + years, index=1 + years.index(2020) if 2020 in years else 0)
+with col_direction:
+    selected_direction = st.radio("Shift", ["Both", "Increase", "Decrease"], horizontal=True)
+
+ranking = breaks if st.checkbox("Include breaks that are not significant") else significant
+if selected_year != "Any year":
+    ranking = ranking[ranking["BREAK_YEAR"] == selected_year]
+if selected_direction != "Both":
+    ranking = ranking[ranking["DIRECTION"] == selected_direction]
+ranking = ranking.head(TOP_N)
+
+if ranking.empty:
+    st.info("No break matches the filters")
+    st.stop()
+
+table = ranking[["AREA_NAME", "CRIME_NAME", "BREAK_YEAR", "BEFORE", "AFTER", "SHIFT_PCT", "STRENGTH", "P_VALUE"]]
+table.columns = ["Area", "Crime", "Break year", "Mean before", "Mean after", "Shift %", "Strength (F)", "p-value"]
+st.dataframe(
+    table.round({"Mean before": 1, "Mean after": 1, "Shift %": 1, "Strength (F)": 1, "p-value": 4}),
+    hide_index=True,
+    width="stretch"
+)
+
+# ---------- Series detail ----------
+st.subheader("Series detail")
+
+options = list(range(len(ranking)))
+selected_row = st.selectbox(
+    "Series",
+    options,
+    format_func=lambda i: f"{ranking.iloc[i]['AREA_NAME']} - {ranking.iloc[i]['CRIME_NAME']}"
+)
+row = ranking.iloc[selected_row]
+
+panel = load_year_panel(geo_level)
+area = list(panel["areas"]).index(row["REF_AREA"])
+values = yearly_values(panel)[area, crime_position(panel, row["TYPE_CRIME"])]
+series = pd.DataFrame({"YEAR": panel["years"], "OBS_VALUE": values}).dropna()
+
+before = series[series["YEAR"] < row["BREAK_YEAR"]]
+after = series[series["YEAR"] >= row["BREAK_YEAR"]]
+
+fig_series = go.Figure()
+fig_series.add_trace(go.Scatter(
+    x=series["YEAR"], y=series["OBS_VALUE"], mode="lines+markers", name="Observed", line=dict(color="#333333")
+))
+for segment, mean, color in [(before, row["BEFORE"], "#2166ac"), (after, row["AFTER"], "#b2182b")]:
+    fig_series.add_trace(go.Scatter(
+        x=[segment["YEAR"].min() - 0.4, segment["YEAR"].max() + 0.4], y=[mean, mean],
+        mode="lines", line=dict(color=color, dash="dash"), showlegend=False, hoverinfo="skip"
+    ))
+fig_series.add_vline(x=row["BREAK_YEAR"] - 0.5, line_dash="dot", line_color="gray")
+fig_series.update_layout(
+    height=400,
+    xaxis=dict(title="", dtick=1),
+    yaxis_title="Rate per 100k",
+    showlegend=False
+)
+st.plotly_chart(fig_series, width="stretch")
+
+st.caption(
+    f"Dashed lines: mean before and after {row['BREAK_YEAR']}. The shift of "
+    f"{row['SHIFT_PCT']:+.1f}% is net of the trend of the series (p = {row['P_VALUE']:.4f})."
+)
@@ -1,9 +1,8 @@
 import streamlit as st
 import pandas as pd
 from utils import (
-    load_criminality_data, filter_crime_by_level, 
-    calc_period_variation,get_all_variations,
-    BASELINE, PERIODS
+    load_variation_cube, get_all_variations,
+    PERIODS
 )
 
 CRIME_TYPES = {
@@ -44,24 +43,19 @@ geo_level = st.radio(
     horizontal=True
 )
 
-# load and filter data
-crime_data = load_criminality_data()
-crime_data = filter_crime_by_level(crime_data, geo_level)
+# mean variation of each crime type, all from the precomputed cube
+cube = load_variation_cube(geo_level)
+cube = cube[cube["TYPE_CRIME"].isin(CRIME_TYPES.keys()) & cube["PERIOD"].isin(PERIODS.keys())]
+means = cube.groupby(["TYPE_CRIME", "PERIOD"])["VAR"].mean().reset_index()
 
-# calculate variations for each crime type
-variations_list = []
-
-for code, name in CRIME_TYPES.items():
-    for period_name, (start, end) in PERIODS.items():
-        var_df = calc_period_variation(crime_data, code, BASELINE, (start, end))
-
-        if len(var_df) > 0:
-            mean_var = var_df["VAR"].mean()
-            variations_list.append({
-                "Crime Type": name,
-                "Period": period_name,
-                "Average Variation (%)": mean_var
-            })
+variations_list = [
+    {
+        "Crime Type": CRIME_TYPES[row.TYPE_CRIME],
+        "Period": row.PERIOD,
+        "Average Variation (%)": row.VAR
+    }
+    for row in means.itertuples()
+]
 
 # create and pivot dataframe
 if variations_list:
@@ -120,6 +114,23 @@ remote work/education).
 may have contributed to these patterns.
 """)
 
+with st.expander("National variation of every crime"):
+    st.dataframe(
+        variations_national,
+        hide_index=True,
+        column_config={
+            "code": "Code",
+            "name": "Crime",
+            "category": "Category",
+            "pre_covid_avg": st.column_config.NumberColumn("Pre-COVID rate", format="%.1f"),
+            "during_covid_avg": st.column_config.NumberColumn("During COVID rate", format="%.1f"),
+            "post_covid_avg": st.column_config.NumberColumn("Post-COVID rate", format="%.1f"),
+            "variation_pct": st.column_config.NumberColumn("During COVID (%)", format="%+.1f%%"),
+            "post_variation_pct": st.column_config.NumberColumn("Post-COVID (%)", format="%+.1f%%"),
+        },
+        width="stretch"
+    )
+
 # ---------- Data & Methods ----------
 st.markdown("---")
 st.header("Data & Methods")
@@ -0,0 +1,86 @@
+import duckdb
+import pandas as pd
+import streamlit as st
+from utils import (
+    load_shapes, data_manifest,
+    CRIME_CATEGORIES, CRIMINALITY_DIR, GEO_LEVELS
+)
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+EXAMPLE_QUERIES: dict[str, str] = {
+    "Top 10 provinces by cybercrime growth": """
+SELECT a.AREA_NAME,
+       avg(c.OBS_VALUE) FILTER (WHERE c.TIME_PERIOD BETWEEN 2014 AND 2019) AS baseline,
+       avg(c.OBS_VALUE) FILTER (WHERE c.TIME_PERIOD BETWEEN 2020 AND 2023) AS after,
+       (after - baseline) / baseline * 100 AS growth_pct
+FROM crime c JOIN areas a ON a.NUTS_ID = c.REF_AREA
+WHERE c.TYPE_CRIME = 'CYBERCRIM' AND a.LEVEL = 'provinces'
+GROUP BY a.AREA_NAME
+ORDER BY growth_pct DESC
+LIMIT 10
+""".strip(),
+    "National trend by crime category": """
+-- detailed offences only: the [TOTAL] codes already include them
+SELECT k.CATEGORY, c.TIME_PERIOD, sum(c.OBS_VALUE) AS rate
+FROM crime c JOIN crimes k ON k.CODE = c.TYPE_CRIME
+WHERE c.REF_AREA = 'IT' AND k.CODE NOT LIKE '%TOT%' AND k.NAME NOT LIKE '%[TOTAL]%'
+GROUP BY ALL
+ORDER BY k.CATEGORY, c.TIME_PERIOD
+""".strip(),
+}
+
+
+@st.cache_resource
+def get_connection() -> duckdb.DuckDBPyConnection:
+    """In-process DuckDB database with the processed dataset attached as views
+
+    The `crime` view scans the yearly parquet partitions at query time, so
+    each query reads only the columns and row groups it needs. The connection
+    can read nothing else and its configuration is locked.
+    """
+    con = duckdb.connect(database=":memory:")
+    con.execute(f"CREATE VIEW crime AS SELECT * FROM read_parquet('{CRIMINALITY_DIR}/*.parquet')")
+
+    areas = pd.concat(
+        [
+            pd.DataFrame(load_shapes(level)[["NUTS_ID", "AREA_NAME"]]).assign(LEVEL=level)
+            for level in GEO_LEVELS.values()
+        ],
+        ignore_index=True
+    )
+    crimes = pd.DataFrame(
+        [
+            (code, name, category)
+            for category, crimes_in_category in CRIME_CATEGORIES.items()
+            for code, name in crimes_in_category.items()
+        ],
+        columns=["CODE", "NAME", "CATEGORY"]
+    )
+    for name, df in {"areas": areas, "crimes": crimes}.items():
+        con.register(f"{name}_df", df)
+        con.execute(f"CREATE TABLE {name} AS SELECT * FROM {name}_df")
+        con.unregister(f"{name}_df")
+
+    con.execute(f"SET allowed_directories = ['{CRIMINALITY_DIR}/']")
+    con.execute("SET enable_external_access = false")
+    con.execute("SET lock_configuration = true")
+    return con
+
+@st.cache_data(show_spinner="Running query...", max_entries=256)
+def cached_query(sql: str, manifest: str) -> pd.DataFrame:
+    """Result of a query, cached until the data (`manifest`) changes"""
+    # one cursor per call: connections are not shared between threads
+    return get_connection().cursor().execute(sql).df()
+
+def run_query(sql: str) -> pd.DataFrame:
+    """Run a single SELECT query over the processed data
+
+    Tables: `crime` (the processed dataset), `areas` (NUTS_ID, AREA_NAME,
+    LEVEL) and `crimes` (CODE, NAME, CATEGORY).
+    """
+    statements = get_connection().extract_statements(sql)
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise ValueError("Only a single SELECT query is allowed")
+    return cached_query(sql.strip().rstrip(";"), data_manifest())
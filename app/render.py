@@ -0,0 +1,190 @@
+import io
+import os
+import threading
+import numpy as np
+import geopandas as gpd
+import matplotlib
+import streamlit as st
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
+from disk_cache import CACHE_DIR, cache_key, evict
+from charts import scatter_mode, AXIS_RANGE, DENSITY_BINS, OUTLIER_Z
+from utils import (
+    load_shapes, load_period_variation, load_trend_deviation, window_values, moran_result,
+    data_manifest, window_years, needs_population,
+    BASELINE, LISA_COLORS, QUADRANT_COLORS, QUADRANT_LABELS
+)
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+# no display: render straight to image buffers
+matplotlib.use("Agg")
+
+# bump when the look of the maps changes, older images are then re-rendered
+RENDER_VERSION = 1
+
+IMAGE_DIR = CACHE_DIR / "images"
+
+# metric -> (column, legend title)
+METRICS: dict[str, tuple[str, str]] = {
+    "variation": ("VAR", "Variation from 2014-2019 (%)"),
+    "trend": ("VAR", "Deviation from the 2014-2019 trend (%)"),
+    "rate": ("OBS_VALUE", "Rate per 100k"),
+    "lisa": ("LISA_LABEL", "LISA cluster"),
+}
+
+FORMATS: list[str] = ["png", "webp"]
+
+NO_DATA_COLOR = "#d9d9d9"
+
+
+# ---------- Data ----------
+def map_frame(level: str, crime: str, period: tuple[int, int], metric: str) -> gpd.GeoDataFrame:
+    """Shapes of a level with the value of a metric, NaN where there is no data"""
+    shapes = load_shapes(level)
+
+    if metric == "variation":
+        values = load_period_variation(level, crime, BASELINE, period)
+        values = values[["REF_AREA", "VAR"]]
+    elif metric == "trend":
+        values = load_trend_deviation(level, crime, BASELINE, period)
+        values = values[["REF_AREA", "VAR"]]
+    elif metric == "rate":
+        values = window_values(level, crime, *period)
+    elif metric == "lisa":
+        res = moran_result(level, crime, *period)
+        gdf = res["gdf"] if res is not None else shapes.iloc[:0].assign(LISA_LABEL=[])
+        values = gdf[["NUTS_ID", "LISA_LABEL"]].rename(columns={"NUTS_ID": "REF_AREA"})
+    else:
+        raise ValueError(f"Unknown metric '{metric}'")
+
+    values = values.assign(REF_AREA=values["REF_AREA"].astype(str))
+    return shapes.merge(values, left_on="NUTS_ID", right_on="REF_AREA", how="left")
+
+def input_years(metric: str, period: tuple[int, int]) -> list[int]:
+    """Years of data a map depends on"""
+    return window_years(BASELINE, period) if metric in ("variation", "trend") else window_years(period)
+
+
+# ---------- Drawing ----------
+def draw_map(ax, gdf: gpd.GeoDataFrame, metric: str, title: str | None = None, legend: bool = True) -> None:
+    """Choropleth of a metric on a matplotlib axis, same colours as the app"""
+    column, label = METRICS[metric]
+    missing = gdf[column].isna()
+    gdf[missing].plot(ax=ax, color=NO_DATA_COLOR, edgecolor="white", linewidth=0.3)
+
+    if metric == "lisa":
+        gdf[~missing].plot(
+            ax=ax, color=gdf.loc[~missing, column].map(LISA_COLORS), edgecolor="white", linewidth=0.3
+        )
+        if legend:
+            handles = [Patch(facecolor=color, label=name) for name, color in LISA_COLORS.items()]
+            ax.legend(handles=handles, loc="lower left", fontsize=7, frameon=False)
+    else:
+        kwargs = {"cmap": "RdYlGn_r", "vmin": -80, "vmax": 80} if metric != "rate" else {"cmap": "Reds"}
+        gdf[~missing].plot(
+            ax=ax, column=column, edgecolor="white", linewidth=0.3,
+            legend=legend, legend_kwds={"label": label, "shrink": 0.6}, **kwargs
+        )
+
+    ax.set_axis_off()
+    if title:
+        ax.set_title(title, fontsize=10)
+
+def to_bytes(fig: Figure, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, dpi=fig.dpi, bbox_inches="tight")
+    return buf.getvalue()
+
+def render_map(level: str, crime: str, period: tuple[int, int], metric: str, fmt: str = "png", width: int = 800) -> bytes:
+    """Rasterise the map of one (level, crime, period, metric)"""
+    # Figure instead of pyplot: no global state, safe from several threads
+    fig = Figure(figsize=(width / 100, width / 100 * 1.1), dpi=100)
+    draw_map(fig.add_subplot(), map_frame(level, crime, period, metric), metric)
+    return to_bytes(fig, fmt)
+
+
+# ---------- Cache ----------
+def map_image(level: str, crime: str, period: tuple[int, int], metric: str, fmt: str = "png", width: int = 800) -> bytes:
+    """Rendered map, stored on disk next to the results cache
+
+    Images are keyed like cached results, on the data partitions they depend
+    on, so they are re-rendered only when their inputs change.
+    """
+    manifest = f"{RENDER_VERSION}:{data_manifest(input_years(metric, period), population=needs_population(level), level=level)}"
+    args = (level, crime, tuple(period), metric, width)
+    path = IMAGE_DIR / f"{cache_key(manifest, map_image, args, {})}.{fmt}"
+
+    try:
+        image = path.read_bytes()
+        os.utime(path)  # mark as recently used
+        return image
+    except OSError:
+        pass
+
+    image = render_map(level, crime, period, metric, fmt, width)
+
+    IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(image)
+    os.replace(tmp, path)
+    evict()
+    return image
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_map_image(level: str, crime: str, period: tuple[int, int], metric: str, fmt: str = "webp", width: int = 800) -> bytes:
+    """Cached map image for the pages"""
+    return map_image(level, crime, period, metric, fmt, width)
+
+
+# ---------- Report ----------
+def lisa_comparison_image(level: str, crimes: dict[str, str], periods: list[tuple[int, int]], fmt: str = "png") -> bytes:
+    """Grid of LISA maps, one row per crime and one column per period"""
+    fig = Figure(figsize=(4 * len(periods), 4.4 * len(crimes)), dpi=150)
+    axes = fig.subplots(len(crimes), len(periods), squeeze=False)
+    for row, (crime, name) in enumerate(crimes.items()):
+        for col, period in enumerate(periods):
+            title = f"({chr(ord('a') + row)}) {name}, {period[0]}-{period[1]}"
+            legend = row == len(crimes) - 1 and col == 0
+            draw_map(axes[row][col], map_frame(level, crime, period, "lisa"), "lisa", title, legend)
+    return to_bytes(fig, fmt)
+
+def moran_scatter_image(results: dict[str, dict], fmt: str = "png") -> bytes:
+    """Moran scatter plots of several periods side by side, as drawn by `moran_scatter_figure`
+
+    Periods with more than `DENSITY_THRESHOLD` areas are drawn as a binned
+    density with the areas beyond `OUTLIER_Z` on top, like in the app.
+    """
+    fig = Figure(figsize=(12, 5), dpi=200)
+    axes = fig.subplots(1, max(len(results), 1), squeeze=False, sharey=True)[0]
+    for ax, (period_name, res) in zip(axes, results.items()):
+        y_std, y_lag = res["y_std"], res["y_lag"]
+        shown = np.ones(len(y_std), dtype=bool)
+        if scatter_mode(len(y_std)) == "density":
+            edges = np.linspace(-AXIS_RANGE, AXIS_RANGE, DENSITY_BINS + 1)
+            counts, _, _ = np.histogram2d(y_std, y_lag, bins=[edges, edges])
+            ax.pcolormesh(edges, edges, np.where(counts > 0, counts, np.nan).T, cmap="Greys")
+            shown = (np.abs(y_std) > OUTLIER_Z) | (np.abs(y_lag) > OUTLIER_Z)
+
+        for q in [1, 2, 3, 4]:
+            selected = shown & (res["quadrant"] == q)
+            ax.scatter(
+                y_std[selected], y_lag[selected], s=14, color=QUADRANT_COLORS[q],
+                label=QUADRANT_LABELS[q], linewidths=0
+            )
+        slope = res["moran_I"]
+        ax.plot([-3, 3], [-3 * slope, 3 * slope], color="black", linestyle="--", linewidth=1)
+        ax.axhline(0, color="gray", linestyle=":", linewidth=1)
+        ax.axvline(0, color="gray", linestyle=":", linewidth=1)
+
+        ax.set_xlim(-AXIS_RANGE, AXIS_RANGE)
+        ax.set_ylim(-AXIS_RANGE, AXIS_RANGE)
+        ax.set_title(period_name, fontsize=10)
+        ax.set_xlabel("Standardized value")
+    axes[0].set_ylabel("Spatial lag")
+
+    handles, labels = axes[0].get_legend_handles_labels()
+    fig.legend(handles, labels, loc="lower center", ncol=4, frameon=False)
+    fig.subplots_adjust(bottom=0.22, wspace=0.08)
+    return to_bytes(fig, fmt)
@@ -0,0 +1,198 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import streamlit as st
+from scipy.spatial import cKDTree
+from libpysal.weights import W, Rook
+import workers
+from disk_cache import persistent
+from utils import (
+    load_shapes, load_weights, load_nearest, window_values, compute_moran_for_period,
+    moran_result, moran_args, data_manifest, window_years, needs_population,
+    PERMUTATION_SEED
+)
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+# equal-area projection for Europe, distances between centroids in metres
+PROJECTED_CRS = "EPSG:3035"
+
+# name -> (kind, parameter): k for KNN, multiple of the smallest band
+# without islands for distance bands
+WEIGHT_SPECS: dict[str, tuple[str, float]] = {
+    "Queen": ("queen", 0),
+    "Rook": ("rook", 0),
+    "KNN-4": ("knn", 4),
+    "KNN-8": ("knn", 8),
+    "Distance band": ("band", 1.0),
+    "Distance band x1.5": ("band", 1.5),
+}
+
+# labels are compared against the weights used everywhere else in the app
+REFERENCE_SPEC = "Queen"
+
+
+# ---------- Weights ----------
+def projected_centroids(shapes: gpd.GeoDataFrame) -> np.ndarray:
+    centroids = shapes.geometry.to_crs(PROJECTED_CRS).centroid
+    return np.column_stack([centroids.x, centroids.y])
+
+def knn_weights(xy: np.ndarray, ids: list[str], k: int) -> W:
+    """k nearest centroids of each area, from a KD-tree query"""
+    k = min(k, len(ids) - 1)
+    _, idx = cKDTree(xy).query(xy, k=k + 1)
+    neighbors = {ids[i]: [ids[j] for j in row if j != i][:k] for i, row in enumerate(idx)}
+    return W(neighbors, id_order=ids, silence_warnings=True)
+
+def band_weights(xy: np.ndarray, ids: list[str], factor: float = 1.0) -> W:
+    """Binary distance band, `factor` times the smallest threshold leaving no island"""
+    tree = cKDTree(xy)
+    dist, _ = tree.query(xy, k=2)
+    threshold = dist[:, 1].max() * factor
+
+    neighbors: dict[str, list[str]] = {i: [] for i in ids}
+    for i, j in tree.query_pairs(threshold, output_type="ndarray"):
+        neighbors[ids[i]].append(ids[j])
+        neighbors[ids[j]].append(ids[i])
+    return W(neighbors, id_order=ids, silence_warnings=True)
+
+@st.cache_data
+def load_spec_weights(level: str, spec: str) -> W:
+    """Weights of a level for one of `WEIGHT_SPECS`, indexed by NUTS_ID"""
+    kind, param = WEIGHT_SPECS[spec]
+    if kind == "queen":
+        return load_weights(level)
+
+    shapes = load_shapes(level)
+    ids = shapes["NUTS_ID"].tolist()
+    if kind == "rook":
+        return Rook.from_dataframe(shapes, ids=ids, silence_warnings=True)
+    xy = projected_centroids(shapes)
+    if kind == "knn":
+        return knn_weights(xy, ids, int(param))
+    if kind == "band":
+        return band_weights(xy, ids, param)
+    raise ValueError(f"Unknown weights kind '{kind}'")
+
+
+# ---------- Sweep ----------
+def sensitivity_job(
+        level: str,
+        crime_type: str,
+        start_year: int,
+        end_year: int,
+        spec: str,
+        smoothing: str | None = None
+) -> dict | None:
+    """Moran statistics of one (level, crime, period) with one weights spec, run inside a worker process"""
+    return compute_moran_for_period(
+        load_shapes(level), window_values(level, crime_type, start_year, end_year, smoothing),
+        w=load_spec_weights(level, spec), nearest=load_nearest(level)
+    )
+
+# the (kind, parameter) of the spec is part of the key, not just its name
+@persistent(lambda level, crime_type, start_year, end_year, spec, smoothing=None: f"{PERMUTATION_SEED}:{WEIGHT_SPECS[spec]}:" + data_manifest(
+    window_years((start_year, end_year)), population=needs_population(level, smoothing), level=level
+))
+def sensitivity_result(
+        level: str,
+        crime_type: str,
+        start_year: int,
+        end_year: int,
+        spec: str,
+        smoothing: str | None = None
+) -> dict | None:
+    """Moran statistics with one weights spec, persisted on disk"""
+    return workers.run(sensitivity_job, level, crime_type, start_year, end_year, spec, smoothing)
+
+@st.cache_data(show_spinner="Comparing weights specifications...")
+def weights_sensitivity(
+        level: str,
+        crimes: list[str],
+        periods: dict[str, tuple[int, int]],
+        specs: list[str] | None = None,
+        smoothing: str | None = None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """LISA labels and global Moran's I for every crime, period and weights spec
+
+    Returns a long frame of labels (CRIME, PERIOD, SPEC, NUTS_ID, LISA_LABEL)
+    and one of global statistics (CRIME, PERIOD, SPEC, moran_I, moran_p),
+    on raw or smoothed rates (see `SMOOTHING`). Every combination is a
+    separate job, so the grid is spread over the worker pool. All specs
+    draw their permutations from the same seed, so labels only change
+    where the neighbours do.
+    """
+    specs = specs or list(WEIGHT_SPECS)
+    if REFERENCE_SPEC not in specs:
+        specs = [REFERENCE_SPEC, *specs]
+    grid = [
+        (crime, period_name, start, end, spec)
+        for crime in crimes
+        for period_name, (start, end) in periods.items()
+        for spec in specs
+    ]
+
+    def run(job: tuple) -> dict | None:
+        crime, _, start, end, spec = job
+        if spec == REFERENCE_SPEC:
+            # the result shown everywhere else in the app, not computed again
+            return moran_result(*moran_args(level, crime, start, end, smoothing))
+        return sensitivity_result(level, crime, start, end, spec, smoothing)
+
+    with ThreadPoolExecutor(max_workers=max(workers.MAX_WORKERS, 1) * 2) as executor:
+        results = list(executor.map(run, grid))
+
+    labels, stats = [], []
+    for (crime, period_name, _, _, spec), res in zip(grid, results):
+        if res is None:
+            continue
+        labels.append(pd.DataFrame({
+            "CRIME": crime,
+            "PERIOD": period_name,
+            "SPEC": spec,
+            "NUTS_ID": res["gdf"]["NUTS_ID"].astype(str).to_numpy(),
+            "LISA_LABEL": res["gdf"]["LISA_LABEL"].to_numpy(),
+        }))
+        stats.append({
+            "CRIME": crime, "PERIOD": period_name, "SPEC": spec,
+            "moran_I": res["moran_I"], "moran_p": res["moran_p"],
+        })
+
+    label_columns = ["CRIME", "PERIOD", "SPEC", "NUTS_ID", "LISA_LABEL"]
+    labels_df = pd.concat(labels, ignore_index=True) if labels else pd.DataFrame(columns=label_columns)
+    stats_df = pd.DataFrame(stats, columns=["CRIME", "PERIOD", "SPEC", "moran_I", "moran_p"])
+    return labels_df, stats_df
+
+
+# ---------- Stability ----------
+def label_stability(labels: pd.DataFrame, reference: str = REFERENCE_SPEC) -> pd.DataFrame:
+    """Share of weights specs giving each area the same LISA label as `reference`
+
+    One row per (CRIME, PERIOD, NUTS_ID) with the reference label, the label
+    most specs agree on and STABILITY in [0, 1].
+    """
+    wide = labels.pivot_table(
+        index=["CRIME", "PERIOD", "NUTS_ID"], columns="SPEC", values="LISA_LABEL", aggfunc="first"
+    )
+    ref = wide[reference]
+    agree = wide.eq(ref, axis=0) & wide.notna()
+
+    return pd.DataFrame({
+        "REFERENCE_LABEL": ref,
+        "MODAL_LABEL": wide.mode(axis=1)[0],
+        "STABILITY": agree.sum(axis=1) / wide.notna().sum(axis=1),
+    }).reset_index()
+
+def area_stability(labels: pd.DataFrame, reference: str = REFERENCE_SPEC) -> pd.DataFrame:
+    """Mean stability of each area over crimes and periods, least stable first"""
+    stability = label_stability(labels, reference)
+    clustered = stability["REFERENCE_LABEL"] != "Not significant"
+    return (
+        stability.assign(CLUSTERED=clustered)
+        .groupby("NUTS_ID")
+        .agg(STABILITY=("STABILITY", "mean"), CLUSTERED=("CLUSTERED", "sum"), N=("STABILITY", "size"))
+        .sort_values("STABILITY")
+        .reset_index()
+    )
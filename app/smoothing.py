@@ -0,0 +1,66 @@
+import numpy as np
+import scipy.sparse as sp
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+# rates are per 100,000 inhabitants, exposures are counted in the same unit
+RATE_UNIT = 100_000
+
+
+def _shrink(rates: np.ndarray, exposure: np.ndarray, prior_mean: np.ndarray, prior_var: np.ndarray) -> np.ndarray:
+    """Weighted mean of each rate and its prior, weighted by how reliable the rate is"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = prior_var / (prior_var + prior_mean / exposure)
+    smoothed = weight * rates + (1 - weight) * prior_mean
+    # rates without an exposure or a usable prior are kept as they are
+    return np.where(np.isfinite(smoothed), smoothed, rates)
+
+def global_eb(rates: np.ndarray, population: np.ndarray) -> np.ndarray:
+    """Global empirical Bayes rates (Marshall's method of moments)
+
+    `rates` has areas on the first axis and any other axes after it (e.g.
+    areas x crimes x years), `population` broadcasts against it. Every
+    series along the first axis is shrunk towards its population weighted
+    mean, more so where the population is small.
+    """
+    exposure = np.broadcast_to(population / RATE_UNIT, rates.shape)
+    valid = ~np.isnan(rates) & (exposure > 0)
+    n = np.where(valid, exposure, 0.0)
+    r = np.where(valid, rates, 0.0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = n.sum(axis=0)
+        mean = (n * r).sum(axis=0) / total
+        var = (n * (r - mean) ** 2).sum(axis=0) / total
+        prior_var = np.maximum(var - mean / (total / valid.sum(axis=0)), 0)
+
+    return np.where(valid, _shrink(rates, exposure, mean, prior_var), rates)
+
+def spatial_eb(rates: np.ndarray, population: np.ndarray, w: sp.spmatrix) -> np.ndarray:
+    """Spatial empirical Bayes rates: the prior of each area comes from its neighbours
+
+    `w` is an (areas x areas) sparse contiguity matrix in the order of the
+    first axis of `rates`. Each area and its neighbours form the local
+    reference population, so all moments are a few sparse products over
+    every crime and year at once.
+    """
+    shape = rates.shape
+    exposure = np.broadcast_to(population / RATE_UNIT, shape)
+    valid = ~np.isnan(rates) & (exposure > 0)
+    n = np.where(valid, exposure, 0.0).reshape(shape[0], -1)
+    r = np.where(valid, rates, 0.0).reshape(shape[0], -1)
+
+    local = (sp.csr_matrix(w, dtype=float) != 0).astype(float) + sp.identity(shape[0], format="csr")
+    local_n = local @ n
+    local_e = local @ (n * r)
+    local_e2 = local @ (n * r ** 2)
+    local_k = local @ valid.reshape(shape[0], -1).astype(float)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = local_e / local_n
+        var = (local_e2 - 2 * mean * local_e + mean ** 2 * local_n) / local_n
+        prior_var = np.maximum(var - mean / (local_n / local_k), 0)
+
+    smoothed = _shrink(rates, exposure, mean.reshape(shape), prior_var.reshape(shape))
+    return np.where(valid, smoothed, rates)
@@ -0,0 +1,101 @@
+import hashlib
+from pathlib import Path
+import numpy as np
+import geopandas as gpd
+from libpysal.weights import W, Queen, KNN
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+# bump when the layout of the artefacts changes, older files are then rebuilt
+TOPOLOGY_VERSION = 1
+
+# nearest areas kept per area, enough to attach islands of most subsets
+NEAREST_K = 8
+
+
+def topology_path(shapes_path: Path) -> Path:
+    """Artefact stored next to a geoparquet file, e.g. nuts3_it.topology.npz"""
+    return shapes_path.with_name(f"{shapes_path.stem}.topology.npz")
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def build_topology(shapes: gpd.GeoDataFrame) -> dict[str, np.ndarray]:
+    """Queen contiguity (CSR) and the nearest areas of every row of `shapes`
+
+    Areas are referenced by row position, so the artefact does not depend on
+    how ids are relabelled when the shapes are loaded.
+    """
+    positions = list(range(len(shapes)))
+    queen = Queen.from_dataframe(shapes, ids=positions, silence_warnings=True)
+    csr = queen.sparse.tocsr()
+
+    k = min(NEAREST_K, len(shapes) - 1)
+    knn = KNN.from_dataframe(shapes, k=k, ids=positions)
+    # KNN lists neighbours closest first
+    nearest = np.array([knn.neighbors[i] for i in positions], dtype=np.int32)
+
+    return {
+        "indptr": csr.indptr.astype(np.int32),
+        "indices": csr.indices.astype(np.int32),
+        "nearest": nearest,
+        "ids": shapes["NUTS_ID"].to_numpy(dtype=str),
+    }
+
+def save_topology(shapes_path: Path, shapes: gpd.GeoDataFrame | None = None) -> Path:
+    """Build the topology of a geoparquet file and store it alongside"""
+    if shapes is None:
+        shapes = gpd.read_parquet(shapes_path)
+    out = topology_path(shapes_path)
+    np.savez_compressed(
+        out,
+        version=TOPOLOGY_VERSION,
+        shapes_sha256=file_hash(shapes_path),
+        **build_topology(shapes)
+    )
+    return out
+
+def load_topology(shapes_path: Path) -> dict[str, np.ndarray] | None:
+    """Stored topology of a geoparquet file, None if missing or built for other shapes"""
+    path = topology_path(shapes_path)
+    try:
+        with np.load(path) as npz:
+            topo = {key: npz[key] for key in npz.files}
+    except (OSError, ValueError):
+        return None
+
+    if int(topo["version"]) != TOPOLOGY_VERSION or str(topo["shapes_sha256"]) != file_hash(shapes_path):
+        return None
+    return topo
+
+def topology_weights(topo: dict[str, np.ndarray], ids: list[str]) -> W:
+    """Binary Queen weights labelled with `ids` (one per row of the shapes)"""
+    indptr, indices = topo["indptr"], topo["indices"]
+    neighbors = {
+        ids[i]: [ids[j] for j in indices[indptr[i]:indptr[i + 1]]]
+        for i in range(len(ids))
+    }
+    return W(neighbors, id_order=ids, silence_warnings=True)
+
+def topology_nearest(topo: dict[str, np.ndarray], ids: list[str]) -> dict[str, list[str]]:
+    """Nearest areas of each area, closest first"""
+    return {ids[i]: [ids[j] for j in row] for i, row in enumerate(topo["nearest"])}
+
+def attach_nearest(w: W, nearest: dict[str, list[str]]) -> W | None:
+    """Same as `attach_islands`, using precomputed nearest areas instead of a KNN
+
+    Each island is linked to its closest area that is part of `w`. Returns
+    None when an island has none of its stored nearest areas in `w`.
+    """
+    neighbors = {i: list(nbs) for i, nbs in w.neighbors.items()}
+    weights = {i: list(ws) for i, ws in w.weights.items()}
+    for island in w.islands:
+        nb = next((j for j in nearest[island] if j in neighbors and j != island), None)
+        if nb is None:
+            return None
+        neighbors[island] = [nb]
+        weights[island] = [1.0]
+        neighbors[nb] = neighbors[nb] + [island]
+        weights[nb] = weights[nb] + [1.0]
+    return W(neighbors, weights, id_order=w.id_order, silence_warnings=True)
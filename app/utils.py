@@ -1,11 +1,24 @@
+import hashlib
+import json
 import warnings
+from collections.abc import Iterable
+from concurrent.futures import wait
 import streamlit as st
 import pandas as pd
 import geopandas as gpd
 import numpy as np
+import scipy.sparse as sp
+from scipy import stats
 from pathlib import Path
-from libpysal.weights import Queen, KNN, attach_islands
+from shapely import STRtree, Point, box
+from libpysal.weights import W, Queen, KNN, attach_islands, w_subset
 from esda.moran import Moran, Moran_Local
+import workers
+from disk_cache import persistent
+from smoothing import global_eb, spatial_eb
+from topology import load_topology, save_topology, build_topology, topology_weights, topology_nearest, attach_nearest
+from crosswalk import load_crosswalk, save_crosswalk, crosswalk_matrix, reaggregate
+from hierarchy import GROUPINGS, group_labels, group_matrix, group_rates, group_totals, dissolve_groups
 
 # pyright: reportAttributeAccessIssue=false
 # pyright: reportCallIssue=false
@@ -45,6 +58,12 @@ GEO_LEVELS: dict[str, str] = {
     "Macro-areas": "macro-areas",
 }
 
+# groups of provinces offered as levels, rolled up from the provinces (see hierarchy.py)
+GROUP_LEVELS: dict[str, str] = {
+    "North / Centre / South": "north-south",
+    "Metropolitan cities": "metropolitan",
+}
+
 CRIME_CATEGORIES: dict[str, dict[str, str]] = {
     "Homicide": {
         "INTENHOM": "Intentional homicide - [TOTAL]",
@@ -171,25 +190,194 @@ CRIMES_TO_CHECK: list[tuple[str, str]] = [
 
 
 # ---------- Data loading ----------
+# one parquet partition per year, named <year>.parquet
+CRIMINALITY_DIR: Path = DATA_PATH / "processed/criminality_clean"
+
+# resident population, cleaned from the "population" flow of ingest_sdmx.py
+POPULATION_DIR: Path = DATA_PATH / "processed/population_clean"
+
+# permutations behind the pseudo p-values of Moran's I and LISA
+PERMUTATIONS: int = 999
+
+# seed of the LISA permutations: reruns give the same clusters, and so do
+# two weights specifications where an area has the same neighbours
+PERMUTATION_SEED: int = 20200309
+
+# seconds to wait for a permutation result before showing analytical p-values
+REFINED_WAIT: float = 0.2
+
+# rates used by the spatial statistics: raw, or empirical Bayes smoothed
+# with the population as exposure
+SMOOTHING: dict[str, str | None] = {
+    "Raw rates": None,
+    "Global empirical Bayes": "global",
+    "Spatial empirical Bayes": "spatial",
+}
+
+# fewest observed years on each side of a structural break
+BREAK_MIN_SEGMENT: int = 2
+
+SHAPE_FILES: dict[str, str] = {
+    "provinces": "nuts3_it.geoparquet",
+    "regions": "nuts2_it.geoparquet",
+    "macro-areas": "nuts1_it.geoparquet",
+}
+
+# shapes in the NUTS version ISTAT codes the data with, built by build_shapes.py
+# when available; the data is then interpolated to the areas of SHAPE_FILES
+DATA_SHAPE_FILES: dict[str, str] = {
+    "provinces": "nuts3_it_2021.geoparquet",
+    "regions": "nuts2_it_2021.geoparquet",
+    "macro-areas": "nuts1_it_2021.geoparquet",
+}
+
+def data_manifest(years: Iterable[int] | None = None, population: bool = False, level: str | None = None) -> str:
+    """Short hash identifying the version of the shapes and of the data for `years`
+
+    Without `years` every yearly partition is included, an empty `years` covers
+    the shapes only. Results depending on a period window hash just the
+    partitions of that window, so appending a new year leaves them valid.
+    With `population` the population partitions of the same years are
+    included too, with a grouped `level` the definition of its groups.
+    """
+    shape_files = sorted(SHAPE_FILES.values()) + sorted(DATA_SHAPE_FILES.values())
+    paths = [DATA_PATH / "shapes" / name for name in shape_files]
+    dirs = [CRIMINALITY_DIR, POPULATION_DIR] if population else [CRIMINALITY_DIR]
+    for directory in dirs:
+        if years is None:
+            paths += sorted(directory.glob("*.parquet"))
+        else:
+            paths += [directory / f"{year}.parquet" for year in sorted(set(years))]
+
+    digest = hashlib.sha256()
+    if level in GROUPINGS:
+        digest.update(json.dumps(GROUPINGS[level], sort_keys=True).encode())
+    for path in paths:
+        if path.exists():
+            stat = path.stat()
+            digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+def needs_population(level: str, smoothing: str | None = None) -> bool:
+    """True when results of a level depend on the population data too"""
+    return (smoothing is not None or level in GROUPINGS) and has_population()
+
+def window_years(*windows: tuple[int, int]) -> list[int]:
+    """Years covered by one or more (start, end) windows"""
+    return sorted({year for start, end in windows for year in range(start, end + 1)})
+
 @st.cache_data
 def load_criminality_data() -> pd.DataFrame:
-    return pd.read_parquet(DATA_PATH / "processed/criminality_clean.parquet")
+    return pd.read_parquet(CRIMINALITY_DIR)
+
+def has_population() -> bool:
+    return any(POPULATION_DIR.glob("*.parquet"))
+
+@st.cache_data
+def load_population() -> pd.DataFrame:
+    """Resident population of every area and year (REF_AREA, TIME_PERIOD, OBS_VALUE)"""
+    return pd.read_parquet(POPULATION_DIR, columns=["REF_AREA", "TIME_PERIOD", "OBS_VALUE"])
 
 @st.cache_data
 def load_shapes(level: str = "provinces") -> gpd.GeoDataFrame:
-    files = {
-        "provinces": "nuts3_it.geoparquet",
-        "regions": "nuts2_it.geoparquet",
-        "macro-areas": "nuts1_it.geoparquet",
-    }
-    gdf = gpd.read_parquet(DATA_PATH / f"shapes/{files[level]}")
-    gdf["NUTS_ID"] = gdf["NUTS_ID"].replace(MAPPING_SARDINIA)
+    if level in GROUPINGS:
+        return load_group_shapes(level)
+    gdf = gpd.read_parquet(DATA_PATH / f"shapes/{SHAPE_FILES[level]}")
+    # without a crosswalk the recoded Sardinian provinces are matched by code
+    if level_crosswalk(level) is None:
+        gdf["NUTS_ID"] = gdf["NUTS_ID"].replace(MAPPING_SARDINIA)
     return gdf.to_crs(epsg=4326)
 
+@st.cache_data
+@persistent(lambda grouping: data_manifest([], level=grouping))
+def load_group_shapes(grouping: str) -> gpd.GeoDataFrame:
+    """Provinces dissolved into the groups of a grouping"""
+    return dissolve_groups(load_shapes("provinces"), grouping)
+
+@st.cache_data
+def level_crosswalk(level: str) -> dict[str, np.ndarray] | None:
+    """Crosswalk from the NUTS version of the data to the shapes of a level
+
+    None when build_shapes.py found no shapes in the version of the data.
+    Like the topology, a missing or stale crosswalk is built once and stored.
+    """
+    if level not in DATA_SHAPE_FILES:
+        return None
+    source_path = DATA_PATH / "shapes" / DATA_SHAPE_FILES[level]
+    target_path = DATA_PATH / "shapes" / SHAPE_FILES[level]
+    if not source_path.exists():
+        return None
+
+    crosswalk = load_crosswalk(source_path, target_path)
+    if crosswalk is None:
+        try:
+            save_crosswalk(source_path, target_path)
+        except OSError:
+            pass
+        crosswalk = load_crosswalk(source_path, target_path)
+    return crosswalk
+
+def level_topology(level: str) -> dict[str, np.ndarray]:
+    """Contiguity artefacts of a level, built by build_shapes.py
+
+    When they are missing or stale (shapes rebuilt by an older script) they
+    are computed once from the geometries and stored for the next start.
+    Groups of provinces only have a few areas, theirs is built in memory.
+    """
+    if level in GROUPINGS:
+        return build_topology(load_shapes(level))
+    shapes_path = DATA_PATH / "shapes" / SHAPE_FILES[level]
+    topo = load_topology(shapes_path)
+    if topo is None:
+        try:
+            save_topology(shapes_path)
+        except OSError:
+            pass
+        topo = load_topology(shapes_path)
+    return topo
+
+@st.cache_data
+def load_weights(level: str) -> W:
+    """Queen weights for a whole level, indexed by NUTS_ID"""
+    ids = load_shapes(level)["NUTS_ID"].tolist()
+    return topology_weights(level_topology(level), ids)
+
+@st.cache_data
+def load_nearest(level: str) -> dict[str, list[str]]:
+    """Nearest areas of each area of a level, closest first"""
+    ids = load_shapes(level)["NUTS_ID"].tolist()
+    return topology_nearest(level_topology(level), ids)
+
+
+# ---------- Spatial index ----------
+@st.cache_resource
+def load_area_index(level: str) -> tuple[STRtree, np.ndarray]:
+    """R-tree over the geometries of a level, with the NUTS_ID of each entry"""
+    shapes = load_shapes(level)
+    return STRtree(shapes.geometry.values), shapes["NUTS_ID"].to_numpy()
+
+def area_at(level: str, lon: float, lat: float) -> str | None:
+    """NUTS_ID of the area containing a point, None outside every area"""
+    tree, ids = load_area_index(level)
+    hits = tree.query(Point(lon, lat), predicate="intersects")
+    return str(ids[hits.min()]) if len(hits) else None
+
+def areas_in_bbox(level: str, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> list[str]:
+    """NUTS_IDs of the areas intersecting a bounding box"""
+    tree, ids = load_area_index(level)
+    hits = tree.query(box(min_lon, min_lat, max_lon, max_lat), predicate="intersects")
+    return ids[np.sort(hits)].tolist()
+
+def nearest_area(level: str, lon: float, lat: float) -> str:
+    """NUTS_ID of the area closest to a point (the containing one if any)"""
+    tree, ids = load_area_index(level)
+    return str(ids[tree.nearest(Point(lon, lat))])
+
 
 # ---------- Filtering ----------
 def filter_crime_by_level(crime: pd.DataFrame, level: str) -> pd.DataFrame:
     nuts_len = {
+        "national": 2,
         "provinces": 5,
         "regions": 4,
         "macro-areas": 3,
@@ -198,6 +386,197 @@ def filter_crime_by_level(crime: pd.DataFrame, level: str) -> pd.DataFrame:
     return crime[crime["REF_AREA"].str.len() == length]
 
 
+# ---------- Year panel ----------
+def cumulate(values: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Running totals along the last axis, starting with zeros"""
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    return np.cumsum(np.pad(values, pad), axis=-1), np.cumsum(np.pad(counts, pad), axis=-1)
+
+def yearly_values(panel: dict[str, np.ndarray]) -> np.ndarray:
+    """Mean value of every (area, crime, year), NaN without data"""
+    sums, counts = np.diff(panel["sums"], axis=-1), np.diff(panel["counts"], axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+def with_values(panel: dict[str, np.ndarray], values: np.ndarray, areas: np.ndarray | None = None) -> dict[str, np.ndarray]:
+    """Panel holding new yearly values (e.g. smoothed or re-aggregated), NaN without data"""
+    valid = ~np.isnan(values)
+    sums, counts = cumulate(np.where(valid, values, 0.0), valid.astype(np.int32))
+    areas = panel["areas"] if areas is None else areas
+    return {**panel, "areas": areas, "sums": sums, "counts": counts}
+
+def panel_frame(panel: dict[str, np.ndarray]) -> pd.DataFrame:
+    """Long frame (REF_AREA, TYPE_CRIME, TIME_PERIOD, OBS_VALUE) of the yearly values of a panel"""
+    values = yearly_values(panel)
+    area, crime, year = np.nonzero(~np.isnan(values))
+    return pd.DataFrame({
+        "REF_AREA": panel["areas"][area],
+        "TYPE_CRIME": panel["crimes"][crime],
+        "TIME_PERIOD": panel["years"][year],
+        "OBS_VALUE": values[area, crime, year],
+    })
+
+def build_year_panel(df: pd.DataFrame) -> dict[str, np.ndarray]:
+    """Running yearly totals of every (area, crime) series
+
+    `sums` and `counts` have shape (areas, crimes, years + 1) and start with
+    zeros, so the mean of any window of years is the difference of two
+    slices divided by the difference of two counts (see `window_mean`).
+    """
+    areas, area_idx = np.unique(df["REF_AREA"].to_numpy(dtype=str), return_inverse=True)
+    crimes, crime_idx = np.unique(df["TYPE_CRIME"].to_numpy(dtype=str), return_inverse=True)
+    years = np.arange(df["TIME_PERIOD"].min(), df["TIME_PERIOD"].max() + 1)
+    year_idx = df["TIME_PERIOD"].to_numpy() - years[0]
+
+    values = df["OBS_VALUE"].to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    index = (area_idx[valid], crime_idx[valid], year_idx[valid])
+
+    shape = (len(areas), len(crimes), len(years))
+    sums, counts = np.zeros(shape), np.zeros(shape, dtype=np.int32)
+    np.add.at(sums, index, values[valid])
+    np.add.at(counts, index, 1)
+
+    sums, counts = cumulate(sums, counts)
+    return {"areas": areas, "crimes": crimes, "years": years, "sums": sums, "counts": counts}
+
+def crosswalk_panel(panel: dict[str, np.ndarray], crosswalk: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Panel moved from the areas of the data to the areas of the shapes
+
+    Rates are intensive, each shape gets the area-weighted mean of the
+    data areas overlapping it: one sparse product for every crime and year.
+    """
+    values = yearly_values(panel)
+    position = pd.Index(crosswalk["source_ids"]).get_indexer(panel["areas"])
+    found = position >= 0
+    source = np.full((len(crosswalk["source_ids"]),) + values.shape[1:], np.nan)
+    source[position[found]] = values[found]
+
+    values = reaggregate(source, crosswalk_matrix(crosswalk, "intensive"), "intensive")
+    return with_values(panel, values, crosswalk["target_ids"])
+
+def group_panel(grouping: str) -> dict[str, np.ndarray]:
+    """Panel of the groups of a grouping, rolled up from the provinces
+
+    Group rates are weighted by the population of each province and year
+    when the population data is there, one sparse product for every crime
+    and year.
+    """
+    provinces = load_year_panel("provinces")
+    groups, matrix = group_matrix(group_labels(provinces["areas"], grouping))
+    population = None
+    if has_population():
+        population = panel_population("provinces", provinces["areas"], provinces["years"])[:, None, :]
+    return with_values(provinces, group_rates(yearly_values(provinces), population, matrix), groups)
+
+def panel_population(level: str, areas: np.ndarray, years: np.ndarray) -> np.ndarray:
+    """Population of each area and year as an (areas, years) array, NaN where unknown"""
+    if level in GROUPINGS:
+        provinces = load_year_panel("provinces")["areas"]
+        groups, matrix = group_matrix(group_labels(provinces, level))
+        totals = group_totals(panel_population("provinces", provinces, years), matrix)
+        return pd.DataFrame(totals, index=groups).reindex(areas).to_numpy(dtype=float)
+
+    population = filter_crime_by_level(load_population(), level)
+    table = population.pivot_table(index="REF_AREA", columns="TIME_PERIOD", values="OBS_VALUE", observed=True)
+    table.index = table.index.astype(str)
+
+    crosswalk = level_crosswalk(level)
+    if crosswalk is not None:
+        # population is a count, split between shapes by area
+        source = table.reindex(index=crosswalk["source_ids"], columns=years).to_numpy(dtype=float)
+        values = reaggregate(source, crosswalk_matrix(crosswalk, "extensive"), "extensive")
+        table = pd.DataFrame(values, index=crosswalk["target_ids"], columns=years)
+    return table.reindex(index=areas, columns=years).to_numpy(dtype=float)
+
+def panel_weights(level: str, areas: np.ndarray) -> sp.csr_matrix:
+    """Contiguity of the areas of a panel, islands linked to their nearest area"""
+    w = load_weights(level)
+    if w.islands:
+        w = attach_nearest(w, load_nearest(level)) or w
+    position = {area: i for i, area in enumerate(w.id_order)}
+    rows = [i for i, area in enumerate(areas) if area in position]
+    # areas without a geometry have no neighbours
+    select = sp.csr_matrix(
+        (np.ones(len(rows)), (rows, [position[areas[i]] for i in rows])),
+        shape=(len(areas), len(w.id_order))
+    )
+    return select @ w.sparse @ select.T
+
+@st.cache_data
+def load_year_panel(level: str, smoothing: str | None = None) -> dict[str, np.ndarray]:
+    """Cached yearly panel of a level, with raw or smoothed rates (see `SMOOTHING`)
+
+    Smoothing works on the whole areas x crimes x years array at once, so
+    every smoothed window then costs the same as a raw one.
+    """
+    if level in GROUPINGS:
+        panel = group_panel(level)
+    else:
+        panel = build_year_panel(filter_crime_by_level(load_criminality_data(), level))
+        crosswalk = level_crosswalk(level)
+        if crosswalk is not None:
+            panel = crosswalk_panel(panel, crosswalk)
+    if smoothing is None:
+        return panel
+
+    rates = yearly_values(panel)
+    population = panel_population(level, panel["areas"], panel["years"])[:, None, :]
+    if smoothing == "global":
+        rates = global_eb(rates, population)
+    elif smoothing == "spatial":
+        rates = spatial_eb(rates, population, panel_weights(level, panel["areas"]))
+    else:
+        raise ValueError(f"Unknown smoothing '{smoothing}'")
+    return with_values(panel, rates)
+
+def window_mean(panel: dict[str, np.ndarray], start: int, end: int) -> np.ndarray:
+    """Mean of every (area, crime) series over the years [start, end], NaN without data"""
+    first, last = panel["years"][0], panel["years"][-1]
+    lo = int(np.clip(start, first, last + 1) - first)
+    hi = int(np.clip(end + 1, first, last + 1) - first)
+    total = panel["sums"][..., hi] - panel["sums"][..., lo]
+    count = panel["counts"][..., hi] - panel["counts"][..., lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+def crime_position(panel: dict[str, np.ndarray], crime_type: str) -> int | None:
+    matches = np.flatnonzero(panel["crimes"] == crime_type)
+    return int(matches[0]) if len(matches) else None
+
+def window_values(level: str, crime_type: str, start: int, end: int, smoothing: str | None = None) -> pd.DataFrame:
+    """Mean value of each area over a window, same result as `calc_period_values`"""
+    panel = load_year_panel(level, smoothing)
+    col = crime_position(panel, crime_type)
+    if col is None:
+        return pd.DataFrame({"REF_AREA": pd.Series(dtype=str), "OBS_VALUE": pd.Series(dtype=float)})
+
+    values = window_mean(panel, start, end)[:, col]
+    keep = ~np.isnan(values)
+    return pd.DataFrame({"REF_AREA": panel["areas"][keep], "OBS_VALUE": values[keep]})
+
+def window_variation(level: str, crime_type: str, baseline: tuple, target: tuple) -> pd.DataFrame:
+    """Variation between two windows, same result as `calc_period_variation`"""
+    panel = load_year_panel(level)
+    col = crime_position(panel, crime_type)
+    if col is None:
+        return pd.DataFrame(columns=["REF_AREA", "BASELINE", "TARGET", "VAR"])
+
+    base = window_mean(panel, *baseline)[:, col]
+    target_mean = window_mean(panel, *target)[:, col]
+    keep = ~(np.isnan(base) & np.isnan(target_mean))
+    base, target_mean = base[keep], target_mean[keep]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = np.where(base != 0, (target_mean - base) / base * 100, np.nan)
+    return pd.DataFrame({
+        "REF_AREA": panel["areas"][keep],
+        "BASELINE": base,
+        "TARGET": target_mean,
+        "VAR": var,
+    })
+
+
 # ---------- Variation calculations ----------
 def calc_period_variation(df: pd.DataFrame, crime_type: str, baseline: tuple, target: tuple) -> pd.DataFrame:
     """Calculate variation between baseline period and target period"""
@@ -205,12 +584,12 @@ def calc_period_variation(df: pd.DataFrame, crime_type: str, baseline: tuple, ta
 
     # baseline mean
     base_data = filtered[filtered["TIME_PERIOD"].between(baseline[0], baseline[1])]
-    base_mean = base_data.groupby("REF_AREA", as_index=False)["OBS_VALUE"].mean()
+    base_mean = base_data.groupby("REF_AREA", as_index=False, observed=True)["OBS_VALUE"].mean()
     base_mean.columns = ["REF_AREA", "BASELINE"]
 
     # target mean
     target_data = filtered[filtered["TIME_PERIOD"].between(target[0], target[1])]
-    target_mean = target_data.groupby("REF_AREA", as_index=False)["OBS_VALUE"].mean()
+    target_mean = target_data.groupby("REF_AREA", as_index=False, observed=True)["OBS_VALUE"].mean()
     target_mean.columns = ["REF_AREA", "TARGET"]
 
     # merge and calculate variation
@@ -220,35 +599,308 @@ def calc_period_variation(df: pd.DataFrame, crime_type: str, baseline: tuple, ta
 
     return result
 
+@st.cache_data
+@persistent(lambda level, crime_type, baseline, target: data_manifest(
+    window_years(baseline, target), population=needs_population(level), level=level
+))
+def load_period_variation(level: str, crime_type: str, baseline: tuple, target: tuple) -> pd.DataFrame:
+    """Cached variation between baseline and target period for one level and crime"""
+    return window_variation(level, crime_type, baseline, target)
+
+def calc_variation_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """Baseline and target means with their variation for every area, crime and period
+
+    Long format with one row per (REF_AREA, TYPE_CRIME, PERIOD) of `PERIODS`,
+    the same columns as `calc_period_variation`. Periods do not overlap, so
+    every row is labelled with its period and aggregated in one pass.
+    """
+    period_of_year = {
+        year: name
+        for name, (start, end) in PERIODS_WITH_BASELINE.items()
+        for year in range(start, end + 1)
+    }
+    labelled = df.assign(PERIOD=df["TIME_PERIOD"].map(period_of_year)).dropna(subset=["PERIOD"])
+    means = labelled.groupby(["REF_AREA", "TYPE_CRIME", "PERIOD"], observed=True)["OBS_VALUE"].mean().unstack("PERIOD")
+    means = means.reindex(columns=list(PERIODS_WITH_BASELINE), fill_value=np.nan).astype(float)
+
+    baseline = means[next(iter(PERIODS_WITH_BASELINE))]
+    frames = []
+    for period_name in PERIODS:
+        target = means[period_name]
+        frames.append(pd.DataFrame({
+            "PERIOD": period_name,
+            "BASELINE": baseline,
+            "TARGET": target,
+            "VAR": ((target - baseline) / baseline * 100).where(baseline != 0),
+        }))
+    cube = pd.concat(frames).reset_index()
+    cube["REF_AREA"] = cube["REF_AREA"].astype(str)
+    cube["TYPE_CRIME"] = cube["TYPE_CRIME"].astype(str)
+    return cube
+
+@st.cache_data
+@persistent(lambda level: data_manifest(
+    window_years(*PERIODS_WITH_BASELINE.values()), population=needs_population(level), level=level
+))
+def load_variation_cube(level: str) -> pd.DataFrame:
+    """Cached variation cube of a level (see `calc_variation_cube`)
+
+    Built from the year panel, so the areas are those of the shapes: moved
+    through the crosswalk or rolled up into groups like every other result.
+    """
+    return calc_variation_cube(panel_frame(load_year_panel(level)))
+
+def change_scores(cube: pd.DataFrame) -> pd.DataFrame:
+    """Rows of a variation cube with their standardised change
+
+    Z is a robust z-score of VAR among the areas of the same crime and
+    period (median and scaled MAD), so changes of crimes that always vary
+    a lot do not crowd out the rest.
+    """
+    scored = cube[np.isfinite(cube["VAR"])].reset_index(drop=True)
+    keys = [scored["TYPE_CRIME"], scored["PERIOD"]]
+    median = scored["VAR"].groupby(keys).transform("median")
+    deviation = scored["VAR"] - median
+    spread = deviation.abs().groupby(keys).transform("median") * 1.4826
+    return scored.assign(Z=(deviation / spread).where(spread > 0))
+
+@st.cache_data
+def load_change_scores(level: str) -> pd.DataFrame:
+    """Cached standardised changes of every area, crime and period of a level"""
+    return change_scores(load_variation_cube(level))
+
+def top_changes(scores: pd.DataFrame, k: int = 20, min_baseline: float = 0.0, direction: str = "both") -> pd.DataFrame:
+    """The `k` rows of `scores` with the largest standardised change
+
+    `direction` is "both" (largest |Z|), "increase" or "decrease". Cells
+    with a baseline below `min_baseline` are left out, their percentages
+    are mostly noise. Only the top `k` are selected and sorted, so the cost
+    stays linear in the size of the cube.
+    """
+    z = scores["Z"].to_numpy(dtype=float)
+    if direction == "increase":
+        key = z
+    elif direction == "decrease":
+        key = -z
+    else:
+        key = np.abs(z)
+    valid = np.isfinite(key) & (scores["BASELINE"].to_numpy(dtype=float) >= min_baseline)
+
+    k = min(k, int(valid.sum()))
+    if k == 0:
+        return scores.iloc[[]]
+    key = np.where(valid, key, -np.inf)
+    top = np.argpartition(key, len(key) - k)[-k:]
+    return scores.iloc[top[np.argsort(-key[top])]]
+
 @st.cache_data
 def get_all_variations() -> pd.DataFrame:
-    """Calculate variations for all key crime types using national data"""
-    crime = load_criminality_data()
+    """National pre, during and post COVID means and variations of every crime code"""
+    national = load_variation_cube("national")
+    national = national[national["REF_AREA"] == "IT"]
+    wide = national.pivot(index="TYPE_CRIME", columns="PERIOD", values=["TARGET", "VAR"])
+    pre = national.groupby("TYPE_CRIME")["BASELINE"].first()
 
-    # filter to national level (REF_AREA = "IT")
-    national = crime[crime["REF_AREA"].str.len() == 2]
+    names = {code: (name, category) for category, crimes in CRIME_CATEGORIES.items() for code, name in crimes.items()}
+    codes = [code for code in names if code in pre.index]
+    during, post = PERIODS
 
-    results = []
-    for code, name in CRIMES_TO_CHECK:
-        data = national[national["TYPE_CRIME"] == code]
-        if len(data) == 0:
-            continue
+    return pd.DataFrame({
+        "code": pd.Series(codes, dtype="string"),
+        "name": pd.Series([names[code][0] for code in codes], dtype="string"),
+        "category": pd.Series([names[code][1] for code in codes], dtype="string"),
+        "pre_covid_avg": pre.reindex(codes).to_numpy(dtype=float),
+        "during_covid_avg": wide[("TARGET", during)].reindex(codes).to_numpy(dtype=float),
+        "post_covid_avg": wide[("TARGET", post)].reindex(codes).to_numpy(dtype=float),
+        "variation_pct": wide[("VAR", during)].reindex(codes).to_numpy(dtype=float),
+        "post_variation_pct": wide[("VAR", post)].reindex(codes).to_numpy(dtype=float),
+    })
 
-        pre = data[data["TIME_PERIOD"].between(2014, 2019)]["OBS_VALUE"].mean()
-        during = data[data["TIME_PERIOD"].between(2020, 2021)]["OBS_VALUE"].mean()
 
-        var = (during - pre) / pre * 100 if pre > 0 else 0
 
-        results.append({
-            "code": code,
-            "name": name,
-            "pre_covid_avg": during,
-            "during_covid_avg": during,
-            "variation_pct": var
-        })
-    return pd.DataFrame(results)
+# ---------- Counterfactual trends ----------
+def fit_trends(panel: dict[str, np.ndarray], fit: tuple[int, int]) -> dict[str, np.ndarray]:
+    """Linear trend of every (area, crime) series over the `fit` years
+
+    All series are fitted at once with the closed-form least-squares
+    solution, missing years masked out. Arrays have shape (areas, crimes):
+    the fitted value at the mean fitted year (`level`), the slope per year,
+    the residual variance and what the intervals need (`n`, `t_mean`, `sxx`).
+    """
+    years = panel["years"]
+    in_fit = (years >= fit[0]) & (years <= fit[1])
+    t = years[in_fit].astype(float)
+    y = yearly_values(panel)[..., in_fit]
+
+    mask = ~np.isnan(y)
+    y = np.where(mask, y, 0.0)
+    n = mask.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t_mean = (mask * t).sum(axis=-1) / n
+        y_mean = y.sum(axis=-1) / n
+        dt = np.where(mask, t - t_mean[..., None], 0.0)
+        sxx = (dt ** 2).sum(axis=-1)
+        slope = (dt * (y - y_mean[..., None])).sum(axis=-1) / sxx
+        resid = np.where(mask, y - y_mean[..., None] - slope[..., None] * dt, 0.0)
+        var = (resid ** 2).sum(axis=-1) / (n - 2)
+
+    # a line through two points has no residual variance to build intervals on
+    enough = n >= 3
+    return {
+        "level": np.where(enough, y_mean, np.nan),
+        "slope": np.where(enough, slope, np.nan),
+        "var": np.where(enough, var, np.nan),
+        "n": n,
+        "t_mean": t_mean,
+        "sxx": sxx,
+    }
+
+@st.cache_data
+def load_trend_fit(level: str, fit: tuple[int, int]) -> dict[str, np.ndarray]:
+    """Cached trends of every series of a level"""
+    return fit_trends(load_year_panel(level), fit)
+
+def trend_deviation(
+        level: str,
+        crime_type: str,
+        fit: tuple[int, int],
+        target: tuple[int, int],
+        confidence: float = 0.95
+) -> pd.DataFrame:
+    """Observed target mean minus the mean projected from the `fit` trend
+
+    Same columns as `calc_period_variation`, where BASELINE is the expected
+    (counterfactual) mean and VAR the deviation in % of it, plus the
+    prediction interval of the deviation (LOWER, UPPER, in %) and whether
+    it excludes zero.
+    """
+    panel = load_year_panel(level)
+    col = crime_position(panel, crime_type)
+    columns = ["REF_AREA", "BASELINE", "TARGET", "VAR", "LOWER", "UPPER", "SIGNIFICANT"]
+    if col is None:
+        return pd.DataFrame(columns=columns)
+
+    trend = {key: value[:, col] for key, value in load_trend_fit(level, fit).items()}
+    observed = window_mean(panel, *target)[:, col]
+    first = panel["years"][0]
+    lo, hi = max(target[0] - first, 0), min(target[1] - first + 1, len(panel["years"]))
+    counts = panel["counts"][:, col, hi] - panel["counts"][:, col, lo]
+
+    target_years = panel["years"][lo:hi]
+    t_target = target_years.mean() if len(target_years) else np.nan
+    # rates cannot fall below zero, neither can their projection
+    expected = np.maximum(trend["level"] + trend["slope"] * (t_target - trend["t_mean"]), 0)
+
+    # interval of the mean of `counts` new observations around the projection
+    with np.errstate(invalid="ignore", divide="ignore"):
+        se = np.sqrt(trend["var"] * (
+            1 / counts + 1 / trend["n"] + (t_target - trend["t_mean"]) ** 2 / trend["sxx"]
+        ))
+        quantile = stats.t.ppf(0.5 + confidence / 2, np.maximum(trend["n"] - 2, 1))
+        deviation = observed - expected
+        scale = np.where(expected != 0, 100 / np.abs(expected), np.nan)
+
+    keep = ~np.isnan(observed) & ~np.isnan(expected)
+    lower, upper = (deviation - quantile * se) * scale, (deviation + quantile * se) * scale
+    return pd.DataFrame({
+        "REF_AREA": panel["areas"][keep],
+        "BASELINE": expected[keep],
+        "TARGET": observed[keep],
+        "VAR": (deviation * scale)[keep],
+        "LOWER": lower[keep],
+        "UPPER": upper[keep],
+        "SIGNIFICANT": ((lower > 0) | (upper < 0))[keep],
+    })
+
+@st.cache_data
+def load_trend_deviation(level: str, crime_type: str, fit: tuple, target: tuple) -> pd.DataFrame:
+    """Cached deviation from the trend for one level, crime and target period"""
+    return trend_deviation(level, crime_type, fit, target)
+
+
+# ---------- Structural breaks ----------
+def scan_breaks(panel: dict[str, np.ndarray]) -> pd.DataFrame:
+    """Most likely level shift of every (area, crime) series on top of its trend
+
+    Each candidate year k is tested with y = a + b * t + shift * [t >= k].
+    Against the plain trend, the shift only needs the running sums of the
+    trend residuals, of the observed years and of the centred years, so
+    every candidate of every series comes from a few cumulative sums. The
+    strongest candidate is kept with its F statistic (STRENGTH) and a
+    Bonferroni p-value over the candidates tested. Both segments need at
+    least `BREAK_MIN_SEGMENT` observed years.
+    """
+    years = panel["years"]
+    y = yearly_values(panel)
+    mask = ~np.isnan(y)
+    n = mask.sum(axis=-1)
+
+    # plain trend residuals, masked years contribute nothing
+    t = years.astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t_mean = (mask * t).sum(axis=-1) / n
+        y_mean = np.where(mask, y, 0.0).sum(axis=-1) / n
+        dt = np.where(mask, t - t_mean[..., None], 0.0)
+        sxx = (dt ** 2).sum(axis=-1)
+        slope = (dt * np.where(mask, y - y_mean[..., None], 0.0)).sum(axis=-1) / sxx
+        resid = np.where(mask, y - y_mean[..., None] - slope[..., None] * dt, 0.0)
+    sse = (resid ** 2).sum(axis=-1)
+
+    # index k of the running sums holds the years before years[k]; residuals
+    # and centred years sum to zero, so the after-break sums are minus them
+    resid_left, n_left = cumulate(resid, mask.astype(np.int32))
+    dt_left, _ = cumulate(dt, mask.astype(np.int32))
+    resid_left, n_left, dt_left = resid_left[..., 1:-1], n_left[..., 1:-1], dt_left[..., 1:-1]
+    n_right = n[..., None] - n_left
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # squared norm of the step dummy once the trend is projected out
+        step = n_right - n_right ** 2 / n[..., None] - dt_left ** 2 / sxx[..., None]
+        gain = resid_left ** 2 / step
+        valid = (
+            (n_left >= BREAK_MIN_SEGMENT) & (n_right >= BREAK_MIN_SEGMENT)
+            & (step > 1e-9) & (n[..., None] > 3)
+        )
+        f_stat = np.where(valid, gain / ((sse[..., None] - gain) / (n[..., None] - 3)), -np.inf)
+        shifts = -resid_left / step
+
+    best = f_stat.argmax(axis=-1)
+    candidates = valid.sum(axis=-1)
+    strength = np.take_along_axis(f_stat, best[..., None], axis=-1)[..., 0]
+    shift = np.take_along_axis(shifts, best[..., None], axis=-1)[..., 0]
+
+    # means of the observed years before and after the break
+    k = best + 1
+    sums, counts = panel["sums"], panel["counts"]
+    sum_left = np.take_along_axis(sums, k[..., None], axis=-1)[..., 0]
+    count_left = np.take_along_axis(counts, k[..., None], axis=-1)[..., 0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        before = sum_left / count_left
+        after = (sums[..., -1] - sum_left) / (counts[..., -1] - count_left)
+        shift_pct = np.where(before != 0, shift / np.abs(before) * 100, np.nan)
+        p_value = np.minimum(stats.f.sf(strength, 1, n - 3) * candidates, 1.0)
+
+    area, crime = np.nonzero(candidates > 0)
+    return pd.DataFrame({
+        "REF_AREA": panel["areas"][area],
+        "TYPE_CRIME": panel["crimes"][crime],
+        "BREAK_YEAR": years[k[area, crime]],
+        "BEFORE": before[area, crime],
+        "AFTER": after[area, crime],
+        "SHIFT": shift[area, crime],
+        "SHIFT_PCT": shift_pct[area, crime],
+        "STRENGTH": strength[area, crime],
+        "P_VALUE": p_value[area, crime],
+        "N": n[area, crime],
+    })
+
+@st.cache_data
+@persistent(lambda level: data_manifest(population=needs_population(level), level=level))
+def load_breaks(level: str) -> pd.DataFrame:
+    """Cached break scan of every series of a level, strongest first"""
+    breaks = scan_breaks(load_year_panel(level))
+    return breaks.sort_values("STRENGTH", ascending=False, ignore_index=True)
 
-    
 
 # ---------- Moran's I ----------
 
@@ -258,20 +910,54 @@ def calc_period_values(df: pd.DataFrame, crime_type: str, start: int, end: int)
         (df["TYPE_CRIME"] == crime_type) &
         (df["TIME_PERIOD"].between(start, end))
     ]
-    result = filtered.groupby("REF_AREA")["OBS_VALUE"].mean().reset_index()
+    result = filtered.groupby("REF_AREA", observed=True)["OBS_VALUE"].mean().reset_index()
     return result
 
 
+def local_moran_p(y: np.ndarray, w: W) -> np.ndarray:
+    """One-sided analytical p-values of local Moran's I
+
+    Normal approximation under conditional randomisation, the null of the
+    permutation p-values: each area keeps its value while its neighbours
+    are drawn without replacement from the other areas. The moments of
+    that draw have a closed form, so no permutation is needed.
+    """
+    n = len(y)
+    z = y - y.mean()
+    m2 = (z ** 2).sum() / n
+    ws = w.sparse.tocsr()
+    local_i = z / m2 * (ws @ z)
+    wi = np.asarray(ws.sum(axis=1)).ravel()
+    wi2 = np.asarray(ws.multiply(ws).sum(axis=1)).ravel()
+
+    # mean and variance of the values of the other n - 1 areas
+    others_mean = -z / (n - 1)
+    others_var = ((z ** 2).sum() - z ** 2) / (n - 1) - others_mean ** 2
+
+    expected = z / m2 * wi * others_mean
+    variance = (z / m2) ** 2 * others_var * (wi2 - (wi ** 2 - wi2) / (n - 2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = stats.norm.sf(np.abs(local_i - expected) / np.sqrt(variance))
+    # areas without neighbours (or at the mean) are never significant
+    return np.where(np.isnan(p), 1.0, p)
+
 def compute_moran_for_period(
         gdf: gpd.GeoDataFrame,
-        raw_data: pd.DataFrame,
-        crime_type: str,
-        start_year: int,
-        end_year: int
+        period_data: pd.DataFrame,
+        w: W | None = None,
+        nearest: dict[str, list[str]] | None = None,
+        permutations: int = PERMUTATIONS,
+        seed: int | None = PERMUTATION_SEED
 ) -> dict | None:
-    """Compute Moran statistics for a single period"""
+    """Compute Moran statistics for a single period
 
-    period_data = calc_period_values(raw_data, crime_type, start_year, end_year)
+    `period_data` holds the mean value of each area over the period (see
+    `window_values`). `w` can hold precomputed weights for the whole level (see `load_weights`),
+    otherwise contiguity is computed from the geometries of the merged areas.
+    Likewise `nearest` (see `load_nearest`) replaces the KNN used to attach
+    islands. With `permutations=0` the p-values are analytical instead of
+    pseudo p-values from random permutations, drawn from `seed` for LISA.
+    """
 
     merged = gdf.merge(period_data, left_on="NUTS_ID", right_on="REF_AREA")
     merged = merged.dropna(subset=["OBS_VALUE"])
@@ -280,17 +966,28 @@ def compute_moran_for_period(
         return None
     
     # build weights with island handling
-    w = Queen.from_dataframe(merged, use_index=False)
-    if w.n_components > 1:
-        w = attach_islands(w, KNN.from_dataframe(merged, k=1, use_index=False))
+    ids = merged["NUTS_ID"].tolist()
+    if w is None:
+        w = Queen.from_dataframe(merged, ids=ids)
+    else:
+        w = w_subset(w, ids, silence_warnings=True)
+    if w.islands:
+        attached = attach_nearest(w, nearest) if nearest is not None else None
+        w = attached or attach_islands(w, KNN.from_dataframe(merged, k=1, ids=ids))
     w.transform = "R" 
 
-    y = merged["OBS_VALUE"].values
+    y = merged["OBS_VALUE"].to_numpy(dtype=float)
 
 
-    moran_global = Moran(y, w) # Global Moran
-
-    moran_local = Moran_Local(y, w) # Local Moran
+    if permutations:
+        moran_global = Moran(y, w, permutations=permutations) # Global Moran
+        moran_local = Moran_Local(y, w, permutations=permutations, seed=seed) # Local Moran
+        moran_p, moran_z, local_p = moran_global.p_sim, moran_global.z_sim, moran_local.p_sim
+    else:
+        # normal approximation under randomisation, nearly free
+        moran_global = Moran(y, w, permutations=0, two_tailed=False)
+        moran_local = Moran_Local(y, w, permutations=0)
+        moran_p, moran_z, local_p = moran_global.p_rand, moran_global.z_rand, local_moran_p(y, w)
 
     # standardized values for scatter plot
     y_std = (y - y.mean()) / y.std()
@@ -304,7 +1001,7 @@ def compute_moran_for_period(
     quadrant[(y_std < 0) & (y_lag > 0)] = 4 # LH
 
     # LISA classification
-    sig = moran_local.p_sim < 0.05
+    sig = local_p < 0.05
     lisa_labels = []
     for i in range(len(merged)):
         if not sig[i]:
@@ -323,19 +1020,92 @@ def compute_moran_for_period(
     merged["y_lag"] = y_lag
     merged["quadrant"] = quadrant
     merged["LISA_LABEL"] = lisa_labels
-    merged["LISA_P"] = moran_local.p_sim
+    merged["LISA_P"] = local_p
 
     return {
         "gdf": merged,
         "moran_I": moran_global.I,
         "moran_EI": moran_global.EI,
-        "moran_p": moran_global.p_sim,
-        "moran_z": moran_global.z_sim,
+        "moran_p": moran_p,
+        "moran_z": moran_z,
+        "permutations": permutations,
         "y_std": y_std,
         "y_lag": y_lag,
         "quadrant": quadrant,
     }
 
+def moran_job(
+        level: str,
+        crime_type: str,
+        start_year: int,
+        end_year: int,
+        smoothing: str | None = None,
+        permutations: int = PERMUTATIONS
+) -> dict | None:
+    """Moran statistics for one (level, crime, period), run inside a worker process"""
+    return compute_moran_for_period(
+        load_shapes(level), window_values(level, crime_type, start_year, end_year, smoothing),
+        w=load_weights(level), nearest=load_nearest(level), permutations=permutations
+    )
+
+# the seed is part of the key, results drawn from another seed are recomputed
+@persistent(lambda level, crime_type, start_year, end_year, smoothing=None: f"{PERMUTATION_SEED}:" + data_manifest(
+    window_years((start_year, end_year)), population=needs_population(level, smoothing), level=level
+))
+def moran_result(level: str, crime_type: str, start_year: int, end_year: int, smoothing: str | None = None) -> dict | None:
+    """Moran statistics for one (level, crime, period), persisted on disk
+
+    The permutation inference is CPU bound, so it runs in the shared worker
+    pool and the calling thread only waits for the result. Smoothed results
+    (see `SMOOTHING`) are stored next to the raw ones.
+    """
+    return workers.run(moran_job, level, crime_type, start_year, end_year, smoothing)
+
+def moran_args(level: str, crime_type: str, start_year: int, end_year: int, smoothing: str | None = None) -> tuple:
+    """Arguments of `moran_result`, raw results keep the disk cache key used by the API and the warm-up"""
+    args = (level, crime_type, start_year, end_year)
+    return args if smoothing is None else (*args, smoothing)
+
+@st.cache_data(show_spinner="Computing spatial statistics...")
+def load_moran_result(level: str, crime_type: str, start_year: int, end_year: int, smoothing: str | None = None) -> dict | None:
+    """Cached Moran statistics for one (level, crime, period)"""
+    return moran_result(*moran_args(level, crime_type, start_year, end_year, smoothing))
+
+@st.cache_data(show_spinner=False)
+def load_analytical_moran(level: str, crime_type: str, start_year: int, end_year: int, smoothing: str | None = None) -> dict | None:
+    """Moran statistics with analytical p-values, cheap enough to compute in the page"""
+    return moran_job(level, crime_type, start_year, end_year, smoothing, 0)
+
+def moran_refined(level: str, crime_type: str, start_year: int, end_year: int, smoothing: str | None = None) -> bool:
+    """True once the permutation result is available, starting it in the background otherwise"""
+    future = workers.background(moran_result, *moran_args(level, crime_type, start_year, end_year, smoothing))
+    # results already on disk come back within the wait
+    done, _ = wait([future], timeout=REFINED_WAIT)
+    return bool(done)
+
+def load_progressive_moran(
+        level: str,
+        crime_type: str,
+        start_year: int,
+        end_year: int,
+        smoothing: str | None = None
+) -> dict | None:
+    """Permutation results when ready, otherwise the analytical ones
+
+    The permutations keep running in the background, poll `moran_refined`
+    to know when to swap them in. The "permutations" entry of the result
+    tells which inference it holds.
+    """
+    if moran_refined(level, crime_type, start_year, end_year, smoothing):
+        return load_moran_result(level, crime_type, start_year, end_year, smoothing)
+    return load_analytical_moran(level, crime_type, start_year, end_year, smoothing)
+
+def inference_label(result: dict) -> str:
+    permutations = int(result.get("permutations", PERMUTATIONS))
+    if permutations:
+        return f"Permutation inference ({permutations:,} permutations)"
+    return "Analytical inference (normal approximation)"
+
 # ---------- Transitions ----------
 def classify_transition(from_label: str, to_label: str) -> str:
     """Classify the type of transition between LISA clusters"""
@@ -379,3 +1149,74 @@ def compute_transitions(gdf_from: gpd.GeoDataFrame, gdf_to: gpd.GeoDataFrame) ->
     )
 
     return gpd.GeoDataFrame(merged, geometry="geometry")
+
+def transition_summary(transitions: gpd.GeoDataFrame) -> dict[str, float]:
+    """Hot and cold spot counts and stability rate of a set of transitions
+
+    The stability rate is the share of areas that stayed in the same hot or
+    cold spot cluster.
+    """
+    counts = transitions["TRANSITION"].value_counts()
+    stable_hot = int(counts.get("Stable Hot Spot", 0))
+    stable_cold = int(counts.get("Stable Cold Spot", 0))
+    new_hot = int(counts.get("New Hot Spot", 0))
+    new_cold = int(counts.get("New Cold Spot", 0))
+    return {
+        "hot_spots": stable_hot + new_hot,
+        "new_hot_spots": new_hot,
+        "cold_spots": stable_cold + new_cold,
+        "new_cold_spots": new_cold,
+        "disappeared": int(counts.get("Disappeared Hot Spot", 0) + counts.get("Disappeared Cold Spot", 0)),
+        "stability_rate": (stable_hot + stable_cold) / len(transitions) * 100 if len(transitions) else 0.0,
+    }
+
+
+# ---------- Page controls ----------
+def session_default(key: str, value) -> None:
+    """Start value of a keyed widget, kept when switching pages
+
+    Streamlit drops the state of widgets the current page does not draw,
+    assigning it back before drawing keeps the choice from another page.
+    """
+    st.session_state[key] = st.session_state.get(key, value)
+
+def period_label(name: str, window: tuple[int, int]) -> str:
+    start, end = window
+    return f"{name} ({start})" if start == end else f"{name} ({start}-{end})"
+
+def period_controls(with_baseline: bool = True) -> tuple[tuple[int, int], dict[str, tuple[int, int]]]:
+    """Sidebar year-range control shared by the analysis pages
+
+    Returns the baseline window and the periods to analyse: the COVID periods
+    by default, or any baseline and compared window of the data. Every
+    window is served by the yearly panel (see `window_mean`).
+    """
+    st.sidebar.markdown("---")
+    session_default("custom_periods", False)
+    if not st.sidebar.toggle("Custom periods", key="custom_periods"):
+        return BASELINE, dict(PERIODS_WITH_BASELINE if with_baseline else PERIODS)
+
+    years = load_criminality_data()["TIME_PERIOD"]
+    first, last = int(years.min()), int(years.max())
+    session_default("baseline_years", BASELINE)
+    session_default("target_years", next(iter(PERIODS.values())))
+    baseline = st.sidebar.slider("Baseline years", first, last, key="baseline_years")
+    target = st.sidebar.slider("Compared years", first, last, key="target_years")
+
+    periods = {period_label("Target", target): target}
+    if with_baseline:
+        periods = {period_label("Baseline", baseline): baseline, **periods}
+    return baseline, periods
+
+def smoothing_control() -> str | None:
+    """Sidebar choice of raw or smoothed rates, shared by the spatial statistics pages"""
+    if not has_population():
+        st.sidebar.caption("Rate smoothing needs the population data (`ingest_sdmx.py population`)")
+        return None
+
+    session_default("smoothing", next(iter(SMOOTHING)))
+    label = st.sidebar.radio(
+        "Rates", list(SMOOTHING), key="smoothing",
+        help="Empirical Bayes shrinks the rates of small populations towards the national (global) or neighbouring (spatial) mean"
+    )
+    return SMOOTHING[label]
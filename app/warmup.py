@@ -0,0 +1,105 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import workers
+from disk_cache import CACHE_DIR
+from utils import (
+    level_topology, level_crosswalk, load_variation_cube,
+    load_period_variation, load_breaks, moran_result, has_population,
+    data_manifest,
+    CRIME_CATEGORIES, CRIMES_TO_CHECK, GEO_LEVELS,
+    PERIODS, PERIODS_WITH_BASELINE, BASELINE, CRIMINALITY_DIR, SMOOTHING
+)
+
+# pyright: reportAttributeAccessIssue=false
+# pyright: reportCallIssue=false
+
+# readiness marker, holds the manifest of the data it was warmed with
+READY_FILE = CACHE_DIR / "READY"
+
+# levels offered by the Moran and transition pages
+MORAN_LEVELS: list[str] = ["provinces", "regions"]
+
+
+def is_ready() -> bool:
+    """True once the caches have been warmed for the current input data"""
+    return READY_FILE.exists() and READY_FILE.read_text().strip() == data_manifest(population=has_population())
+
+def warm_up(crime_codes: list[str]) -> None:
+    """Fill the disk caches for the given crimes at every level and period
+
+    The warm-up runs in its own process before the server, so only what
+    is stored on disk outlives it: `@persistent` results and the topology
+    and crosswalk artefacts. Streamlit's in-memory caches (data, shapes,
+    weights, year panels) are still filled by the first request.
+    """
+    READY_FILE.unlink(missing_ok=True)
+    start = time.perf_counter()
+
+    # Moran jobs are the slowest, queue them first so the worker pool runs
+    # them while the cheap aggregates are computed here
+    executor = ThreadPoolExecutor(max_workers=max(workers.MAX_WORKERS, 1) * 2)
+    jobs = [
+        executor.submit(moran_result, level, code, p_start, p_end)
+        for level in MORAN_LEVELS
+        for code in crime_codes
+        for p_start, p_end in PERIODS_WITH_BASELINE.values()
+    ]
+    # smoothed rates are one switch away on the pages, warm them as well
+    smoothings = [smoothing for smoothing in SMOOTHING.values() if smoothing] if has_population() else []
+    jobs += [
+        executor.submit(moran_result, level, code, p_start, p_end, smoothing)
+        for smoothing in smoothings
+        for level in MORAN_LEVELS
+        for code in crime_codes
+        for p_start, p_end in PERIODS_WITH_BASELINE.values()
+    ]
+
+    for level in GEO_LEVELS.values():
+        # stored next to the shapes when missing or stale
+        level_topology(level)
+        level_crosswalk(level)
+        load_variation_cube(level)
+        for code in crime_codes:
+            for target in PERIODS.values():
+                load_period_variation(level, code, BASELINE, target)
+    # national means of the home page
+    load_variation_cube("national")
+    for level in ["national", "regions", "provinces"]:
+        load_breaks(level)
+    print(f"[OK] topology, variations and breaks stored ({time.perf_counter() - start:.1f}s)")
+
+    for i, job in enumerate(jobs, start=1):
+        job.result()
+        if i % 10 == 0 or i == len(jobs):
+            print(f"[{i}/{len(jobs)}] Moran results computed")
+    executor.shutdown()
+
+    READY_FILE.parent.mkdir(parents=True, exist_ok=True)
+    READY_FILE.write_text(data_manifest(population=has_population()))
+    print(f"[OK] caches warm in {time.perf_counter() - start:.1f}s")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute the analysis caches")
+    parser.add_argument("--all-crimes", action="store_true", help="warm every crime code, not only the key ones")
+    args = parser.parse_args()
+
+    if not CRIMINALITY_DIR.exists():
+        # first start: the app downloads the data, nothing to warm yet
+        print("Data not found, skipping warm-up")
+        return
+
+    all_codes = [code for crimes in CRIME_CATEGORIES.values() for code in crimes]
+    if args.all_crimes:
+        crime_codes = all_codes
+    else:
+        # the crime selected when a page opens, then the most viewed ones
+        crime_codes = [all_codes[0]] + [code for code, _ in CRIMES_TO_CHECK]
+
+    print("=" * 50)
+    print(f"Warming caches for {len(crime_codes)} crimes...")
+    print("=" * 50)
+    warm_up(crime_codes)
+
+if __name__ == "__main__":
+    main()
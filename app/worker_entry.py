@@ -0,0 +1,7 @@
+"""`__main__` of the worker pool processes (see workers.py)
+
+Spawned processes re-import the main module of their parent, which under
+Streamlit is whichever page script ran last. The pool workers import this
+module instead: it runs nothing, the jobs import what they need when they
+are unpickled.
+"""
@@ -0,0 +1,161 @@
+import io
+import multiprocessing as mp
+import multiprocessing.context
+import multiprocessing.reduction
+import multiprocessing.spawn
+import multiprocessing.util
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import popen_spawn_posix
+from typing import Any, Callable
+
+# pyright: reportAttributeAccessIssue=false
+
+# number of worker processes shared by every session of this server,
+# 0 runs the jobs inline in the calling thread
+MAX_WORKERS: int = int(os.environ.get("SPATIAL_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+
+_pool: ProcessPoolExecutor | None = None
+_threads: ThreadPoolExecutor | None = None
+_inflight: dict[tuple, Future] = {}
+_lock = threading.RLock()
+
+# set in the pool processes, jobs submitted from a job run inline there
+_in_worker = False
+
+def _mark_worker() -> None:
+    global _in_worker
+    _in_worker = True
+
+
+# ---------- Worker processes ----------
+# importable module the workers run as their `__main__`
+ENTRY_MODULE = "worker_entry"
+
+def _preparation_data(name: str) -> dict:
+    """Start-up data of a pool process, with `ENTRY_MODULE` as its main module
+
+    Spawned processes re-run the `__main__` of their parent, which under
+    Streamlit is whichever page script ran last.
+    """
+    data = mp.spawn.get_preparation_data(name)
+    data.pop("init_main_from_path", None)
+    data["init_main_from_name"] = ENTRY_MODULE
+    return data
+
+class _WorkerPopen(popen_spawn_posix.Popen):
+    """Spawn launcher of the pool processes, as the stdlib one but with `_preparation_data`"""
+
+    def _launch(self, process_obj):
+        from multiprocessing import resource_tracker
+        tracker_fd = resource_tracker.getfd()
+        self._fds.append(tracker_fd)
+        fp = io.BytesIO()
+        mp.context.set_spawning_popen(self)
+        try:
+            mp.reduction.dump(_preparation_data(process_obj._name), fp)
+            mp.reduction.dump(process_obj, fp)
+        finally:
+            mp.context.set_spawning_popen(None)
+
+        parent_r = child_w = child_r = parent_w = None
+        try:
+            parent_r, child_w = os.pipe()
+            child_r, parent_w = os.pipe()
+            cmd = mp.spawn.get_command_line(tracker_fd=tracker_fd, pipe_handle=child_r)
+            self._fds.extend([child_r, child_w])
+            self.pid = mp.util.spawnv_passfds(mp.spawn.get_executable(), cmd, self._fds)
+            self.sentinel = parent_r
+            with open(parent_w, "wb", closefd=False) as f:
+                f.write(fp.getbuffer())
+        finally:
+            self.finalizer = mp.util.Finalize(
+                self, mp.util.close_fds, [fd for fd in (parent_r, parent_w) if fd is not None]
+            )
+            for fd in (child_r, child_w):
+                if fd is not None:
+                    os.close(fd)
+
+class SpatialWorker(mp.context.SpawnProcess):
+    """Spawned pool process running `ENTRY_MODULE` instead of the page as `__main__`"""
+
+    @staticmethod
+    def _Popen(process_obj):
+        return _WorkerPopen(process_obj)
+
+class _WorkerContext(mp.context.SpawnContext):
+    Process = SpatialWorker
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Shared worker pool, started on first use"""
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawn: forking the multi-threaded Streamlit server is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS, mp_context=_WorkerContext(), initializer=_mark_worker
+            )
+        return _pool
+
+def _forget(key: tuple) -> None:
+    with _lock:
+        _inflight.pop(key, None)
+
+def submit(func: Callable, *args: Any) -> Future:
+    """Run func(*args) in the shared pool, joining an identical job already in flight"""
+    global _pool
+    key = (func.__module__, func.__qualname__, args)
+
+    if MAX_WORKERS == 0 or _in_worker:
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    with _lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+
+        try:
+            future = get_pool().submit(func, *args)
+        except BrokenProcessPool:
+            # a worker died (e.g. killed for memory), start a fresh pool
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+            future = get_pool().submit(func, *args)
+        _inflight[key] = future
+
+    future.add_done_callback(lambda _: _forget(key))
+    return future
+
+def run(func: Callable, *args: Any) -> Any:
+    """Run func(*args) in the shared pool and wait for its result"""
+    return submit(func, *args).result()
+
+def background(func: Callable, *args: Any) -> Future:
+    """Start func(*args) on a thread of this process and return at once
+
+    For slow calls the pages poll instead of waiting on, typically cached
+    results whose computation goes through the pool. Identical calls in
+    flight are joined.
+    """
+    global _threads
+    key = ("background", func.__module__, func.__qualname__, args)
+
+    with _lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        if _threads is None:
+            _threads = ThreadPoolExecutor(max_workers=max(MAX_WORKERS, 1) * 2, thread_name_prefix="background")
+        future = _threads.submit(func, *args)
+        _inflight[key] = future
+
+    future.add_done_callback(lambda _: _forget(key))
+    return future
@@ -0,0 +1,156 @@
+from __future__ import annotations
+import argparse
+import functools
+import io
+import json
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+APP_DIR = PROJECT_ROOT / "app"
+
+# last commit before the period selectors became fragments
+BASELINE_COMMIT = "3ca569b"
+
+# page -> (label of the period selector whose change is being timed, fragment holding it)
+PAGES: dict[str, tuple[str, str]] = {
+    "02_moran.py": ("Select period to display", "lisa_map_section"),
+    "03_lisa_transitions.py": ("From period", "transitions_section"),
+}
+
+
+def baseline_app(tmp: Path) -> Path:
+    """App directory of the baseline commit, reading the data of this checkout"""
+    archive = subprocess.run(
+        ["git", "-C", str(PROJECT_ROOT), "archive", BASELINE_COMMIT, "app"],
+        check=True, capture_output=True
+    ).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(tmp, filter="data")
+
+    data = tmp / "data"
+    (data / "processed").mkdir(parents=True)
+    (data / "shapes").symlink_to(PROJECT_ROOT / "data" / "shapes")
+    # the baseline read a single parquet file, the yearly partitions read the same
+    (data / "processed" / "criminality_clean.parquet").symlink_to(PROJECT_ROOT / "data" / "processed" / "criminality_clean")
+    return tmp / "app"
+
+
+def timed_fragment(name: str, timings: list[float]):
+    """`st.fragment` recording how long the body of fragment `name` takes
+
+    The body is what the browser reruns on its own when a widget inside
+    the fragment changes, AppTest can only rerun the whole page around it.
+    """
+    import streamlit as st
+    fragment = st.fragment
+
+    def decorator(func=None, **kwargs):
+        def wrap(f):
+            if f.__name__ != name:
+                return fragment(f, **kwargs)
+
+            @functools.wraps(f)
+            def body(*args, **kw):
+                start = time.perf_counter()
+                try:
+                    return f(*args, **kw)
+                finally:
+                    timings.append(time.perf_counter() - start)
+            return fragment(body, **kwargs)
+        return wrap if func is None else wrap(func)
+    return decorator
+
+
+def time_period_changes(app_dir: Path, page: str, repeat: int) -> dict[str, list[float]]:
+    """Time the reruns triggered by cycling the period selector of a page, once its results are ready
+
+    "full" is the whole page rerun, "fragment" the body of the fragment
+    holding the selector (empty for the baseline, which has none).
+    """
+    # each app version has its own `utils`, so it runs in its own process
+    sys.path.insert(0, str(app_dir))
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    label, fragment_name = PAGES[page]
+    fragment_timings: list[float] = []
+    st.fragment = timed_fragment(fragment_name, fragment_timings)
+
+    def find_selectbox(at: AppTest):
+        for box in at.selectbox:
+            if box.label == label:
+                return box
+        raise LookupError(f"No selectbox labelled {label!r}")
+
+    at = AppTest.from_file(str(app_dir / "pages" / page), default_timeout=300)
+    at.run()
+    # the Moran page shows analytical p-values first: wait for the
+    # permutation results, until then each rerun waits on them
+    deadline = time.perf_counter() + 600
+    while any("analytical p-values" in info.value for info in at.info) and time.perf_counter() < deadline:
+        time.sleep(1)
+        at.run()
+
+    timings: dict[str, list[float]] = {"full": [], "fragment": []}
+    options = find_selectbox(at).options
+    for i in range(repeat):
+        find_selectbox(at).set_value(options[(i + 1) % len(options)])
+        fragment_timings.clear()
+        start = time.perf_counter()
+        at.run()
+        timings["full"].append(time.perf_counter() - start)
+        timings["fragment"] += fragment_timings[-1:]
+    return timings
+
+
+def measure(app_dir: Path, page: str, repeat: int) -> dict[str, float]:
+    """Median rerun times of a page of one app version, in a fresh process"""
+    out = subprocess.run(
+        [sys.executable, __file__, "--app-dir", str(app_dir), "--page", page, "--repeat", str(repeat)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    timings = json.loads(out.strip().splitlines()[-1])
+    return {kind: statistics.median(values) if values else float("nan") for kind, values in timings.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure period-selector rerun times")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--app-dir", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--page", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.app_dir is not None:
+        print(json.dumps(time_period_changes(args.app_dir, args.page, args.repeat)))
+        return
+
+    print("=" * 50)
+    print(f"Period selector rerun time (median of {args.repeat} runs, results ready)")
+    print(f"baseline: page scripts of {BASELINE_COMMIT}, current: this checkout")
+    print("=" * 50)
+    print(f"{'page':<24} {'baseline':>10} {'current':>10} {'fragment':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = baseline_app(Path(tmp))
+        for page in PAGES:
+            before = measure(baseline, page, args.repeat)
+            after = measure(APP_DIR, page, args.repeat)
+            print(
+                f"{page:<24} {before['full'] * 1000:>8.0f}ms {after['full'] * 1000:>8.0f}ms "
+                f"{after['fragment'] * 1000:>8.0f}ms"
+            )
+    print("=" * 50)
+    print("baseline: full rerun, what a period change cost before the fragments")
+    print("current:  full rerun of the page as it is now (AppTest reruns everything)")
+    print("fragment: the fragment body alone, what a period change reruns now")
+    print("While the Moran permutations still run, a full rerun also waits up to")
+    print("REFINED_WAIT per period for them, a fragment rerun does not.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+APP_DIR = PROJECT_ROOT / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from charts import moran_scatter_figure, scatter_mode  # noqa: E402
+from render import moran_scatter_image  # noqa: E402
+
+SIZES: list[int] = [100, 1_000, 10_000]
+MODES: list[str] = ["svg", "webgl", "density"]
+PERIODS: list[str] = ["Pre-COVID", "During COVID", "Post-COVID"]
+
+
+def synthetic_result(n: int, rng: np.random.Generator, moran_i: float = 0.4) -> dict:
+    """Moran result of `n` areas with spatially lagged values correlated by `moran_i`"""
+    y_std = rng.standard_normal(n)
+    y_lag = moran_i * y_std + np.sqrt(1 - moran_i ** 2) * rng.standard_normal(n)
+    quadrant = np.select(
+        [(y_std > 0) & (y_lag > 0), (y_std < 0) & (y_lag < 0), (y_std > 0) & (y_lag < 0)],
+        [1, 2, 3],
+        default=4
+    )
+    return {
+        "gdf": pd.DataFrame({"AREA_NAME": [f"Area {i}" for i in range(n)]}),
+        "y_std": y_std,
+        "y_lag": y_lag,
+        "quadrant": quadrant,
+        "moran_I": moran_i,
+    }
+
+
+def measure(results: dict[str, dict], mode: str, repeat: int, image: bool) -> dict[str, float]:
+    """Median build and serialisation time and payload of one figure"""
+    build, serialise, render = [], [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig = moran_scatter_figure(results, mode)
+        build.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        payload = fig.to_json()
+        serialise.append(time.perf_counter() - start)
+
+        if image:
+            start = time.perf_counter()
+            moran_scatter_image(results)
+            render.append(time.perf_counter() - start)
+
+    return {
+        "build": statistics.median(build),
+        "json": statistics.median(serialise),
+        "render": statistics.median(render) if render else float("nan"),
+        "kb": len(payload.encode()) / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Payload size and render time of the Moran scatter plots")
+    parser.add_argument("--size", type=int, action="append", help="areas per period (default: 100, 1k, 10k)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--image", action="store_true", help="also time the static PNG drawn for the report")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sizes = args.size or SIZES
+
+    print("=" * 50)
+    print(f"Moran scatter, {len(PERIODS)} periods (median of {args.repeat} runs)")
+    print("=" * 50)
+    print(f"{'areas':>7} {'mode':>8} {'build':>9} {'to_json':>9} {'png':>9} {'payload':>10}")
+    for n in sizes:
+        results = {period: synthetic_result(n, rng) for period in PERIODS}
+        for mode in MODES:
+            # the static image picks its mode from the size, time it once
+            image = args.image and mode == scatter_mode(n)
+            m = measure(results, mode, args.repeat, image)
+            chosen = "*" if mode == scatter_mode(n) else " "
+            png = f"{m['render'] * 1000:>7.0f}ms" if image else f"{'-':>9}"
+            print(
+                f"{n:>7} {mode:>7}{chosen} {m['build'] * 1000:>7.0f}ms {m['json'] * 1000:>7.0f}ms "
+                f"{png} {m['kb']:>8.0f}KB"
+            )
+    print("=" * 50)
+    print("* mode picked automatically for that number of areas")
+
+
+if __name__ == "__main__":
+    main()
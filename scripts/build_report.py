@@ -0,0 +1,347 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+APP_DIR = PROJECT_ROOT / "app"
+sys.path.insert(0, str(APP_DIR))
+
+import workers  # noqa: E402
+from render import lisa_comparison_image, moran_scatter_image  # noqa: E402
+from utils import (  # noqa: E402
+    load_shapes, load_period_variation, moran_result,
+    compute_transitions, transition_summary,
+    data_manifest, window_years,
+    PERIODS_WITH_BASELINE, BASELINE
+)
+
+REPORT_DIR = PROJECT_ROOT / "report"
+
+# input keys of the last build, outputs whose key is unchanged are skipped
+BUILD_STATE = REPORT_DIR / ".build_state.json"
+
+LEVEL = "provinces"
+PRE, DURING, POST = PERIODS_WITH_BASELINE.values()
+
+# crimes discussed in the report: code -> (name, group)
+REPORT_CRIMES: dict[str, tuple[str, str]] = {
+    "PICKTHEF": ("Pickpocketing", "Contact"),
+    "BURGTHEF": ("Residential burglary", "Contact"),
+    "BAGTHEF": ("Snatch theft", "Contact"),
+    "STREETROB": ("Street robbery", "Contact"),
+    "RAPE": ("Sexual assault", "Contact"),
+    "PORNO": ("Child sexual abuse material", "Digital"),
+    "CYBERCRIM": ("Cybercrime", "Digital"),
+    "SWINCYB": ("Online fraud", "Digital"),
+    "TOT": ("Total reported crimes", "---"),
+}
+
+MORAN_CRIMES: list[str] = ["PICKTHEF", "BURGTHEF", "RAPE", "CYBERCRIM", "TOT"]
+
+
+# ---------- Helpers ----------
+def tex_escape(text: str) -> str:
+    for char in "\\&%$#_{}":
+        text = text.replace(char, f"\\{char}")
+    return text
+
+def signed(value: float) -> str:
+    return f"${value:+.1f}$"
+
+def rate(value: float) -> str:
+    return f"{round(value, 2):g}"
+
+def province_variation(crime: str, target: tuple[int, int]):
+    """Variation of every province with a shape, as shown on the maps"""
+    ids = set(load_shapes(LEVEL)["NUTS_ID"])
+    var = load_period_variation(LEVEL, crime, BASELINE, target)
+    return var[var["REF_AREA"].isin(ids)].dropna(subset=["VAR"])
+
+def period_results(crime: str) -> dict[str, dict | None]:
+    """Moran results of a crime for every period, from the disk cache or the worker pool"""
+    return {name: moran_result(LEVEL, crime, start, end) for name, (start, end) in PERIODS_WITH_BASELINE.items()}
+
+
+# ---------- Tables ----------
+def crime_variation_mean() -> str:
+    rows, groups, n_areas = [], [], 0
+    for code, (name, group) in REPORT_CRIMES.items():
+        var = province_variation(code, DURING)
+        if var.empty:
+            continue
+        n_areas = max(n_areas, len(var))
+        if groups and groups[-1] != group:
+            rows.append("\\midrule")
+        groups.append(group)
+        rows.append(f"{code} & {name} & {group} & {signed(var['VAR'].mean())} \\\\")
+
+    body = "\n".join(rows)
+    return f"""\\begin{{table}}[htbp]
+\\centering
+\\caption{{Percentage variation in average crime rates during the COVID period (2020--2021) compared to the pre-pandemic baseline (2014-2019). Values calculated across {n_areas} Italian provinces.}}
+\\label{{tab:crime_variation_mean}}
+\\begin{{tabular}}{{lllc}}
+\\toprule
+\\textbf{{Istat code}} & \\textbf{{Crime Type}} & \\textbf{{Group}} & \\textbf{{Mean variation (\\%)}} \\\\
+\\midrule
+{body}
+\\bottomrule
+\\end{{tabular}}
+\\end{{table}}
+"""
+
+def top_changes(crime: str, label: str, increases: bool, what: str, comment: str, area_header: str = "Province") -> Callable[[], str]:
+    """Table of the five provinces with the largest increases (or decreases) of a crime
+
+    `comment` and `area_header` keep the header comment and the wording of
+    the first column of the table as written in the report.
+    """
+    direction = "increases" if increases else "decreases"
+
+    def build() -> str:
+        var = province_variation(crime, DURING)
+        var = var.merge(load_shapes(LEVEL)[["NUTS_ID", "AREA_NAME"]], left_on="REF_AREA", right_on="NUTS_ID")
+        top = var.nlargest(5, "VAR") if increases else var.nsmallest(5, "VAR")
+        body = "\n".join(
+            f"{tex_escape(row.AREA_NAME)} & {signed(row.VAR)} & {rate(row.BASELINE)} & {rate(row.TARGET)} \\\\"
+            for row in top.itertuples()
+        )
+        return f"""% {comment}
+\\begin{{table}}[htbp]
+\\centering
+\\caption{{Provinces with the largest percentage {direction} in {what} rates during COVID (2020--2021).}}
+\\label{{tab:{label}}}
+\\begin{{tabular}}{{lccc}}
+\\toprule
+\\textbf{{{area_header}}} & \\textbf{{Variation (\\%)}} & \\textbf{{Baseline (per 100k)}} & \\textbf{{During COVID (per 100k)}} \\\\
+\\midrule
+{body}
+\\bottomrule
+\\end{{tabular}}
+\\end{{table}}
+"""
+    return build
+
+def moran_values() -> str:
+    rows = []
+    for code in MORAN_CRIMES:
+        cells = []
+        for res in period_results(code).values():
+            cells += ["---", "---"] if res is None else [f"{res['moran_I']:.3f}", f"{res['moran_p']:.3f}"]
+        rows.append(f"{REPORT_CRIMES[code][0]} & " + " & ".join(cells) + " \\\\")
+
+    # year ranges as en dashes, e.g. 2014--2019
+    titles = [re.sub(r"(\d)-(\d)", r"\1--\2", name) for name in PERIODS_WITH_BASELINE]
+    periods = " & ".join(f"\\multicolumn{{2}}{{c}}{{\\textbf{{{title}}}}}" for title in titles)
+    body = "\n".join(rows)
+    return f"""% Moran's values
+\\begin{{table}}[htbp]
+\\centering
+\\small
+\\caption{{Global Moran's I and p-values for selected crime types, calculated at provincial level (NUTS-3) across temporal periods.}}
+\\label{{tab:moran_values}}
+\\begin{{adjustbox}}{{max width=\\textwidth}}
+\\begin{{tabular}}{{lcccccc}}
+\\toprule
+\\multirow{{2}}{{*}}{{\\textbf{{Crime type}}}} & {periods} \\\\
+\\cmidrule(lr){{2-3}} \\cmidrule(lr){{4-5}} \\cmidrule(lr){{6-7}}
+& Moran's I & p-value & Moran's I & p-value & Moran's I & p-value \\\\
+\\midrule
+{body}
+\\bottomrule
+\\end{{tabular}}
+\\end{{adjustbox}}
+\\end{{table}}
+"""
+
+def lisa_transitions(crime: str, label: str, what: str, comment: str) -> Callable[[], str]:
+    """Table of the LISA cluster transitions of a crime between the three periods, under a `comment` header"""
+    def build() -> str:
+        results = list(period_results(crime).values())
+        summaries = []
+        for i, j in [(0, 1), (1, 2), (0, 2)]:
+            if results[i] is None or results[j] is None:
+                summaries.append(None)
+            else:
+                summaries.append(transition_summary(compute_transitions(results[i]["gdf"], results[j]["gdf"])))
+
+        def row(title: str, key: str, fmt: Callable[[float], str]) -> str:
+            cells = ["---" if s is None else fmt(s[key]) for s in summaries]
+            return f"{title} & " + " & ".join(cells) + " \\\\"
+
+        def new(n: float) -> str:
+            return f"+{n}" if n else "0"
+
+        body = "\n".join([
+            row("Hot Spots (total)", "hot_spots", str),
+            row("\\quad New Hot Spots", "new_hot_spots", new),
+            row("Cold Spots (total)", "cold_spots", str),
+            row("\\quad New Cold Spots", "new_cold_spots", new),
+            row("Disappeared Clusters", "disappeared", str),
+            row("Stability Rate", "stability_rate", lambda v: f"{v:.1f}\\%"),
+        ])
+        return f"""% {comment}
+\\begin{{table}}[htbp]
+\\centering
+\\caption{{LISA cluster transitions for {what} across pandemic periods.}}
+\\label{{tab:{label}}}
+\\begin{{tabular}}{{lccc}}
+\\toprule
+\\textbf{{Metric}} & \\textbf{{Pre $\\to$ During}} & \\textbf{{During $\\to$ Post}} & \\textbf{{Pre $\\to$ Post}} \\\\
+\\midrule
+{body}
+\\bottomrule
+\\end{{tabular}}
+\\end{{table}}
+"""
+    return build
+
+
+# ---------- Figures ----------
+def moran_scatter(crime: str) -> Callable[[], bytes]:
+    """Moran scatter plots of a crime in the three periods, as a PNG"""
+    def build() -> bytes:
+        results = {name: res for name, res in period_results(crime).items() if res is not None}
+        if not results:
+            raise RuntimeError(f"no Moran result for {crime} in any period")
+        return moran_scatter_image(results)
+    return build
+
+def lisa_comparison() -> bytes:
+    crimes = {code: REPORT_CRIMES[code][0] for code in ["PICKTHEF", "CYBERCRIM", "RAPE", "BURGTHEF"]}
+    return lisa_comparison_image(LEVEL, crimes, [PRE, POST])
+
+
+# output path (relative to report/) -> (years the output depends on, builder)
+TARGETS: dict[str, tuple[list[int], Callable[[], str | bytes]]] = {
+    "tables/crime_variation_mean.tex": (window_years(BASELINE, DURING), crime_variation_mean),
+    "tables/cybercrime_increases.tex": (
+        window_years(BASELINE, DURING),
+        top_changes(
+            "CYBERCRIM", "cybercrime_increases", True, "cybercrime", "Cybercrime growth table", area_header="Provinces"
+        )
+    ),
+    "tables/csam_increases.tex": (
+        window_years(BASELINE, DURING),
+        top_changes(
+            "PORNO", "csam_increases", True, "child sexual abuse material (CSAM) offence", "CSAM growth table"
+        )
+    ),
+    "tables/pickpocketing_decreases.tex": (
+        window_years(BASELINE, DURING),
+        top_changes("PICKTHEF", "pickpocketing_decreases", False, "pickpocketing", "Pickpocketing degrowth table")
+    ),
+    "tables/moran_values.tex": (window_years(PRE, DURING, POST), moran_values),
+    "tables/lisa_pickpocketing.tex": (
+        window_years(PRE, DURING, POST), lisa_transitions("PICKTHEF", "lisa_pickpocketing", "pickpocketing", "LISA Pickpocketing Table")
+    ),
+    "tables/lisa_cybercrime.tex": (
+        window_years(PRE, DURING, POST),
+        lisa_transitions("CYBERCRIM", "lisa_cybercrime", "cybercrime", "LISA Cybercrime table")
+    ),
+    "tables/lisa_rape.tex": (
+        window_years(PRE, DURING, POST),
+        lisa_transitions("RAPE", "lisa_rape", "sexual assault", "LISA Sexual Assault Table")
+    ),
+    "tables/lisa_reidential_burglary.tex": (
+        window_years(PRE, DURING, POST),
+        lisa_transitions(
+            "BURGTHEF", "lisa_residential_burglary", "residential burglary", "LISA Residential Burglary Table"
+        )
+    ),
+    "figures/pickpocketing.png": (window_years(PRE, DURING, POST), moran_scatter("PICKTHEF")),
+    "figures/cybercrimes.png": (window_years(PRE, DURING, POST), moran_scatter("CYBERCRIM")),
+    "figures/rape.png": (window_years(PRE, DURING, POST), moran_scatter("RAPE")),
+    "figures/total.png": (window_years(PRE, DURING, POST), moran_scatter("TOT")),
+    "figures/lisa_comparison.png": (window_years(PRE, POST), lisa_comparison),
+}
+
+
+# ---------- Build ----------
+def input_key(name: str) -> str:
+    """Version of everything an output depends on: its data partitions and its builder"""
+    years, builder = TARGETS[name]
+    # builders made by a factory differ only by their closure values
+    params = [cell.cell_contents for cell in builder.__closure__ or []]
+    payload = json.dumps([data_manifest(years), inspect.getsource(builder), params], default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def write_output(path: Path, content: str | bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    if isinstance(content, bytes):
+        tmp.write_bytes(content)
+    else:
+        tmp.write_text(content)
+    os.replace(tmp, path)
+
+def build_report(names: list[str], force: bool = False) -> dict[str, str]:
+    """Rebuild the outputs whose inputs changed, return the status of each one"""
+    state = json.loads(BUILD_STATE.read_text()) if BUILD_STATE.exists() else {}
+    keys = {name: input_key(name) for name in names}
+    todo = [name for name in names if force or state.get(name) != keys[name] or not (REPORT_DIR / name).exists()]
+    status = {name: "unchanged" for name in names if name not in todo}
+
+    def run(name: str) -> None:
+        start = time.perf_counter()
+        write_output(REPORT_DIR / name, TARGETS[name][1]())
+        status[name] = f"built ({time.perf_counter() - start:.1f}s)"
+
+    # Moran computations run in the worker pool, threads only wait on them
+    with ThreadPoolExecutor(max_workers=max(workers.MAX_WORKERS, 1) * 2) as executor:
+        futures = {executor.submit(run, name): name for name in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            name = futures[future]
+            try:
+                future.result()
+                state[name] = keys[name]
+            except Exception as e:
+                status[name] = f"FAILED: {e}"
+                traceback.print_exception(e, file=sys.stderr)
+            print(f"[{done}/{len(todo)}] {name} - {status[name]}", flush=True)
+
+    BUILD_STATE.write_text(json.dumps(state, indent=2, sort_keys=True))
+    return status
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the report tables and figures from the analysis results")
+    parser.add_argument("outputs", nargs="*", help="only build these outputs, e.g. tables/moran_values.tex")
+    parser.add_argument("--force", action="store_true", help="rebuild even when the inputs are unchanged")
+    parser.add_argument("--no-figures", action="store_true", help="only build the tables")
+    args = parser.parse_args()
+
+    names = args.outputs or list(TARGETS)
+    unknown = set(names) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown outputs: {', '.join(sorted(unknown))}")
+    if args.no_figures:
+        names = [name for name in names if not name.startswith("figures/")]
+
+    print("=" * 50)
+    print(f"Building {len(names)} report outputs...")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    status = build_report(names, force=args.force)
+
+    print("=" * 50)
+    failed = [name for name, s in status.items() if s.startswith("FAILED")]
+    skipped = sum(s == "unchanged" for s in status.values())
+    print(f"[OK] {len(names) - skipped - len(failed)} built, {skipped} unchanged, {len(failed)} failed "
+          f"in {time.perf_counter() - start:.1f}s")
+    if failed:
+        print(f"[ERROR] not built: {', '.join(sorted(failed))}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
+import sys
 from pathlib import Path
 import geopandas as gpd
 
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from topology import save_topology  # noqa: E402
+from crosswalk import save_crosswalk  # noqa: E402
+
 SHAPES_DIR = Path("data/shapes")
 SHAPES_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -10,10 +17,32 @@ def build(level: int, in_path: str, out_name: str):
     it = it.rename(columns={"NAME_LATN": "AREA_NAME"})
     it.to_parquet(SHAPES_DIR / out_name, engine="pyarrow")
 
+    # contiguity and nearest areas, so the app does not intersect polygons
+    out = save_topology(SHAPES_DIR / out_name)
+    print(f"[OK] NUTS-{level}: {len(it)} areas, topology saved to {out.name}")
+
+def build_crosswalk(level: int, in_path: str, out_name: str, shapes_name: str):
+    """Shapes in the NUTS version of the ISTAT codes, and their crosswalk to the 2006 shapes"""
+    if not Path(in_path).exists():
+        print(f"[SKIP] NUTS-{level}: {in_path} not found, the data is matched by code")
+        return
+    gdf = gpd.read_file(in_path)
+    it = gdf[gdf["CNTR_CODE"] == "IT"][["NUTS_ID", "NAME_LATN", "geometry"]].copy()
+    it = it.rename(columns={"NAME_LATN": "AREA_NAME"})
+    it.to_parquet(SHAPES_DIR / out_name, engine="pyarrow")
+
+    out = save_crosswalk(SHAPES_DIR / out_name, SHAPES_DIR / shapes_name)
+    print(f"[OK] NUTS-{level}: crosswalk of {len(it)} areas saved to {out.name}")
+
 def main():
     build(1, "data/shapes/NUTS_RG_01M_2006_4326_LEVL_1.geojson", "nuts1_it.geoparquet")
     build(2, "data/shapes/NUTS_RG_01M_2006_4326_LEVL_2.geojson", "nuts2_it.geoparquet")
     build(3, "data/shapes/NUTS_RG_01M_2006_4326_LEVL_3.geojson", "nuts3_it.geoparquet")
 
+    # the data uses the 2021 codes (e.g. the recoded Sardinian provinces)
+    build_crosswalk(1, "data/shapes/NUTS_RG_01M_2021_4326_LEVL_1.geojson", "nuts1_it_2021.geoparquet", "nuts1_it.geoparquet")
+    build_crosswalk(2, "data/shapes/NUTS_RG_01M_2021_4326_LEVL_2.geojson", "nuts2_it_2021.geoparquet", "nuts2_it.geoparquet")
+    build_crosswalk(3, "data/shapes/NUTS_RG_01M_2021_4326_LEVL_3.geojson", "nuts3_it_2021.geoparquet", "nuts3_it.geoparquet")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
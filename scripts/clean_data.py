@@ -1,43 +1,141 @@
 from __future__ import annotations
+import argparse
+import io
 from pathlib import Path
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ingest_sdmx import FLOWS
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
-OUT_DIR = PROJECT_ROOT / "data" / "processed"
-OUT_DIR.mkdir(parents=True, exist_ok=True)
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
 
 KEEP = ["REF_AREA", "TIME_PERIOD", "TYPE_CRIME", "OBS_VALUE", "UNIT_MEAS", "UNIT_MULT"]
 
-def clean_data(in_path: Path, out_path: Path) -> None:
-    """Clean and normalize crime data"""
-    print(f"Cleaning {in_path.name}...")
+# strict output schema: codes are dictionary encoded (categoricals once
+# loaded), years fit in int16 and values in float32 (~7 significant digits)
+SCHEMA = pa.schema([
+    ("REF_AREA", pa.dictionary(pa.int16(), pa.string())),
+    ("TIME_PERIOD", pa.int16()),
+    ("TYPE_CRIME", pa.dictionary(pa.int16(), pa.string())),
+    ("OBS_VALUE", pa.float32()),
+    ("UNIT_MEAS", pa.dictionary(pa.int8(), pa.string())),
+    ("UNIT_MULT", pa.int8()),
+])
 
-    df = pd.read_parquet(in_path)
+# the app filters on one crime type at a time, so rows are sorted by crime
+# and split in small row groups: their min/max statistics then let readers
+# (pyarrow filters, DuckDB) skip the groups of the other crimes
+SORT_BY = ["TYPE_CRIME", "REF_AREA"]
+ROW_GROUP_SIZE = 2048
 
-    # normalize
+def legacy_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Partition as the previous clean step produced it (object codes, 64 bit numbers)"""
+    df = df.copy()
     df["REF_AREA"] = df["REF_AREA"].astype(str)
     df["TIME_PERIOD"] = pd.to_numeric(df["TIME_PERIOD"], errors="coerce")
     df["OBS_VALUE"] = pd.to_numeric(df["OBS_VALUE"], errors="coerce")
+    return df[[c for c in KEEP if c in df.columns]]
+
+def parquet_size(table: pa.Table, **kwargs) -> int:
+    buf = io.BytesIO()
+    pq.write_table(table, buf, **kwargs)
+    return buf.tell()
+
+def clean_data(in_path: Path, out_path: Path) -> dict[str, int]:
+    """Clean and normalize crime data, return memory and file sizes before and after"""
+    print(f"Cleaning {in_path.name}...")
+
+    raw = pd.read_parquet(in_path)
+    before = legacy_frame(raw)
+
+    # normalize
+    df = raw[[c for c in KEEP if c in raw.columns]].copy()
 
-    # filter columns
-    cols = [c for c in KEEP if c in df.columns]
-    df = df[cols].copy()
+    # codes are required, drop rows missing one before the cast turns it into "nan"
+    code_cols = [c for c in df.columns if pa.types.is_dictionary(SCHEMA.field(c).type)]
+    missing = df[code_cols].isna().any(axis=1)
+    if missing.any():
+        print(f" !! {in_path.name}: dropped {int(missing.sum()):,} rows without {'/'.join(code_cols)}")
+        df = df[~missing]
 
-    df.to_parquet(out_path, engine="pyarrow", index=False)
-    print(f"[OK] {out_path} shape={df.shape}")
+    for col in df.columns:
+        if pa.types.is_dictionary(SCHEMA.field(col).type):
+            df[col] = df[col].astype(str)
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    # years and multipliers are integers, drop rows without one
+    int_cols = [c for c in ("TIME_PERIOD", "UNIT_MULT") if c in df.columns]
+    dropped = int(df[int_cols].isna().any(axis=1).sum())
+    if dropped:
+        print(f" !! {in_path.name}: dropped {dropped:,} rows with invalid {'/'.join(int_cols)}")
+        df = df.dropna(subset=int_cols)
+
+    sort_by = [c for c in SORT_BY if c in df.columns]
+    df = df.sort_values(sort_by, ignore_index=True)
+
+    schema = pa.schema([SCHEMA.field(c) for c in df.columns])
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    pq.write_table(
+        table, out_path,
+        compression="zstd",
+        row_group_size=ROW_GROUP_SIZE,
+        write_statistics=True
+    )
+
+    sizes = {
+        "mem_before": int(before.memory_usage(deep=True).sum()),
+        "mem_after": int(table.to_pandas().memory_usage(deep=True).sum()),
+        "file_before": parquet_size(pa.Table.from_pandas(before, preserve_index=False)),
+        "file_after": out_path.stat().st_size,
+    }
+    print(
+        f"[OK] {out_path} shape={df.shape} "
+        f"memory {sizes['mem_before'] / 1024:.0f} -> {sizes['mem_after'] / 1024:.0f} KB, "
+        f"file {sizes['file_before'] / 1024:.0f} -> {sizes['file_after'] / 1024:.0f} KB"
+    )
+    return sizes
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Clean a dataflow dataset")
+    parser.add_argument("--flow", default="delittips_9", choices=list(FLOWS), help="dataflow to clean")
+    parser.add_argument(
+        "--year", type=int, action="append",
+        help="only clean these yearly partitions (repeatable), the others are kept as they are"
+    )
+    args = parser.parse_args()
+
+    # one partition per year, mirroring the input dataset
+    in_dir = PROCESSED_DIR / args.flow
+    out_dir = PROCESSED_DIR / FLOWS[args.flow]["clean_dir"]
+    out_dir.mkdir(parents=True, exist_ok=True)
+
     print("=" * 50)
-    print("Cleaning crime rate data...")
+    print(f"Cleaning {args.flow} data...")
     print("=" * 50)
 
-    in_path = PROJECT_ROOT / "data" / "processed" / "delittips_9_2014_2023.parquet"
-    out_path = OUT_DIR / "criminality_clean.parquet"
+    if args.year:
+        in_paths = [in_dir / f"{year}.parquet" for year in args.year]
+    else:
+        in_paths = sorted(in_dir.glob("*.parquet"))
+
+    totals = {"mem_before": 0, "mem_after": 0, "file_before": 0, "file_after": 0}
+    for in_path in in_paths:
+        for key, value in clean_data(in_path, out_dir / in_path.name).items():
+            totals[key] += value
 
-    clean_data(in_path, out_path)
-    
     print("=" * 50)
+    if in_paths:
+        print(
+            f"Memory: {totals['mem_before'] / 1e6:.2f} MB -> {totals['mem_after'] / 1e6:.2f} MB "
+            f"({1 - totals['mem_after'] / totals['mem_before']:.0%} smaller)"
+        )
+        print(
+            f"Files:  {totals['file_before'] / 1e6:.2f} MB -> {totals['file_after'] / 1e6:.2f} MB "
+            f"({1 - totals['file_after'] / totals['file_before']:.0%} smaller)"
+        )
     print("[OK] - Cleaning complete!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import requests
+import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+BASE_URL = "https://esploradati.istat.it/SDMXWS/rest/data"
+
+OUT_RAW = PROJECT_ROOT / "data" / "raw"
+OUT_PROCESSED = PROJECT_ROOT / "data" / "processed"
+
+HEADERS = {"Accept": "application/vnd.sdmx.data+csv;version=1.0.0"}
+
+MAX_CONNECTIONS = 4
+
+# flow key -> dataflow id, SDMX series key (None = all), column mapping (source -> dataset)
+# and the dimensions identifying one observation. Rows are kept only where
+# every column in `filters` has the given value.
+FLOWS: dict[str, dict] = {
+    "delittips_9": {
+        "dataflow": "IT1,73_67_DF_DCCV_DELITTIPS_9,1.0",
+        "key": None,
+        "columns": {
+            "REF_AREA": "REF_AREA",
+            "TIME_PERIOD": "TIME_PERIOD",
+            "TYPE_CRIME": "TYPE_CRIME",
+            "OBS_VALUE": "OBS_VALUE",
+            "UNIT_MEAS": "UNIT_MEAS",
+            "UNIT_MULT": "UNIT_MULT",
+        },
+        "dimensions": ["REF_AREA", "TYPE_CRIME", "TIME_PERIOD"],
+        "filters": {},
+        "clean_dir": "criminality_clean",
+    },
+    "delittips_1": {
+        "dataflow": "IT1,73_67_DF_DCCV_DELITTIPS_1,1.0",
+        "key": None,
+        "columns": {
+            "REF_AREA": "REF_AREA",
+            "TIME_PERIOD": "TIME_PERIOD",
+            "TYPE_CRIME": "TYPE_CRIME",
+            "OBS_VALUE": "OBS_VALUE",
+        },
+        "dimensions": ["REF_AREA", "TYPE_CRIME", "TIME_PERIOD"],
+        "filters": {},
+        "clean_dir": "crime_counts_clean",
+    },
+    "population": {
+        # resident population on 1st January, all ages, both sexes
+        "dataflow": "IT1,22_289_DF_DCIS_POPRES1_1,1.0",
+        "key": None,
+        "columns": {
+            "REF_AREA": "REF_AREA",
+            "TIME_PERIOD": "TIME_PERIOD",
+            "OBS_VALUE": "OBS_VALUE",
+        },
+        "dimensions": ["REF_AREA", "TIME_PERIOD"],
+        "filters": {"DATA_TYPE": "JAN", "SEX": "9", "AGE": "TOTAL", "MARITAL_STATUS": "99"},
+        "clean_dir": "population_clean",
+    },
+}
+
+YEARS = list(range(2014, 2024))
+
+
+def make_session() -> requests.Session:
+    """HTTP session shared by every download, with a bounded connection pool and retries"""
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=2, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONNECTIONS, max_retries=retries)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+def fetch_one_year(session: requests.Session, flow_key: str, year: int) -> tuple[Path, bool]:
+    """Fetch one year of a dataflow from ISTAT APIs, return the raw file and whether it was downloaded"""
+    flow = FLOWS[flow_key]
+    out = OUT_RAW / f"{flow_key}_{year}.csv"
+
+    if out.exists() and out.stat().st_size > 0:
+        return out, False
+
+    url = f"{BASE_URL}/{flow['dataflow']}"
+    if flow["key"]:
+        url += f"/{flow['key']}"
+    params = {"startPeriod": str(year), "endPeriod": str(year)}
+    r = session.get(url, params=params, timeout=120)
+    r.raise_for_status()
+    out.write_bytes(r.content)
+    return out, True
+
+def build_partition(flow_key: str, year: int, path: Path) -> int:
+    """Write the rows of one year as a partition of the flow dataset, return the number of rows"""
+    flow = FLOWS[flow_key]
+    df = pd.read_csv(path)
+
+    for column, value in flow["filters"].items():
+        df = df[df[column].astype(str) == value]
+
+    df = df[list(flow["columns"])].rename(columns=flow["columns"])
+
+    # source files can overlap neighbouring years, keep only the requested one
+    df = df[pd.to_numeric(df["TIME_PERIOD"], errors="coerce") == year]
+
+    rows_before = len(df)
+    df = df.drop_duplicates(subset=flow["dimensions"], keep="first")
+    rows_after = len(df)
+
+    if rows_before > rows_after:
+        print(f" !! {flow_key} {year}: removed {rows_before - rows_after:,} duplicate rows")
+
+    out_dir = OUT_PROCESSED / flow_key
+    out_dir.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(out_dir / f"{year}.parquet", index=False)
+    return rows_after
+
+def ingest(flow_keys: list[str], years: list[int]) -> dict[str, int]:
+    """Download and partition several dataflows concurrently, return the rows written per flow"""
+    OUT_RAW.mkdir(parents=True, exist_ok=True)
+    tasks = [(flow_key, year) for flow_key in flow_keys for year in years]
+    rows = {flow_key: 0 for flow_key in flow_keys}
+    done = 0
+    lock = threading.Lock()
+    session = make_session()
+
+    def run(task: tuple[str, int]) -> None:
+        nonlocal done
+        flow_key, year = task
+        path, downloaded = fetch_one_year(session, flow_key, year)
+        n = build_partition(flow_key, year, path)
+        with lock:
+            done += 1
+            rows[flow_key] += n
+            status = f"done ({path.stat().st_size / 1024:.1f} KB)" if downloaded else "already exists, skipping"
+            print(f"[{done}/{len(tasks)}] {flow_key} {year} - {status}", flush=True)
+
+    with ThreadPoolExecutor(max_workers=MAX_CONNECTIONS) as executor:
+        # list() re-raises the first download error
+        list(executor.map(run, tasks))
+
+    return rows
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Download ISTAT SDMX dataflows as yearly parquet partitions")
+    parser.add_argument(
+        "flows", nargs="*", default=list(FLOWS),
+        help=f"flows to ingest (default: all of {', '.join(FLOWS)})"
+    )
+    parser.add_argument("--year", type=int, action="append", help="only fetch these years (repeatable)")
+    args = parser.parse_args()
+
+    unknown = set(args.flows) - set(FLOWS)
+    if unknown:
+        parser.error(f"unknown flows: {', '.join(sorted(unknown))}")
+
+    years = args.year or YEARS
+    print(f"Downloading {len(args.flows)} dataflows x {len(years)} years...")
+    print("=" * 50)
+
+    rows = ingest(args.flows, years)
+    for flow_key, n in rows.items():
+        print(f"[OK] {flow_key}: {n:,} rows saved to {flow_key}/")
+
+    print("=" * 50)
+    print("All downloads complete!")
+
+if __name__ == "__main__":
+    main()
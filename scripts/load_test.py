@@ -0,0 +1,184 @@
+from __future__ import annotations
+import argparse
+import json
+import random
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+APP_DIR = PROJECT_ROOT / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from utils import CRIME_CATEGORIES  # noqa: E402
+
+PAGES: list[str] = ["01_variation_maps.py", "02_moran.py", "03_lisa_transitions.py"]
+
+# page -> selectbox labels of the in-page period selectors
+PERIOD_SELECTORS: dict[str, list[str]] = {
+    "01_variation_maps.py": [],
+    "02_moran.py": ["Select period to display"],
+    "03_lisa_transitions.py": ["From period"],
+}
+
+
+# ---------- Per-session CPU accounting ----------
+# AppTest runs every script in its own thread, like the Streamlit server does.
+# The runner is created by the session thread, so CPU time spent in the script
+# thread is credited back to the session that started it.
+CPU_SECONDS: dict[int, float] = defaultdict(float)
+_cpu_lock = threading.Lock()
+
+_original_init = LocalScriptRunner.__init__
+_original_run_thread = LocalScriptRunner._run_script_thread
+
+def _init_with_owner(self, *args, **kwargs):
+    _original_init(self, *args, **kwargs)
+    self._load_test_owner = threading.get_ident()
+
+def _run_thread_with_cpu(self):
+    start = time.thread_time()
+    try:
+        _original_run_thread(self)
+    finally:
+        with _cpu_lock:
+            CPU_SECONDS[self._load_test_owner] += time.thread_time() - start
+
+LocalScriptRunner.__init__ = _init_with_owner
+LocalScriptRunner._run_script_thread = _run_thread_with_cpu
+
+
+# ---------- Simulated user ----------
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def find_widget(widgets, label: str):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    return None
+
+def random_filter_change(at: AppTest, page: str, rng: random.Random) -> str:
+    """Apply one filter change a user would make on the page and return its name"""
+    actions = ["crime", "category", "level"] + PERIOD_SELECTORS[page]
+    action = rng.choice(actions)
+
+    if action == "category":
+        box = find_widget(at.sidebar.selectbox, "Category")
+        box.set_value(rng.choice(list(CRIME_CATEGORIES.keys())))
+    elif action == "crime":
+        box = find_widget(at.sidebar.selectbox, "Type of crime")
+        box.set_value(rng.choice(box.options))
+    elif action == "level":
+        radio = find_widget(at.sidebar.radio, "Geographical level")
+        radio.set_value(rng.choice(radio.options))
+    else:
+        box = find_widget(at.selectbox, action)
+        if box is None:
+            return "noop"
+        box.set_value(rng.choice(box.options))
+    return action
+
+def run_session(session: int, rounds: int, seed: int, latencies: list, errors: list) -> None:
+    """One dashboard user cycling through the analysis pages"""
+    rng = random.Random(seed + session)
+    apps = {}
+    for _ in range(rounds):
+        for page in PAGES:
+            try:
+                if page not in apps:
+                    apps[page] = AppTest.from_file(str(APP_DIR / "pages" / page), default_timeout=600)
+                    action = "open"
+                else:
+                    action = random_filter_change(apps[page], page, rng)
+                start = time.perf_counter()
+                apps[page].run()
+                latencies.append((session, page, action, time.perf_counter() - start))
+            except Exception as e:
+                errors.append(f"session {session} {page}: {e!r}")
+
+
+# ---------- Report ----------
+def summarise(latencies: list, sessions: dict[int, int], rss_before: float, rss_after: float) -> dict:
+    values = np.array([lat for _, _, _, lat in latencies]) * 1000
+    by_page = defaultdict(list)
+    for _, page, _, lat in latencies:
+        by_page[page].append(lat * 1000)
+
+    return {
+        "sessions": len(sessions),
+        "reruns": len(values),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "pages": {
+            page: {
+                "p50_ms": float(np.percentile(v, 50)),
+                "p95_ms": float(np.percentile(v, 95)),
+            }
+            for page, v in by_page.items()
+        },
+        "cpu_s_per_session": {
+            str(session): round(CPU_SECONDS.get(ident, 0.0), 3) for session, ident in sessions.items()
+        },
+        "peak_rss_mb": round(rss_after, 1),
+        "rss_mb_per_session": round(max(rss_after - rss_before, 0.0) / len(sessions), 1),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate concurrent dashboard users")
+    parser.add_argument("--sessions", type=int, default=4, help="number of concurrent users")
+    parser.add_argument("--rounds", type=int, default=5, help="page cycles per user")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="write the summary to this file")
+    parser.add_argument("--fail-p95", type=float, help="exit with an error above this p95 (ms)")
+    args = parser.parse_args()
+
+    # a single warm-up user loads the data so sessions measure steady state
+    warmup_latencies, warmup_errors = [], []
+    run_session(-1, 1, args.seed, warmup_latencies, warmup_errors)
+    rss_before = peak_rss_mb()
+
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=run_session, args=(i, args.rounds, args.seed, latencies, errors))
+        for i in range(args.sessions)
+    ]
+    for t in threads:
+        t.start()
+    sessions = {i: t.ident for i, t in enumerate(threads)}
+    for t in threads:
+        t.join()
+
+    if not latencies:
+        print("No rerun completed:", *errors, sep="\n")
+        sys.exit(1)
+
+    summary = summarise(latencies, sessions, rss_before, peak_rss_mb())
+    summary["errors"] = errors
+
+    print("=" * 50)
+    print(f"{summary['sessions']} sessions, {summary['reruns']} reruns")
+    print(f"Rerun latency: p50 {summary['p50_ms']:.0f} ms | p95 {summary['p95_ms']:.0f} ms")
+    for page, stats in summary["pages"].items():
+        print(f"  {page}: p50 {stats['p50_ms']:.0f} ms | p95 {stats['p95_ms']:.0f} ms")
+    for session, cpu in summary["cpu_s_per_session"].items():
+        print(f"  session {session}: {cpu:.2f} s CPU")
+    print(f"Peak RSS {summary['peak_rss_mb']:.0f} MB (~{summary['rss_mb_per_session']:.1f} MB per session)")
+    if errors:
+        print(f" !! {len(errors)} failed reruns, first: {errors[0]}")
+    print("=" * 50)
+
+    if args.json:
+        args.json.write_text(json.dumps(summary, indent=2))
+    if args.fail_p95 is not None and summary["p95_ms"] > args.fail_p95:
+        sys.exit(f"p95 {summary['p95_ms']:.0f} ms exceeds {args.fail_p95:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from __future__ import annotations
+import argparse
+import sys
+import time
+from concurrent.futures import as_completed
+from itertools import product
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+APP_DIR = PROJECT_ROOT / "app"
+sys.path.insert(0, str(APP_DIR))
+
+import workers  # noqa: E402
+from render import map_image, METRICS, FORMATS  # noqa: E402
+from utils import CRIME_CATEGORIES, CRIMES_TO_CHECK, GEO_LEVELS, PERIODS_WITH_BASELINE, BASELINE  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Render static choropleth maps into the image cache")
+    parser.add_argument("--level", action="append", choices=list(GEO_LEVELS.values()), help="levels (default: all)")
+    parser.add_argument("--metric", action="append", choices=list(METRICS), help="metrics (default: all)")
+    parser.add_argument("--all-crimes", action="store_true", help="every crime code, not only the key ones")
+    parser.add_argument("--format", default="webp", choices=FORMATS, help="image format (default: webp)")
+    parser.add_argument("--width", type=int, default=800, help="image width in pixels")
+    parser.add_argument("--out", type=Path, help="also copy the images to this folder")
+    args = parser.parse_args()
+
+    levels = args.level or list(GEO_LEVELS.values())
+    metrics = args.metric or list(METRICS)
+    if args.all_crimes:
+        crimes = [code for crimes in CRIME_CATEGORIES.values() for code in crimes]
+    else:
+        crimes = [code for code, _ in CRIMES_TO_CHECK]
+
+    jobs = [
+        (level, crime, period, metric)
+        for level, crime, period, metric in product(levels, crimes, PERIODS_WITH_BASELINE.values(), metrics)
+        # there is no variation of the baseline from itself
+        if not (metric in ("variation", "trend") and period == BASELINE)
+    ]
+
+    print("=" * 50)
+    print(f"Rendering {len(jobs)} maps with {max(workers.MAX_WORKERS, 1)} processes...")
+    print("=" * 50)
+
+    # rendering is CPU bound, every map is drawn in the shared worker pool
+    start = time.perf_counter()
+    futures = {
+        workers.submit(map_image, level, crime, period, metric, args.format, args.width): (level, crime, period, metric)
+        for level, crime, period, metric in jobs
+    }
+
+    failed = 0
+    for i, future in enumerate(as_completed(futures), start=1):
+        level, crime, period, metric = futures[future]
+        name = f"{level}/{crime}_{period[0]}-{period[1]}_{metric}.{args.format}"
+        try:
+            image = future.result()
+        except Exception as e:
+            failed += 1
+            print(f" !! {name}: {e}")
+            continue
+
+        if args.out:
+            path = args.out / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(image)
+        if i % 20 == 0 or i == len(jobs):
+            print(f"[{i}/{len(jobs)}] maps rendered", flush=True)
+
+    print("=" * 50)
+    print(f"[OK] {len(jobs) - failed} maps in {time.perf_counter() - start:.1f}s, {failed} failed")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
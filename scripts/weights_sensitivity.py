@@ -0,0 +1,70 @@
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+APP_DIR = PROJECT_ROOT / "app"
+sys.path.insert(0, str(APP_DIR))
+
+import workers  # noqa: E402
+from sensitivity import weights_sensitivity, label_stability, area_stability, WEIGHT_SPECS  # noqa: E402
+from utils import load_shapes, CRIME_CATEGORIES, CRIMES_TO_CHECK, PERIODS_WITH_BASELINE, SMOOTHING  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Moran's I and LISA labels under several spatial weights specifications")
+    parser.add_argument("--level", default="provinces", choices=["provinces", "regions"])
+    parser.add_argument("--crime", action="append", help="crime codes (default: the key crimes)")
+    parser.add_argument("--all-crimes", action="store_true", help="every crime code")
+    parser.add_argument("--spec", action="append", choices=list(WEIGHT_SPECS), help="weights specs (default: all)")
+    parser.add_argument(
+        "--smoothing", choices=[smoothing for smoothing in SMOOTHING.values() if smoothing],
+        help="empirical Bayes rates instead of raw ones (needs the population dataset)"
+    )
+    parser.add_argument("--out", type=Path, help="folder for the CSV outputs")
+    args = parser.parse_args()
+
+    if args.all_crimes:
+        crimes = [code for crimes in CRIME_CATEGORIES.values() for code in crimes]
+    else:
+        crimes = args.crime or [code for code, _ in CRIMES_TO_CHECK]
+    specs = args.spec or list(WEIGHT_SPECS)
+
+    print("=" * 50)
+    print(f"Weights sensitivity: {len(crimes)} crimes x {len(PERIODS_WITH_BASELINE)} periods x {len(specs)} specs")
+    print(f"Worker processes: {max(workers.MAX_WORKERS, 1)}")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    labels, stats = weights_sensitivity(args.level, crimes, PERIODS_WITH_BASELINE, specs, args.smoothing)
+    print(f"[OK] {len(stats)} combinations in {time.perf_counter() - start:.1f}s")
+
+    # ---------- Global Moran's I ----------
+    print("\nMoran's I by weights specification")
+    moran_table = stats.pivot_table(index=["CRIME", "PERIOD"], columns="SPEC", values="moran_I")
+    print(moran_table.reindex(columns=specs).round(3).to_string())
+
+    # ---------- Label stability ----------
+    stability = label_stability(labels)
+    by_crime = stability.groupby("CRIME")["STABILITY"].mean().sort_values()
+    print("\nMean LISA label stability by crime")
+    for crime, value in by_crime.items():
+        print(f"  {crime:<12} {value:.0%}")
+
+    areas = area_stability(labels)
+    names = load_shapes(args.level).set_index("NUTS_ID")["AREA_NAME"]
+    areas.insert(1, "AREA_NAME", areas["NUTS_ID"].map(names))
+    print("\nLeast stable areas")
+    print(areas.head(10).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+    if args.out:
+        args.out.mkdir(parents=True, exist_ok=True)
+        stats.to_csv(args.out / "sensitivity_moran.csv", index=False)
+        stability.to_csv(args.out / "sensitivity_labels.csv", index=False)
+        areas.to_csv(args.out / "sensitivity_areas.csv", index=False)
+        print(f"\n[OK] CSV files written to {args.out}")
+
+if __name__ == "__main__":
+    main()
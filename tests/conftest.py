@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the app modules import each other by name, as when run by Streamlit
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
@@ -0,0 +1,84 @@
+import asyncio
+import gzip
+import json
+import pandas as pd
+import pyarrow as pa
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer, make_mocked_request
+import api
+from api import create_app, get_periods, ARROW_MEDIA_TYPE
+from utils import PERIODS
+
+
+@pytest.fixture
+def fake_results(monkeypatch):
+    """Moran summaries computed from a small frame instead of the data files"""
+    calls = []
+
+    def compute_moran_summary(level, crime, periods):
+        calls.append((level, crime, periods))
+        return pd.DataFrame({"PERIOD": list(periods), "moran_I": 0.25, "n": 107})
+
+    monkeypatch.setattr(api, "compute_moran_summary", compute_moran_summary)
+    monkeypatch.setattr(api, "data_manifest", lambda: "manifest")
+    return calls
+
+def get(path, params=None, headers=None, auto_decompress=True):
+    """Status, headers and raw body of one request to a fresh test server"""
+    async def fetch():
+        async with TestClient(TestServer(create_app()), auto_decompress=auto_decompress) as client:
+            response = await client.get(path, params=params, headers=headers)
+            return response.status, response.headers, await response.read()
+    return asyncio.run(fetch())
+
+
+def test_periods_default_to_all():
+    assert get_periods(make_mocked_request("GET", "/moran?crime=TOT"), PERIODS) == PERIODS
+
+def test_periods_from_query():
+    request = make_mocked_request("GET", "/moran?crime=TOT&start=2020&end=2020")
+    assert get_periods(request, PERIODS) == {"2020-2020": (2020, 2020)}
+
+@pytest.mark.parametrize("query", ["start=2021&end=2020", "start=2020", "start=2020&end=last"])
+def test_periods_rejects_bad_range(query):
+    with pytest.raises(web.HTTPBadRequest):
+        get_periods(make_mocked_request("GET", f"/moran?crime=TOT&{query}"), PERIODS)
+
+
+def test_moran_json_gzip(fake_results):
+    status, headers, body = get(
+        "/moran", {"crime": "TOT", "start": "2020", "end": "2021"},
+        {"Accept-Encoding": "gzip"}, auto_decompress=False
+    )
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Vary"].startswith("Accept")
+    assert json.loads(gzip.decompress(body)) == [{"PERIOD": "2020-2021", "moran_I": 0.25, "n": 107}]
+    assert fake_results == [("provinces", "TOT", {"2020-2021": (2020, 2021)})]
+
+def test_moran_not_modified(fake_results):
+    params = {"crime": "TOT"}
+    _, headers, _ = get("/moran", params)
+    status, _, body = get("/moran", params, {"If-None-Match": headers["ETag"]})
+    assert status == 304 and body == b""
+    assert len(fake_results) == 1
+
+@pytest.mark.parametrize("params, headers", [
+    ({"crime": "TOT", "format": "arrow"}, None),
+    ({"crime": "TOT"}, {"Accept": ARROW_MEDIA_TYPE}),
+])
+def test_moran_arrow(fake_results, params, headers):
+    _, json_headers, _ = get("/moran", {"crime": "TOT"})
+    status, arrow_headers, body = get("/moran", params, headers)
+    assert status == 200
+    assert arrow_headers["Content-Type"] == ARROW_MEDIA_TYPE
+    assert arrow_headers["ETag"] != json_headers["ETag"]
+    table = pa.ipc.open_stream(body).read_all()
+    assert table.column("PERIOD").to_pylist() == list(api.PERIODS_WITH_BASELINE)
+
+@pytest.mark.parametrize("params", [{"crime": "TOT", "level": "planets"}, {"crime": "NOPE"}, {}])
+def test_moran_rejects_bad_query(fake_results, params):
+    status, _, _ = get("/moran", params)
+    assert status == 400
+    assert fake_results == []
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from crosswalk import crosswalk_matrix, reaggregate
+
+
+def crosswalk() -> dict[str, np.ndarray]:
+    # source B (area 4) is split 3:1 between targets X and Y, A lies in X
+    return {
+        "indptr": np.array([0, 2, 3], dtype=np.int32),
+        "indices": np.array([0, 1, 1], dtype=np.int32),
+        "overlap": np.array([2.0, 3.0, 1.0]),
+        "source_area": np.array([2.0, 4.0]),
+        "source_ids": np.array(["A", "B"]),
+        "target_ids": np.array(["X", "Y"]),
+    }
+
+
+def test_intensive_is_area_weighted_mean():
+    values = np.array([[10.0, 1.0], [20.0, np.nan]])
+    result = reaggregate(values, crosswalk_matrix(crosswalk(), "intensive"), "intensive")
+
+    assert result[:, 0].tolist() == pytest.approx([(2 * 10 + 3 * 20) / 5, 20.0])
+    # a missing source is left out of the mean, a target without data is NaN
+    assert result[0, 1] == pytest.approx(1.0)
+    assert np.isnan(result[1, 1])
+
+def test_extensive_splits_by_area():
+    values = np.array([[100.0, 100.0], [40.0, np.nan]])
+    result = reaggregate(values, crosswalk_matrix(crosswalk(), "extensive"), "extensive")
+
+    assert result[:, 0].tolist() == pytest.approx([130.0, 10.0])
+    assert result[:, 0].sum() == pytest.approx(values[:, 0].sum())
+    # totals are NaN unless every overlapping source has data
+    assert np.isnan(result[:, 1]).all()
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        crosswalk_matrix(crosswalk(), "density")
@@ -0,0 +1,85 @@
+import os
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pytest
+from shapely import Point
+import disk_cache
+from disk_cache import persistent
+
+
+@pytest.fixture
+def cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(disk_cache, "CACHE_DIR", tmp_path)
+    return tmp_path
+
+def counted(value, manifest=lambda *args: "v1"):
+    """Persistent function returning `value`, with the number of times it ran"""
+    calls = []
+
+    @persistent(manifest)
+    def compute(*args):
+        calls.append(args)
+        return value
+    return compute, calls
+
+
+def test_frame_round_trip(cache_dir):
+    frame = pd.DataFrame({"REF_AREA": ["ITC11", "ITC12"], "VAR": [1.5, np.nan]})
+    compute, calls = counted(frame)
+
+    assert compute("provinces").equals(frame)
+    cached = compute("provinces")
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(cached, frame)
+
+def test_moran_result_round_trip(cache_dir):
+    gdf = gpd.GeoDataFrame({"NUTS_ID": ["ITC11", "ITC12"]}, geometry=[Point(7, 45), Point(8, 45)], crs=4326)
+    result = {"gdf": gdf, "moran_I": 0.3, "moran_p": None, "LISA_P": np.array([0.01, 0.5])}
+    compute, calls = counted(result)
+    compute("provinces")
+
+    cached = compute("provinces")
+    assert len(calls) == 1
+    assert isinstance(cached["gdf"], gpd.GeoDataFrame)
+    assert cached["gdf"].crs == gdf.crs
+    assert cached["gdf"].geometry.equals(gdf.geometry)
+    assert cached["moran_I"] == 0.3 and cached["moran_p"] is None
+    assert cached["LISA_P"].tolist() == [0.01, 0.5]
+    assert "LISA_P" not in cached["gdf"].columns
+
+def test_none_round_trip(cache_dir):
+    compute, calls = counted(None)
+    assert compute("provinces") is None
+    assert compute("provinces") is None
+    assert len(calls) == 1
+
+def test_key_follows_arguments_and_manifest(cache_dir):
+    version = {"data": "v1"}
+    compute, calls = counted(pd.DataFrame({"a": [1]}), manifest=lambda level: version["data"])
+    compute("provinces")
+    compute("regions")
+    compute("provinces")
+    assert len(calls) == 2
+
+    version["data"] = "v2"
+    compute("provinces")
+    assert len(calls) == 3
+
+def test_evict_drops_least_recently_used(cache_dir, monkeypatch):
+    compute, _ = counted(pd.DataFrame({"a": np.arange(1000.0)}))
+    for level in ["provinces", "regions", "macro-areas"]:
+        compute(level)
+    entries = sorted(cache_dir.glob("*.parquet"))
+    assert len(entries) == 3
+
+    for age, path in enumerate(entries):
+        os.utime(path, (1000 + age, 1000 + age))
+    monkeypatch.setattr(disk_cache, "MAX_BYTES", sum(p.stat().st_size for p in entries[1:]))
+    disk_cache.evict()
+    assert sorted(cache_dir.glob("*.parquet")) == entries[1:]
+
+def test_rejects_other_values(cache_dir):
+    compute, _ = counted([1, 2, 3])
+    with pytest.raises(TypeError):
+        compute("provinces")
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from hierarchy import group_labels, group_matrix, group_rates, group_totals
+
+AREAS = np.array(["ITC11", "ITC4C", "ITF33", "ITG27", "XX000"])
+
+
+def test_group_labels_longest_prefix():
+    assert list(group_labels(AREAS, "north-south")) == ["North", "North", "South and islands", "South and islands", None]
+    labels = group_labels(AREAS, "metropolitan")
+    assert list(labels) == ["Metropolitan cities", "Metropolitan cities", "Metropolitan cities", "Metropolitan cities", "Other provinces"]
+
+def test_group_matrix_leaves_out_unmatched():
+    groups, matrix = group_matrix(group_labels(AREAS, "north-south"))
+    assert list(groups) == ["North", "South and islands"]
+    assert matrix.toarray().tolist() == [[1, 1, 0, 0, 0], [0, 0, 1, 1, 0]]
+
+def test_group_rates_weighted_by_population():
+    _, matrix = group_matrix(group_labels(AREAS, "north-south"))
+    # areas x years, the second North area has no data in the second year
+    rates = np.array([[10.0, 20.0], [40.0, np.nan], [5.0, 5.0], [15.0, 25.0], [99.0, 99.0]])
+    population = np.array([[1.0], [3.0], [1.0], [1.0], [1.0]])
+
+    result = group_rates(rates, population, matrix)
+    assert result[0].tolist() == pytest.approx([(10 + 3 * 40) / 4, 20.0])
+    assert result[1].tolist() == pytest.approx([10.0, 15.0])
+    assert group_rates(rates, None, matrix)[0].tolist() == pytest.approx([25.0, 20.0])
+
+def test_group_totals_need_every_member():
+    _, matrix = group_matrix(group_labels(AREAS, "north-south"))
+    values = np.array([[1.0, 2.0], [3.0, np.nan], [5.0, 6.0], [7.0, 8.0], [100.0, 100.0]])
+
+    totals = group_totals(values, matrix)
+    assert totals[0, 0] == 4.0 and np.isnan(totals[0, 1])
+    assert totals[1].tolist() == [12.0, 14.0]
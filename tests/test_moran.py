@@ -0,0 +1,21 @@
+import numpy as np
+from libpysal.weights import lat2W
+from esda.moran import Moran_Local
+import utils
+
+
+def test_local_moran_p_matches_permutation_moments():
+    y = np.random.default_rng(1).gamma(2, 10, 25)
+    w = lat2W(5, 5)
+    w.transform = "r"
+    lisa = Moran_Local(y, lat2W(5, 5), transformation="r", permutations=20000, seed=utils.PERMUTATION_SEED)
+    # the normal approximation of the permutation distribution, from its exact moments
+    assert np.allclose(utils.local_moran_p(y, w), lisa.p_z_sim, atol=0.01)
+
+def test_local_moran_p_without_neighbours():
+    w = lat2W(3, 3)
+    neighbors = {i: ([] if i == 4 else [j for j in w.neighbors[i] if j != 4]) for i in w.neighbors}
+    isolated = utils.W(neighbors, silence_warnings=True)
+    p = utils.local_moran_p(np.arange(9.0), isolated)
+    assert p[4] == 1.0
+    assert np.all((p > 0) & (p <= 1))
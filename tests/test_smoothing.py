@@ -0,0 +1,39 @@
+import numpy as np
+import scipy.sparse as sp
+import pytest
+from smoothing import global_eb, spatial_eb, RATE_UNIT
+
+# areas x years, the small third area has an extreme rate
+RATES = np.array([[100.0, 110.0], [120.0, 100.0], [400.0, np.nan], [90.0, 95.0]])
+POPULATION = np.array([[500_000.0], [800_000.0], [5_000.0], [600_000.0]])
+
+
+def test_global_eb_shrinks_small_areas():
+    smoothed = global_eb(RATES, POPULATION)
+
+    mean = np.nansum(RATES[:, 0] * POPULATION[:, 0]) / POPULATION.sum()
+    assert abs(smoothed[2, 0] - mean) < abs(RATES[2, 0] - mean) / 2
+    # large areas barely move, missing rates stay missing
+    assert smoothed[1, 0] == pytest.approx(RATES[1, 0], rel=0.05)
+    assert np.isnan(smoothed[2, 1])
+
+def test_global_eb_matches_marshall():
+    smoothed = global_eb(RATES[:, :1], POPULATION)
+
+    n, r = POPULATION[:, 0] / RATE_UNIT, RATES[:, 0]
+    mean = (n * r).sum() / n.sum()
+    prior_var = max((n * (r - mean) ** 2).sum() / n.sum() - mean / n.mean(), 0)
+    weight = prior_var / (prior_var + mean / n)
+    assert np.allclose(smoothed[:, 0], weight * r + (1 - weight) * mean)
+
+def test_global_eb_keeps_equal_rates():
+    rates = np.full((4, 3), 50.0)
+    assert np.allclose(global_eb(rates, POPULATION), rates)
+
+def test_spatial_eb_over_a_complete_graph_is_global():
+    complete = sp.csr_matrix(np.ones((4, 4)) - np.eye(4))
+    assert np.allclose(spatial_eb(RATES, POPULATION, complete), global_eb(RATES, POPULATION), equal_nan=True)
+
+def test_spatial_eb_keeps_isolated_areas():
+    # with no neighbours the local reference is the area alone
+    assert np.allclose(spatial_eb(RATES, POPULATION, sp.csr_matrix((4, 4))), RATES, equal_nan=True)
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+import pytest
+import utils
+
+YEARS = np.arange(2014, 2024)
+
+
+def series_panel(series: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Year panel of one crime (THEFT) with a series per area, NaN years left out"""
+    rows = [
+        (area, "THEFT", year, value)
+        for area, values in series.items()
+        for year, value in zip(YEARS, values)
+        if not np.isnan(value)
+    ]
+    return utils.build_year_panel(pd.DataFrame(rows, columns=["REF_AREA", "TYPE_CRIME", "TIME_PERIOD", "OBS_VALUE"]))
+
+def noisy_line(seed: int) -> np.ndarray:
+    return 100 + 5 * (YEARS - 2014) + np.random.default_rng(seed).normal(0, 2, len(YEARS))
+
+@pytest.fixture
+def panel_of(monkeypatch):
+    """Serve a given panel as the year panel of every level"""
+    def serve(panel):
+        monkeypatch.setattr(utils, "load_year_panel", lambda level, smoothing=None: panel)
+        utils.load_trend_fit.clear()
+        return panel
+    yield serve
+    utils.load_trend_fit.clear()
+
+
+# ---------- Trends ----------
+def test_fit_trends_matches_least_squares():
+    values = noisy_line(0)
+    values[3] = np.nan
+    panel = series_panel({"ITC11": values})
+    trend = utils.fit_trends(panel, (2014, 2019))
+
+    in_fit = (YEARS <= 2019) & ~np.isnan(values)
+    slope, intercept = np.polyfit(YEARS[in_fit], values[in_fit], 1)
+    resid = values[in_fit] - (intercept + slope * YEARS[in_fit])
+    assert trend["n"][0, 0] == in_fit.sum()
+    assert trend["slope"][0, 0] == pytest.approx(slope)
+    assert trend["level"][0, 0] == pytest.approx(intercept + slope * YEARS[in_fit].mean())
+    assert trend["var"][0, 0] == pytest.approx((resid ** 2).sum() / (in_fit.sum() - 2))
+
+def test_fit_trends_needs_three_years():
+    values = np.full(len(YEARS), np.nan)
+    values[:2] = [10.0, 12.0]
+    trend = utils.fit_trends(series_panel({"ITC11": values}), (2014, 2019))
+    assert np.isnan(trend["slope"][0, 0]) and np.isnan(trend["var"][0, 0])
+
+def test_trend_deviation_flags_departures(panel_of):
+    on_trend = noisy_line(1)
+    jump = noisy_line(2)
+    jump[YEARS >= 2020] += 40
+    panel_of(series_panel({"ITC11": on_trend, "ITC12": jump}))
+
+    result = utils.trend_deviation("provinces", "THEFT", (2014, 2019), (2020, 2021)).set_index("REF_AREA")
+    # projected 2020-2021 mean of the line is 100 + 5 * 6.5
+    assert result.loc["ITC11", "BASELINE"] == pytest.approx(132.5, abs=3)
+    assert not result.loc["ITC11", "SIGNIFICANT"]
+    assert result.loc["ITC12", "SIGNIFICANT"]
+    assert result.loc["ITC12", "LOWER"] > 0
+    assert result.loc["ITC12", "VAR"] == pytest.approx(40 / 132.5 * 100, abs=5)
+
+def test_trend_deviation_unknown_crime(panel_of):
+    panel_of(series_panel({"ITC11": noisy_line(0)}))
+    assert utils.trend_deviation("provinces", "RAPE", (2014, 2019), (2020, 2021)).empty
+
+
+# ---------- Structural breaks ----------
+def brute_force_break(values: np.ndarray) -> tuple[int, float, float]:
+    """Break year, shift and F statistic of the best step on top of a line, by least squares"""
+    observed = ~np.isnan(values)
+    t, y = YEARS[observed].astype(float), values[observed]
+    line = np.column_stack([np.ones_like(t), t])
+    sse = np.linalg.lstsq(line, y, rcond=None)[1][0]
+
+    best = (0, 0.0, -np.inf)
+    for year in YEARS[1:]:
+        step = (t >= year).astype(float)
+        if min(step.sum(), len(t) - step.sum()) < utils.BREAK_MIN_SEGMENT:
+            continue
+        coef, sse_step = np.linalg.lstsq(np.column_stack([line, step]), y, rcond=None)[:2]
+        f_stat = (sse - sse_step[0]) / (sse_step[0] / (len(t) - 3))
+        if f_stat > best[2]:
+            best = (year, coef[2], f_stat)
+    return best
+
+def test_scan_breaks_matches_least_squares():
+    values = noisy_line(3)
+    values[YEARS >= 2020] -= 30
+    values[2] = np.nan
+    breaks = utils.scan_breaks(series_panel({"ITC11": values, "ITC12": noisy_line(4)})).set_index("REF_AREA")
+
+    for area, series in [("ITC11", values), ("ITC12", noisy_line(4))]:
+        year, shift, f_stat = brute_force_break(series)
+        assert breaks.loc[area, "BREAK_YEAR"] == year
+        assert breaks.loc[area, "SHIFT"] == pytest.approx(shift)
+        assert breaks.loc[area, "STRENGTH"] == pytest.approx(f_stat)
+
+    assert breaks.loc["ITC11", "BREAK_YEAR"] == 2020
+    assert breaks.loc["ITC11", "P_VALUE"] < 0.01
+    assert breaks.loc["ITC11", "AFTER"] < breaks.loc["ITC11", "BEFORE"]
+
+def test_scan_breaks_skips_short_series():
+    values = np.full(len(YEARS), np.nan)
+    values[:3] = [1.0, 2.0, 3.0]
+    breaks = utils.scan_breaks(series_panel({"ITC11": values, "ITC12": noisy_line(0)}))
+    assert list(breaks["REF_AREA"]) == ["ITC12"]
+
+
+# ---------- Largest changes ----------
+def test_top_changes_by_direction():
+    scores = pd.DataFrame({
+        "REF_AREA": ["A", "B", "C", "D", "E"],
+        "BASELINE": [10.0, 10.0, 0.5, 10.0, 10.0],
+        "Z": [3.0, -5.0, 9.0, np.nan, 1.0],
+    })
+    assert list(utils.top_changes(scores, k=2, min_baseline=1)["REF_AREA"]) == ["B", "A"]
+    assert list(utils.top_changes(scores, k=2)["REF_AREA"]) == ["C", "B"]
+    assert list(utils.top_changes(scores, k=10, direction="increase")["REF_AREA"]) == ["C", "A", "E", "B"]
+    assert list(utils.top_changes(scores, k=1, direction="decrease")["REF_AREA"]) == ["B"]
+    assert utils.top_changes(scores, k=3, min_baseline=100).empty
+
+def test_change_scores_are_robust_z():
+    cube = pd.DataFrame({
+        "REF_AREA": list("ABCDE"),
+        "TYPE_CRIME": "THEFT",
+        "PERIOD": "During",
+        "VAR": [0.0, 1.0, 2.0, 3.0, np.inf],
+    })
+    scores = utils.change_scores(cube).set_index("REF_AREA")
+    # median 1.5, MAD 1
+    assert "E" not in scores.index
+    assert scores.loc["D", "Z"] == pytest.approx(1.5 / 1.4826)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+import disk_cache
+import utils
+
+# data in the old codes: ITG29 was recoded to ITG28, ITC12 merged into ITC11
+SOURCE_IDS = np.array(["ITC11", "ITC12", "ITG29"])
+TARGET_IDS = np.array(["ITC11", "ITG28"])
+
+
+def crosswalk() -> dict[str, np.ndarray]:
+    # targets x sources overlaps, ITC11 covers all of ITC11 (3) and ITC12 (1)
+    return {
+        "indptr": np.array([0, 2, 3], dtype=np.int32),
+        "indices": np.array([0, 1, 2], dtype=np.int32),
+        "overlap": np.array([3.0, 1.0, 2.0]),
+        "source_area": np.array([3.0, 1.0, 2.0]),
+        "source_ids": SOURCE_IDS,
+        "target_ids": TARGET_IDS,
+    }
+
+def criminality() -> pd.DataFrame:
+    # constant within each period: pre 100 / 200 / 50, then doubled
+    rows = []
+    for area, base in zip(SOURCE_IDS, [100.0, 200.0, 50.0]):
+        for year in range(2014, 2024):
+            rows.append((area, "THEFT", year, base if year < 2020 else 2 * base))
+    return pd.DataFrame(rows, columns=["REF_AREA", "TYPE_CRIME", "TIME_PERIOD", "OBS_VALUE"])
+
+@pytest.fixture
+def crosswalked(monkeypatch, tmp_path):
+    monkeypatch.setattr(disk_cache, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(utils, "load_criminality_data", criminality)
+    monkeypatch.setattr(utils, "level_crosswalk", lambda level: crosswalk())
+    for func in (utils.load_year_panel, utils.load_variation_cube):
+        func.clear()
+    yield
+    for func in (utils.load_year_panel, utils.load_variation_cube):
+        func.clear()
+
+
+def test_variation_cube_uses_shape_codes(crosswalked):
+    cube = utils.load_variation_cube("provinces")
+
+    assert set(cube["REF_AREA"]) == set(TARGET_IDS)
+    assert "ITG29" not in set(cube["REF_AREA"])
+
+    pre = cube.groupby("REF_AREA")["BASELINE"].first()
+    # area-weighted mean of ITC11 and ITC12, ITG29 moved as is
+    assert pre["ITC11"] == pytest.approx((3 * 100.0 + 1 * 200.0) / 4)
+    assert pre["ITG28"] == pytest.approx(50.0)
+    assert np.allclose(cube["VAR"], 100.0)
+
+def test_variation_cube_matches_period_variation(crosswalked):
+    cube = utils.load_variation_cube("provinces")
+    period, window = next(iter(utils.PERIODS.items()))
+    expected = utils.window_variation("provinces", "THEFT", utils.BASELINE, window).set_index("REF_AREA")
+
+    rows = cube[cube["PERIOD"] == period].set_index("REF_AREA")
+    assert np.allclose(rows.loc[expected.index, "VAR"], expected["VAR"])